@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+"""
+Copyright 2025. All rights reserved.
+Authors: guanchenglichina@qq.com (Guancheng Li)
+
+Calculate the loans of a CSV or JSON Lines file without the GUI.
+
+    python batch_main.py loans.csv --output summary.csv
+    python batch_main.py loans.jsonl --output summary.csv \\
+        --schedules schedules.csv.gz --errors errors.csv --workers 8
+    python batch_main.py loans.jsonl --output summary.csv --resume
+
+Exits with 1 when some loans failed, they are listed in the error file.
+See core.batch_runner for the fields of a loan.
+"""
+
+import argparse
+import sys
+import time
+
+from common.instrumentation import Instrumentation
+from core.batch_runner import run_batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("loan_file", help="csv, or json lines for .jsonl/.json")
+    parser.add_argument("--output", required=True, help="csv file of summaries")
+    parser.add_argument("--schedules", help="csv file of full schedules, .gz ok")
+    parser.add_argument("--errors", help="csv file of the loans which failed")
+    parser.add_argument("--format", choices=("csv", "jsonl"), dest="file_format")
+    parser.add_argument(
+        "--workers", type=int, help="worker processes, 1 runs in this process"
+    )
+    parser.add_argument("--chunk-size", type=int, default=256)
+    parser.add_argument(
+        "--resume", action="store_true", help="go on from the saved progress"
+    )
+    parser.add_argument("--progress", help="progress file, default OUTPUT.progress")
+    parser.add_argument("--profile", help="json file of the time by stage")
+    args = parser.parse_args()
+
+    instrumentation = Instrumentation() if args.profile else None
+
+    start_time = time.perf_counter()
+    progress = run_batch(
+        args.loan_file,
+        args.output,
+        schedule_file=args.schedules,
+        error_file=args.errors,
+        max_workers=args.workers,
+        chunk_size=args.chunk_size,
+        resume=args.resume,
+        file_format=args.file_format,
+        progress_file=args.progress,
+        instrumentation=instrumentation,
+    )
+    if instrumentation is not None:
+        instrumentation.dump_json(args.profile)
+    print(
+        f"{progress['loan_count']} loans, {progress['error_count']} errors, "
+        f"{time.perf_counter() - start_time:.1f} s",
+        file=sys.stderr,
+    )
+    return 1 if progress["error_count"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
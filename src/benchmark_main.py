@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+"""
+Copyright 2025. All rights reserved.
+Authors: guanchenglichina@qq.com (Guancheng Li)
+
+Benchmarks of the calculators, written as json and checked against a baseline.
+
+    python benchmark_main.py --output result.json
+    python benchmark_main.py --save-baseline
+    python benchmark_main.py --threshold 0.2
+
+Exits with 1 when a case is slower than the baseline by more than the
+threshold. Baselines depend on the machine, so save one before comparing.
+"""
+
+import argparse
+import copy
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+import numpy as np
+
+from common.date_time_utils import get_date_str_next_n_month
+from core.calculator_registry import CALCULATORS
+from core.monte_carlo import VasicekRateModel, run_monte_carlo
+from core.portfolio import iter_portfolio
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE_FILE = os.path.join(SRC_DIR, "benchmark_baseline.json")
+
+LOAN_TERMS_BY_MONTH = (12, 60, 120, 240, 360, 480)
+EARLY_PAYMENT_COUNTS = (1, 10, 100)
+PORTFOLIO_SIZES = (1, 100, 10000, 100000)
+MONTE_CARLO_PATH_COUNTS = (1000, 100000)
+
+ANNUAL_INTEREST_RATE = 0.036
+LOAN_AMOUNT = 150 * 10000
+START_DATE_STR = "20250420"
+
+# code run by a new interpreter, timed from its start to its exit.
+STARTUP_SCRIPTS = {
+    "python": "pass",
+    "calculator_registry": "import core.calculator_registry",
+    "batch_main": "import batch_main",
+    "linear_quote": (
+        "from core.calculator_registry import new_calculator\n"
+        "new_calculator('linear', 0.036, 1500000, 360, '20250420').calculate()"
+    ),
+    "annuity_quote": (
+        "from core.calculator_registry import new_calculator\n"
+        "new_calculator('annuity', 0.036, 1500000, 360, '20250420').calculate()"
+    ),
+}
+
+
+def _new_calculator(method, loan_term_by_month):
+    return CALCULATORS[method](
+        ANNUAL_INTEREST_RATE, LOAN_AMOUNT, loan_term_by_month, START_DATE_STR
+    )
+
+
+def _calculated(method, loan_term_by_month):
+    calculator = _new_calculator(method, loan_term_by_month)
+    calculator.calculate()
+    return calculator
+
+
+def _early_payment_dates(count):
+    # between two payment dates, one per month from the second month.
+    return [get_date_str_next_n_month("20250410", i + 1) for i in range(count)]
+
+
+def _cases(max_portfolio_size, tmp_dir):
+    """Yield (name, function to time)."""
+    for method in CALCULATORS:
+        for n in LOAN_TERMS_BY_MONTH:
+            yield f"calculate/{method}/{n}", (
+                lambda method=method, n=n: _new_calculator(method, n).calculate()
+            )
+            base_calculator = _calculated(method, n)
+            for count in EARLY_PAYMENT_COUNTS:
+                if count >= n:
+                    continue
+                dates = _early_payment_dates(count)
+                for name in (
+                    "early_payment_with_term_change",
+                    "early_payment_without_term_change",
+                ):
+
+                    def early_payments(name=name, base=base_calculator, dates=dates):
+                        # schedules are never changed in place, a shallow copy
+                        # restarts from the base schedule.
+                        calculator = copy.copy(base)
+                        early_payment = getattr(calculator, name)
+                        for date_str in dates:
+                            early_payment(date_str, 1000)
+
+                    yield f"{name}/{method}/{n}/{count}", early_payments
+
+                records = [
+                    {
+                        "date": date_str,
+                        "amount": 1000,
+                        "cycle_type": ("short", "fixed")[i % 2],
+                    }
+                    for i, date_str in enumerate(dates)
+                ]
+
+                def apply_early_payments(base=base_calculator, records=records):
+                    copy.copy(base).apply_early_payments(records)
+
+                yield f"apply_early_payments/{method}/{n}/{count}", apply_early_payments
+            yield f"get_info/{method}/{n}", (
+                lambda base=base_calculator: base.get_info(add_monthly_info=True)
+            )
+            csv_file = os.path.join(tmp_dir, f"{method}_{n}.csv")
+            yield f"save_to_csv_file/{method}/{n}", (
+                lambda base=base_calculator, csv_file=csv_file: base.save_to_csv_file(
+                    csv_file, with_header=True
+                )
+            )
+    for size in PORTFOLIO_SIZES:
+        if size > max_portfolio_size:
+            continue
+        rng = np.random.default_rng(size)
+        loans = (
+            rng.uniform(0.02, 0.06, size),
+            rng.uniform(1e5, 5e6, size).round(2),
+            rng.choice(LOAN_TERMS_BY_MONTH, size),
+            np.full(size, START_DATE_STR),
+            rng.choice(list(CALCULATORS), size),
+        )
+
+        def portfolio(loans=loans):
+            for _, result in iter_portfolio(*loans):
+                result.total_interest.sum()
+
+        yield f"portfolio/{size}", portfolio
+
+        def portfolio_exact(loans=loans):
+            for _, result in iter_portfolio(*loans, rounding="half_up"):
+                result.total_interest.sum()
+
+        yield f"portfolio_exact/{size}", portfolio_exact
+    rate_model = VasicekRateModel(0.04, 0.3, 0.015)
+    for method in CALCULATORS:
+        for path_count in MONTE_CARLO_PATH_COUNTS:
+            yield f"monte_carlo/{method}/{path_count}", (
+                lambda method=method, path_count=path_count: run_monte_carlo(
+                    method,
+                    0.036,
+                    1e6,
+                    360,
+                    START_DATE_STR,
+                    rate_model,
+                    path_count,
+                    seed=0,
+                )
+            )
+    for name, code in STARTUP_SCRIPTS.items():
+        yield f"startup/{name}", (
+            lambda code=code: subprocess.run(
+                [sys.executable, "-c", code], cwd=SRC_DIR, check=True
+            )
+        )
+
+
+def run_benchmarks(name_filter="", repeat=5, max_portfolio_size=PORTFOLIO_SIZES[-1]):
+    """Seconds per call of every case, the best of `repeat` rounds."""
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="loan_benchmark_") as tmp_dir:
+        for name, function in _cases(max_portfolio_size, tmp_dir):
+            if name_filter not in name:
+                continue
+            timer = timeit.Timer(function)
+            number, _ = timer.autorange()
+            seconds = min(timer.repeat(repeat=repeat, number=number)) / number
+            results[name] = seconds
+            print(f"{name:<60}{1000 * seconds:>12.3f} ms", file=sys.stderr)
+    return results
+
+
+def compare_to_baseline(results, baseline, threshold):
+    """Return the (name, baseline seconds, seconds) of regressed cases."""
+    regressions = []
+    for name, seconds in results.items():
+        baseline_seconds = baseline.get(name)
+        if baseline_seconds and seconds > baseline_seconds * (1 + threshold):
+            regressions.append((name, baseline_seconds, seconds))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--output", help="json file of the results")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="allowed slow down, 0.2 fails a case 20%% slower than the baseline",
+    )
+    parser.add_argument("--filter", default="", help="only run matching cases")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-portfolio-size", type=int, default=PORTFOLIO_SIZES[-1])
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.filter, args.repeat, args.max_portfolio_size)
+    report = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, nothing to compare.", file=sys.stderr)
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    regressions = compare_to_baseline(results, baseline, args.threshold)
+    for name, baseline_seconds, seconds in regressions:
+        print(
+            f"Regression {name}: {1000 * baseline_seconds:.3f} ms -> "
+            f"{1000 * seconds:.3f} ms",
+            file=sys.stderr,
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,6 +8,28 @@ Date time utilities.
 import calendar
 from datetime import datetime
 
+import numpy as np
+
+_DAYS_IN_MONTH = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+
+def date_to_int(date):
+    return date.year * 10000 + date.month * 100 + date.day
+
+
+def int_to_date(date_int):
+    date_int = int(date_int)
+    return datetime(date_int // 10000, date_int // 100 % 100, date_int % 100)
+
+
+def int_to_datetime64(date_ints):
+    """Convert yyyymmdd integers to `datetime64[D]`."""
+    date_ints = np.asarray(date_ints, dtype=np.int64)
+    months = (date_ints // 10000 - 1970) * 12 + date_ints // 100 % 100 - 1
+    return months.astype("datetime64[M]").astype("datetime64[D]") + (
+        date_ints % 100 - 1
+    ).astype("timedelta64[D]")
+
 
 def get_date_next_n_month(start_date, n):
     year = start_date.year
@@ -18,6 +40,47 @@ def get_date_next_n_month(start_date, n):
     day = min(start_date.day, calendar.monthrange(year, month)[1])
     return datetime(year, month, day)
 
+
+def get_date_int_next_n_month(start_date, n):
+    return date_to_int(get_date_next_n_month(start_date, n))
+
+
+def get_date_int_array_next_n_month(year, month, day, n):
+    """Vectorized `get_date_int_next_n_month` on broadcastable arrays.
+
+    `year`, `month` and `day` describe the start dates, `n` the month offsets,
+    the day is clamped to the end of month as `get_date_next_n_month` does.
+    """
+    month_index = np.asarray(month) - 1 + np.asarray(n)
+    year = np.asarray(year) + month_index // 12
+    month_index = month_index % 12
+    is_leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    month_days = _DAYS_IN_MONTH[month_index] + (is_leap & (month_index == 1))
+    day = np.minimum(day, month_days)
+    return (year * 10000 + (month_index + 1) * 100 + day).astype(np.int32)
+
+
+def get_month_count_until(start_date_int, date_int):
+    """Vectorized count of monthly payment dates from start on or before date.
+
+    Both dates are integers in yyyymmdd form, payment dates follow
+    `get_date_next_n_month(start_date, i)` for i = 0, 1, ...
+    """
+    start_date_int = np.asarray(start_date_int, dtype=np.int64)
+    date_int = np.asarray(date_int, dtype=np.int64)
+    month_count = (date_int // 10000 - start_date_int // 10000) * 12 + (
+        date_int // 100 % 100 - start_date_int // 100 % 100
+    )
+    paying_date = get_date_int_array_next_n_month(
+        start_date_int // 10000,
+        start_date_int // 100 % 100,
+        start_date_int % 100,
+        np.maximum(month_count, 0),
+    )
+    month_count = month_count + (paying_date <= date_int)
+    return np.maximum(month_count, 0)[()]
+
+
 def get_date_str_next_n_month(start_date_str, n):
     return get_date_next_n_month(
         datetime.strptime(start_date_str, "%Y%m%d"), n
@@ -0,0 +1,192 @@
+"""
+Copyright 2025. All rights reserved.
+Authors: guanchenglichina@qq.com (Guancheng Li)
+
+Opt-in timing of the calculation stages.
+
+Stages are functions marked with `instrumented`. Nothing is recorded until
+instrumentation is enabled, then every call records its latency and the
+rows it produced:
+
+    with instrument() as instrumentation:
+        calculator.calculate()
+    instrumentation.dump_json("stages.json")
+
+Times are inclusive, a stage which calls another one also counts its time.
+"""
+
+from contextlib import contextmanager
+import functools
+import json
+import random
+import threading
+import time
+
+import numpy as np
+
+# latencies kept per stage for the percentiles, a uniform sample of the
+# calls past that.
+MAX_SAMPLES = 100000
+
+# the enabled Instrumentation, None when disabled.
+_active = None
+
+
+class StageStats:
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+        self.samples = []
+
+    def record(self, seconds, rows):
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.rows += rows
+        if len(self.samples) < MAX_SAMPLES:
+            self.samples.append(seconds)
+        else:
+            # reservoir sampling keeps every call equally likely.
+            position = random.randrange(self.count)
+            if position < MAX_SAMPLES:
+                self.samples[position] = seconds
+
+    def merge(self, other):
+        self.count += other.count
+        self.total_seconds += other.total_seconds
+        self.max_seconds = max(self.max_seconds, other.max_seconds)
+        self.rows += other.rows
+        # roughly uniform, enough for the percentiles of a profile.
+        self.samples = (self.samples + other.samples)[-MAX_SAMPLES:]
+
+    def summary(self):
+        p50, p90, p99 = np.percentile(self.samples, (50, 90, 99)).tolist()
+        return {
+            "count": self.count,
+            "total_seconds": self.total_seconds,
+            "mean_seconds": self.total_seconds / self.count,
+            "p50_seconds": p50,
+            "p90_seconds": p90,
+            "p99_seconds": p99,
+            "max_seconds": self.max_seconds,
+            "rows": self.rows,
+        }
+
+
+class Instrumentation:
+    """Call counts, latencies and rows by stage name."""
+
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, rows=0):
+        with self._lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = StageStats()
+            stats.record(seconds, rows)
+
+    def reset(self):
+        with self._lock:
+            self.stages.clear()
+
+    def merge(self, stages):
+        """Add the stages of another instrumentation, such as the one of a
+        worker process."""
+        with self._lock:
+            for name, other in stages.items():
+                stats = self.stages.get(name)
+                if stats is None:
+                    stats = self.stages[name] = StageStats()
+                stats.merge(other)
+
+    def summary(self):
+        """Stats of every stage, the slowest in total first."""
+        with self._lock:
+            stages = sorted(
+                self.stages.items(), key=lambda item: -item[1].total_seconds
+            )
+            return {name: stats.summary() for name, stats in stages}
+
+    def to_json(self, indent=2):
+        return json.dumps(self.summary(), indent=indent)
+
+    def dump_json(self, json_file):
+        with open(json_file, "w") as f:
+            f.write(self.to_json())
+
+    def print_info(self):
+        for name, stats in self.summary().items():
+            print(
+                f"{name:<50}{stats['count']:>10}"
+                f"{1000 * stats['total_seconds']:>12.3f} ms"
+                f"{1e6 * stats['p50_seconds']:>12.1f} us"
+                f"{1e6 * stats['p99_seconds']:>12.1f} us"
+                f"{stats['rows']:>12}"
+            )
+
+
+def enable(instrumentation=None):
+    """Record to the instrumentation, a new one by default, and return it."""
+    global _active
+    _active = instrumentation if instrumentation is not None else Instrumentation()
+    return _active
+
+
+def disable():
+    global _active
+    _active = None
+
+
+def get_instrumentation():
+    """The enabled Instrumentation, or None."""
+    return _active
+
+
+@contextmanager
+def instrument(instrumentation=None):
+    """Enable instrumentation in the block, then restore the previous one."""
+    global _active
+    previous = _active
+    try:
+        yield enable(instrumentation)
+    finally:
+        _active = previous
+
+
+def instrumented(name, rows=None):
+    """Mark a function as the stage `name`.
+
+    `rows(result, *args, **kwargs)` counts the rows of a call. When disabled
+    a call costs one global lookup more.
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            instrumentation = _active
+            if instrumentation is None:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            seconds = time.perf_counter() - start
+            instrumentation.record(
+                name, seconds, 0 if rows is None else rows(result, *args, **kwargs)
+            )
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def result_rows(result, *args, **kwargs):
+    return len(result)
+
+
+def schedule_rows(result, calculator, *args, **kwargs):
+    """Rows of the schedule a calculator method leaves."""
+    return len(calculator.monthly_meta_info)
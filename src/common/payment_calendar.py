@@ -0,0 +1,88 @@
+"""
+Copyright 2025. All rights reserved.
+Authors: guanchenglichina@qq.com (Guancheng Li)
+
+Payment date columns, generated in bulk and cached per start date.
+"""
+
+from collections import OrderedDict
+import threading
+
+import numpy as np
+
+from common.date_time_utils import (
+    date_to_int,
+    get_date_int_array_next_n_month,
+    int_to_datetime64,
+)
+from common.instrumentation import instrumented, result_rows
+
+
+class PaymentCalendar:
+    """Monthly payment dates of start dates, with LRU eviction.
+
+    The dates follow `get_date_next_n_month(start_date, i)`, a day missing
+    in a month is clamped to the end of month. Returned columns are
+    read-only views of the cache. The calendar can be used from several
+    threads.
+    """
+
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self._dates = OrderedDict()
+        self.hit_count = 0
+        self.miss_count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._dates)
+
+    def clear(self):
+        with self._lock:
+            self._dates.clear()
+
+    def get_dates(self, start_date, n):
+        """The first n payment dates as int32 yyyymmdd values.
+
+        `start_date` is a datetime or a yyyymmdd integer.
+        """
+        if not isinstance(start_date, (int, np.integer)):
+            start_date = date_to_int(start_date)
+        start_date = int(start_date)
+        with self._lock:
+            dates = self._dates.get(start_date)
+            if dates is not None and len(dates) >= n:
+                self.hit_count += 1
+                self._dates.move_to_end(start_date)
+                return dates[:n]
+            self.miss_count += 1
+        # grow geometrically, so a few longer terms do not regenerate often.
+        size = max(n, 2 * len(dates)) if dates is not None else n
+        dates = get_date_int_array_next_n_month(
+            start_date // 10000,
+            start_date // 100 % 100,
+            start_date % 100,
+            np.arange(size),
+        )
+        dates.flags.writeable = False
+        with self._lock:
+            cached_dates = self._dates.get(start_date)
+            # another thread may have cached longer dates meanwhile.
+            if cached_dates is None or len(cached_dates) < len(dates):
+                self._dates[start_date] = dates
+            self._dates.move_to_end(start_date)
+            while len(self._dates) > self.max_size:
+                self._dates.popitem(last=False)
+        return dates[:n]
+
+    def get_datetime64(self, start_date, n):
+        return int_to_datetime64(self.get_dates(start_date, n))
+
+
+default_calendar = PaymentCalendar()
+
+
+@instrumented("dates.get_payment_dates", rows=result_rows)
+def get_payment_dates(start_date, n):
+    """First n payment dates from the start date, by the default calendar."""
+    return default_calendar.get_dates(start_date, n)
@@ -0,0 +1,113 @@
+"""
+Copyright 2025. All rights reserved.
+Authors: guanchenglichina@qq.com (Guancheng Li)
+
+Plain PDF report of a schedule, without extra dependencies.
+"""
+
+from common.instrumentation import instrumented
+from common.schedule_export import CSV_HEADER
+
+# A4 in points.
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+MARGIN = 50
+FONT_SIZE = 10
+LINE_HEIGHT = 14
+LINES_PER_PAGE = (PAGE_HEIGHT - 2 * MARGIN) // LINE_HEIGHT
+
+# STSong-Light is one of the standard CJK fonts of PDF readers, so Chinese
+# text needs no embedded font. Text is given as UCS-2 code units.
+_FONT_OBJECTS = [
+    b"<< /Type /Font /Subtype /Type0 /BaseFont /STSong-Light"
+    b" /Encoding /UniGB-UCS2-H /DescendantFonts [4 0 R] >>",
+    b"<< /Type /Font /Subtype /CIDFontType0 /BaseFont /STSong-Light"
+    b" /CIDSystemInfo << /Registry (Adobe) /Ordering (GB1) /Supplement 2 >>"
+    b" /FontDescriptor 5 0 R /DW 1000 /W [1 95 500] >>",
+    b"<< /Type /FontDescriptor /FontName /STSong-Light /Flags 6"
+    b" /FontBBox [-25 -254 1000 880] /ItalicAngle 0 /Ascent 880"
+    b" /Descent -120 /CapHeight 880 /StemV 93 >>",
+]
+
+
+def _text_line(text):
+    return b"<" + text.encode("utf-16-be").hex().encode("ascii") + b"> Tj T*"
+
+
+def _content_stream(lines):
+    return b"\n".join(
+        [
+            b"BT",
+            f"/F1 {FONT_SIZE} Tf {LINE_HEIGHT} TL".encode("ascii"),
+            f"{MARGIN} {PAGE_HEIGHT - MARGIN} Td".encode("ascii"),
+            *(_text_line(line) for line in lines),
+            b"ET",
+        ]
+    )
+
+
+def write_lines_pdf(pdf_file, lines):
+    """Write text lines to A4 pages, one line per row."""
+    lines = list(lines)
+    pages = [
+        lines[i : i + LINES_PER_PAGE] for i in range(0, len(lines), LINES_PER_PAGE)
+    ] or [[]]
+    # 1 catalog, 2 page tree, 3-5 font, then a page and its content per page.
+    page_ids = [6 + 2 * i for i in range(len(pages))]
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids ["
+        + b" ".join(f"{page_id} 0 R".encode("ascii") for page_id in page_ids)
+        + f"] /Count {len(pages)} >>".encode("ascii"),
+        *_FONT_OBJECTS,
+    ]
+    for page_id, page_lines in zip(page_ids, pages):
+        stream = _content_stream(page_lines)
+        page = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}]"
+            f" /Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>"
+        )
+        objects.append(page.encode("ascii"))
+        objects.append(
+            f"<< /Length {len(stream)} >>\nstream\n".encode("ascii")
+            + stream
+            + b"\nendstream"
+        )
+
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for object_id, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += f"{object_id} 0 obj\n".encode("ascii") + body + b"\nendobj\n"
+    xref_offset = len(data)
+    data += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("ascii")
+    for offset in offsets:
+        data += f"{offset:010d} 00000 n \n".encode("ascii")
+    data += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+        f"startxref\n{xref_offset}\n%%EOF\n"
+    ).encode("ascii")
+    with open(pdf_file, "wb") as f:
+        f.write(data)
+
+
+def _schedule_rows(result, pdf_file, summary_lines, schedule):
+    return len(schedule)
+
+
+@instrumented("export.save_schedule_to_pdf_file", rows=_schedule_rows)
+def save_schedule_to_pdf_file(pdf_file, summary_lines, schedule):
+    """Write the summary and every row of the schedule to a PDF report."""
+    lines = list(summary_lines) + ["", CSV_HEADER.replace(",", "    ")]
+    for date, payment, principal, interest, left in zip(
+        schedule.date.tolist(),
+        schedule.payment.tolist(),
+        schedule.principal.tolist(),
+        schedule.interest.tolist(),
+        schedule.left.tolist(),
+    ):
+        lines.append(
+            f"{date}  {payment:>12.2f}  {principal:>12.2f}"
+            f"  {interest:>12.2f}  {left:>14.2f}"
+        )
+    write_lines_pdf(pdf_file, lines)
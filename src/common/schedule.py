@@ -0,0 +1,137 @@
+"""
+Copyright 2025. All rights reserved.
+Authors: guanchenglichina@qq.com (Guancheng Li)
+
+Columnar schedule of monthly payments.
+"""
+
+import numpy as np
+
+from common.meta_info import MetaInfo
+
+
+class Schedule:
+    """Monthly payments stored as contiguous columns, sorted by date.
+
+    Dates are integers in yyyymmdd form. The schedule is never modified in
+    place: `head`, `concat` and `set_row` return new schedules which share the
+    unchanged columns, so a schedule can be handed out without copying.
+    Read access by "YYYYMMDD" key returns `MetaInfo` rows, which keeps the
+    dict-like interface of the former `monthly_meta_info`.
+    """
+
+    COLUMNS = ("index", "date", "payment", "principal", "interest", "left")
+
+    def __init__(
+        self,
+        index=(),
+        date=(),
+        payment=(),
+        principal=(),
+        interest=(),
+        left=(),
+    ):
+        self.index = np.ascontiguousarray(index, dtype=np.int32)
+        self.date = np.ascontiguousarray(date, dtype=np.int32)
+        self.payment = np.ascontiguousarray(payment, dtype=np.float64)
+        self.principal = np.ascontiguousarray(principal, dtype=np.float64)
+        self.interest = np.ascontiguousarray(interest, dtype=np.float64)
+        self.left = np.ascontiguousarray(left, dtype=np.float64)
+        if any(len(column) != len(self.date) for column in self.columns()):
+            raise ValueError("Schedule columns must have the same length.")
+        if len(self.date) > 1 and not np.all(self.date[1:] > self.date[:-1]):
+            raise ValueError("Schedule dates must be strictly increasing.")
+
+    def __len__(self):
+        return len(self.date)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __contains__(self, date_str):
+        position = self.search(date_str)
+        return position > 0 and self.date[position - 1] == int(date_str)
+
+    def __getitem__(self, date_str):
+        position = self.search(date_str)
+        if position == 0 or self.date[position - 1] != int(date_str):
+            raise KeyError(date_str)
+        return self.row(position - 1)
+
+    def keys(self):
+        return [str(date) for date in self.date.tolist()]
+
+    def values(self):
+        for i in range(len(self)):
+            yield self.row(i)
+
+    def items(self):
+        for meta in self.values():
+            yield meta.date_str, meta
+
+    def row(self, position):
+        return MetaInfo(
+            int(self.index[position]),
+            str(self.date[position]),
+            float(self.payment[position]),
+            float(self.principal[position]),
+            float(self.interest[position]),
+            float(self.left[position]),
+        )
+
+    def columns(self):
+        return tuple(getattr(self, name) for name in self.COLUMNS)
+
+    def search(self, date_str):
+        """Number of rows paid on or before the date."""
+        return int(np.searchsorted(self.date, int(date_str), side="right"))
+
+    def head(self, n):
+        return Schedule(*(column[:n] for column in self.columns()))
+
+    def tail(self, n):
+        return Schedule(*(column[n:] for column in self.columns()))
+
+    def concat(self, other):
+        return Schedule.concatenate([self, other])
+
+    @staticmethod
+    def concatenate(schedules):
+        """Join schedules which follow each other by date."""
+        if not schedules:
+            return Schedule()
+        return Schedule(
+            *(
+                np.concatenate(columns)
+                for columns in zip(*(schedule.columns() for schedule in schedules))
+            )
+        )
+
+    def set_row(self, meta):
+        """Put the row at its date, rows on and after that date are dropped."""
+        position = int(np.searchsorted(self.date, int(meta.date_str), side="left"))
+        return self.head(position).concat(
+            Schedule(
+                [meta.index],
+                [int(meta.date_str)],
+                [meta.monthly_payment],
+                [meta.monthly_principal_amount],
+                [meta.monthly_interest_amount],
+                [meta.left_loan_amount],
+            )
+        )
+
+    def total_interest(self):
+        return float(self.interest.sum())
+
+    def total_payment(self):
+        return float(self.payment.sum())
+
+    def nbytes(self):
+        return sum(column.nbytes for column in self.columns())
+
+    def freeze(self):
+        """Make the columns read-only, for schedules shared by a cache."""
+        for column in self.columns():
+            column.flags.writeable = False
+        return self
@@ -0,0 +1,93 @@
+"""
+Copyright 2025. All rights reserved.
+Authors: guanchenglichina@qq.com (Guancheng Li)
+
+Totals of a schedule by calendar year and over rolling windows.
+"""
+
+import numpy as np
+
+from common.date_time_utils import get_date_int_array_next_n_month
+
+
+def _prefix_sums(schedule, prefix_sums=None, k=0):
+    """Prefix sums of the COLUMNS of a schedule, one row each, the first
+    k + 1 values taken from earlier `prefix_sums` of the same first k rows."""
+    result = np.empty((len(ScheduleAggregates.COLUMNS), len(schedule) + 1))
+    if prefix_sums is None:
+        result[:, 0] = 0.0
+    else:
+        result[:, : k + 1] = prefix_sums[:, : k + 1]
+    for row, name in enumerate(ScheduleAggregates.COLUMNS):
+        result[row, k + 1 :] = getattr(schedule, name)[k:]
+    # one sequential sum from row k on, so updated prefix sums have the
+    # same values as ones built from scratch.
+    np.cumsum(result[:, k:], axis=1, out=result[:, k:])
+    return result
+
+
+class ScheduleAggregates:
+    """Prefix sums of the payment, principal and interest of a schedule.
+
+    Index k of a prefix sum holds the sum of the first k rows. A rollup is
+    the difference of two prefix sums, so the totals of a year or of a
+    rolling window cost a binary search and not a walk of their rows. When
+    the tail of a schedule is regenerated, `update` only sums the new rows.
+    """
+
+    COLUMNS = ("payment", "principal", "interest")
+
+    def __init__(self, schedule, prefix_sums=None):
+        self.schedule = schedule
+        self.date = schedule.date
+        self._prefix_sums = (
+            _prefix_sums(schedule) if prefix_sums is None else prefix_sums
+        )
+
+    def __len__(self):
+        return len(self.date)
+
+    def update(self, schedule, unchanged_row_count):
+        """Aggregates of `schedule`, whose first `unchanged_row_count` rows
+        are the ones of this schedule."""
+        k = min(unchanged_row_count, len(self), len(schedule))
+        return ScheduleAggregates(
+            schedule, _prefix_sums(schedule, self._prefix_sums, k)
+        )
+
+    def prefix_sum(self, name):
+        """Sums of the column over the first k rows, at index k."""
+        return self._prefix_sums[self.COLUMNS.index(name)]
+
+    def total(self, name):
+        return float(self.prefix_sum(name)[-1])
+
+    def yearly(self):
+        """A dict of "year" and the sums of every column by calendar year,
+        from the first to the last year of the schedule."""
+        if not len(self):
+            return {"year": np.zeros(0, dtype=np.int64)} | {
+                name: np.zeros(0) for name in self.COLUMNS
+            }
+        years = np.arange(self.date[0] // 10000, self.date[-1] // 10000 + 1)
+        boundaries = np.searchsorted(self.date, np.append(years, years[-1] + 1) * 10000)
+        yearly = {"year": years}
+        for name in self.COLUMNS:
+            yearly[name] = np.diff(self.prefix_sum(name)[boundaries])
+        return yearly
+
+    def rolling(self, name="payment", months=12, dates=None):
+        """Sums of a column over the `months` up to each date, after the date
+        `months` earlier and on or before the date. Dates are the payment
+        dates by default, or "YYYYMMDD" strings or integers."""
+        if dates is None:
+            dates = self.date
+        dates = np.asarray(dates).astype(np.int64)
+        window_start = get_date_int_array_next_n_month(
+            dates // 10000, dates // 100 % 100, dates % 100, -months
+        )
+        prefix_sum = self.prefix_sum(name)
+        return (
+            prefix_sum[np.searchsorted(self.date, dates, side="right")]
+            - prefix_sum[np.searchsorted(self.date, window_start, side="right")]
+        )
@@ -0,0 +1,237 @@
+"""
+Copyright 2025. All rights reserved.
+Authors: guanchenglichina@qq.com (Guancheng Li)
+
+Streaming export of schedules to csv (optionally gzip) and to npy.
+"""
+
+import gzip
+
+import numpy as np
+
+from common.instrumentation import instrumented
+
+CSV_HEADER = "还款日期,还款额,本金,利息,剩余本金"
+CSV_LOAN_ID_HEADER = "贷款编号"
+
+SCHEDULE_DTYPE = np.dtype(
+    [
+        ("loan_id", np.int64),
+        ("index", np.int32),
+        ("date", np.int32),
+        ("payment", np.float64),
+        ("principal", np.float64),
+        ("interest", np.float64),
+        ("left", np.float64),
+    ]
+)
+
+
+def _schedule_arg_rows(result, writer, schedule, *args, **kwargs):
+    return len(schedule)
+
+
+def _portfolio_arg_rows(result, writer, offset, portfolio, *args, **kwargs):
+    return int(portfolio.mask.sum())
+
+
+def _open_text(path):
+    if str(path).endswith(".gz"):
+        return gzip.open(path, "wt", encoding="utf-8", newline="")
+    return open(path, "w", encoding="utf-8", newline="")
+
+
+class ScheduleCsvWriter:
+    """Write schedules row block by row block, many loans to one file.
+
+    A path ending with ".gz" is gzip compressed, an open text file such as
+    `io.StringIO` is written to and left open. With `with_loan_id`, the
+    first column is the loan id, so the rows of a portfolio share one file.
+    """
+
+    BLOCK_SIZE = 4096
+
+    def __init__(self, csv_file, with_header=False, with_loan_id=False):
+        self.csv_file = csv_file
+        self.with_header = with_header
+        self.with_loan_id = with_loan_id
+        self.row_count = 0
+        self._file = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        if hasattr(self.csv_file, "write"):
+            self._file = self.csv_file
+        else:
+            self._file = _open_text(self.csv_file)
+        if self.with_header:
+            header = CSV_HEADER
+            if self.with_loan_id:
+                header = f"{CSV_LOAN_ID_HEADER},{header}"
+            self._file.write(header + "\n")
+
+    def close(self):
+        if self._file is not None and self._file is not self.csv_file:
+            self._file.close()
+        self._file = None
+
+    def _write_lines(self, lines):
+        if lines:
+            self._file.write("\n".join(lines) + "\n")
+            self.row_count += len(lines)
+
+    def _format(self, loan_id, date_str, payment, principal, interest, left):
+        line = f"{date_str},{payment:.2f},{principal:.2f},{interest:.2f},{left:.2f}"
+        if self.with_loan_id:
+            line = f"{loan_id},{line}"
+        return line
+
+    @instrumented("export.write_csv_schedule", rows=_schedule_arg_rows)
+    def write_schedule(self, schedule, loan_id=None):
+        """Write a whole Schedule, one block of rows at a time."""
+        for start in range(0, len(schedule), self.BLOCK_SIZE):
+            block = slice(start, start + self.BLOCK_SIZE)
+            self._write_lines(
+                [
+                    self._format(loan_id, *row)
+                    for row in zip(
+                        schedule.date[block].tolist(),
+                        schedule.payment[block].tolist(),
+                        schedule.principal[block].tolist(),
+                        schedule.interest[block].tolist(),
+                        schedule.left[block].tolist(),
+                    )
+                ]
+            )
+
+    def write_rows(self, rows, loan_id=None):
+        """Write MetaInfo rows as they come, e.g. from a generator."""
+        lines = []
+        for meta in rows:
+            lines.append(
+                self._format(
+                    loan_id,
+                    meta.date_str,
+                    meta.monthly_payment,
+                    meta.monthly_principal_amount,
+                    meta.monthly_interest_amount,
+                    meta.left_loan_amount,
+                )
+            )
+            if len(lines) == self.BLOCK_SIZE:
+                self._write_lines(lines)
+                lines = []
+        self._write_lines(lines)
+
+
+class ScheduleNpyWriter:
+    """Append schedules to a .npy file of SCHEDULE_DTYPE records.
+
+    The rows go to disk as they are written, the shape in the header is
+    fixed on close. The file is a plain .npy, `load_schedules` maps it back
+    without reading it.
+    """
+
+    # room for the row count to grow in the header.
+    _SHAPE_DIGITS = 20
+
+    def __init__(self, npy_file):
+        self.npy_file = npy_file
+        self.row_count = 0
+        self._file = None
+        self._header_size = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _header(self, row_count, header_size=None):
+        header = repr(
+            {
+                "descr": np.lib.format.dtype_to_descr(SCHEDULE_DTYPE),
+                "fortran_order": False,
+                "shape": (row_count,),
+            }
+        )
+        if header_size is None:
+            # magic (6) + version (2) + length (2) + header, aligned to 64.
+            header_size = -(-(10 + len(header) + self._SHAPE_DIGITS + 1) // 64) * 64
+        header = header.ljust(header_size - 10 - 1) + "\n"
+        return (
+            b"\x93NUMPY\x01\x00"
+            + np.uint16(len(header)).tobytes()
+            + header.encode("latin1")
+        )
+
+    def open(self):
+        self._file = open(self.npy_file, "wb")
+        header = self._header(0)
+        self._header_size = len(header)
+        self._file.write(header)
+
+    def close(self):
+        if self._file is None:
+            return
+        self._file.seek(0)
+        self._file.write(self._header(self.row_count, self._header_size))
+        self._file.close()
+        self._file = None
+
+    @instrumented("export.write_npy_schedule", rows=_schedule_arg_rows)
+    def write_schedule(self, schedule, loan_id=0):
+        records = np.empty(len(schedule), dtype=SCHEDULE_DTYPE)
+        records["loan_id"] = loan_id
+        for name in schedule.COLUMNS:
+            records[name] = getattr(schedule, name)
+        self._file.write(records.tobytes())
+        self.row_count += len(records)
+
+    @instrumented("export.write_npy_portfolio", rows=_portfolio_arg_rows)
+    def write_portfolio(self, offset, result):
+        """Write all loans of a PortfolioResult, loan ids start at offset."""
+        loan_ids, months = np.nonzero(result.mask)
+        records = np.empty(len(loan_ids), dtype=SCHEDULE_DTYPE)
+        records["loan_id"] = offset + loan_ids
+        records["index"] = months + 1
+        for name in ("date", "payment", "principal", "interest", "left"):
+            records[name] = getattr(result, name)[result.mask]
+        self._file.write(records.tobytes())
+        self.row_count += len(records)
+
+
+def save_portfolio(portfolio_chunks, export_file, with_header=False):
+    """Export the (offset, PortfolioResult) chunks of `iter_portfolio`.
+
+    A path ending with ".npy" is written as records, others as csv with a
+    loan id column. Only one chunk is held in memory at a time.
+    """
+    if str(export_file).endswith(".npy"):
+        with ScheduleNpyWriter(export_file) as writer:
+            for offset, result in portfolio_chunks:
+                writer.write_portfolio(offset, result)
+        return writer.row_count
+    with ScheduleCsvWriter(export_file, with_header, with_loan_id=True) as writer:
+        for offset, result in portfolio_chunks:
+            for loan_id in range(len(result)):
+                writer.write_schedule(result.get_schedule(loan_id), offset + loan_id)
+    return writer.row_count
+
+
+def load_schedules(npy_file, mmap=True):
+    """Records written by ScheduleNpyWriter, memory mapped by default."""
+    return np.load(npy_file, mmap_mode="r" if mmap else None)
+
+
+def get_loan_records(records, loan_id):
+    """Rows of one loan, loans must be written in increasing id order."""
+    start, end = np.searchsorted(records["loan_id"], [loan_id, loan_id + 1])
+    return records[start:end]
@@ -0,0 +1,110 @@
+"""
+Copyright 2025. All rights reserved.
+Authors: guanchenglichina@qq.com (Guancheng Li)
+
+Point queries on a schedule as of any date.
+"""
+
+import numpy as np
+
+from common.schedule_aggregates import ScheduleAggregates
+
+
+class ScheduleQuery:
+    """Balance and paid amounts of a schedule as of any date.
+
+    Paid amounts are the prefix sums of ScheduleAggregates, a query is a
+    binary search of the dates, so it costs O(log n) for one date and also
+    takes an array of dates. A date between two payment dates counts the
+    payments made on or before it, and the early payments of
+    `early_payment_records` made since the last of them.
+    """
+
+    def __init__(
+        self, schedule, loan_amount=None, early_payment_records=(), aggregates=None
+    ):
+        if loan_amount is None:
+            loan_amount = (
+                float(schedule.left[0] + schedule.principal[0]) if len(schedule) else 0
+            )
+        self.loan_amount = loan_amount
+        self.date = schedule.date
+        # index k holds the value after the first k payments.
+        self._balance = np.concatenate([[loan_amount], schedule.left])
+        if aggregates is None:
+            aggregates = ScheduleAggregates(schedule)
+        self._interest_paid = aggregates.prefix_sum("interest")
+        self._payment_paid = aggregates.prefix_sum("payment")
+        # records sorted by date, and the rows paid before each of them.
+        self._early_payment_date = np.array(
+            [int(record["date"]) for record in early_payment_records], dtype=np.int64
+        )
+        self._early_payment_paid = np.concatenate(
+            [
+                [0],
+                np.cumsum(
+                    [float(record["amount"]) for record in early_payment_records]
+                ),
+            ]
+        )
+        self._early_payment_month_count = np.searchsorted(
+            self.date, self._early_payment_date, side="right"
+        )
+
+    def __len__(self):
+        return len(self.date)
+
+    def paid_month_count(self, dates):
+        """Number of payments made on or before the dates.
+
+        Dates are "YYYYMMDD" strings or integers, or a sequence of them.
+        """
+        dates = np.asarray(dates).astype(np.int64)
+        return np.searchsorted(self.date, dates, side="right")
+
+    def _balance_as_of(self, dates, paid_month_count):
+        """Left principal after the payments and early payments made by the
+        dates. Early payments before the last payment are in its balance."""
+        dates = np.asarray(dates).astype(np.int64)
+        first = np.searchsorted(
+            self._early_payment_month_count, paid_month_count, side="left"
+        )
+        last = np.maximum(
+            np.searchsorted(self._early_payment_date, dates, side="right"), first
+        )
+        early_payment_paid = (
+            self._early_payment_paid[last] - self._early_payment_paid[first]
+        )
+        # an early payment which pays off the loan may be more than its balance.
+        return np.maximum(self._balance[paid_month_count] - early_payment_paid, 0.0)
+
+    def as_of(self, dates):
+        """A dict of the loan state after the payments made by the dates.
+
+        "balance" is the left principal, "principal_paid" is the principal
+        paid off including early payments, "interest_paid" and
+        "payment_paid" sum the monthly payments. Values are scalars for one
+        date and arrays for a sequence of dates.
+        """
+        paid_month_count = self.paid_month_count(dates)
+        balance = self._balance_as_of(dates, paid_month_count)
+        return {
+            "paid_month_count": paid_month_count,
+            "left_month_count": len(self) - paid_month_count,
+            "balance": balance,
+            "principal_paid": self.loan_amount - balance,
+            "interest_paid": self._interest_paid[paid_month_count],
+            "payment_paid": self._payment_paid[paid_month_count],
+        }
+
+    def balance(self, dates):
+        return self._balance_as_of(dates, self.paid_month_count(dates))
+
+    def interest_paid(self, dates):
+        return self._interest_paid[self.paid_month_count(dates)]
+
+    def principal_paid(self, dates):
+        return self.loan_amount - self.balance(dates)
+
+    def left_month_count(self, dates):
+        return len(self) - self.paid_month_count(dates)
@@ -0,0 +1,158 @@
+"""
+Copyright 2025. All rights reserved.
+Authors: guanchenglichina@qq.com (Guancheng Li)
+
+Vectorized amortization columns for annuity and linear loans.
+
+All functions accept numpy broadcastable arguments, so the same code builds a
+single schedule (`periods` is 1-D) or a batch of schedules (`periods` is a row
+vector and the loan parameters are column vectors).
+"""
+
+import numpy as np
+
+from common.date_time_utils import int_to_datetime64
+
+
+def _compound_sum(monthly_interest_rate, n):
+    """((1 + r) ^ n - 1) / r, which is n when r is 0."""
+    rate = np.asarray(monthly_interest_rate, dtype=np.float64)
+    n = np.asarray(n, dtype=np.float64)
+    safe_rate = np.where(rate == 0, 1.0, rate)
+    compound = np.expm1(n * np.log1p(safe_rate)) / safe_rate
+    return np.where(rate == 0, n, compound)
+
+
+def annuity_payment(monthly_interest_rate, loan_term_by_month, loan_amount):
+    """Fixed monthly payment of an annuity loan, same as `pmt(r, n, -pv)`."""
+    rate = np.asarray(monthly_interest_rate, dtype=np.float64)
+    growth = np.power(1.0 + rate, loan_term_by_month)
+    return (loan_amount * growth / _compound_sum(rate, loan_term_by_month))[()]
+
+
+def annuity_term(monthly_interest_rate, monthly_payment, loan_amount):
+    """Months to pay off the loan by the monthly payment, same as `nper`."""
+    rate = np.asarray(monthly_interest_rate, dtype=np.float64)
+    safe_rate = np.where(rate == 0, 1.0, rate)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # the payment must cover the interest, otherwise the term is inf/nan.
+        term = -np.log1p(-safe_rate * loan_amount / monthly_payment) / np.log1p(
+            safe_rate
+        )
+    return np.where(rate == 0, loan_amount / monthly_payment, term)[()]
+
+
+# float noise of a term which is a whole number of months.
+TERM_TOLERANCE = 1e-9
+
+
+def ceil_term(term):
+    """Whole months of a term, a term within float noise of a whole number
+    is not rounded up to the next month."""
+    return np.ceil(np.asarray(term, dtype=np.float64) - TERM_TOLERANCE)[()]
+
+
+def annuity_columns(periods, loan_amount, monthly_interest_rate, monthly_payment):
+    """Payment, principal, interest and left loan amount of annuity periods.
+
+    `periods` are 1-based period numbers, the left loan amount before period
+    `i` is the closed form `L * (1 + r) ^ (i - 1) - P * s(i - 1)`.
+    """
+    rate = np.asarray(monthly_interest_rate, dtype=np.float64)
+    paid_periods = np.asarray(periods, dtype=np.float64) - 1
+    left_before = loan_amount * np.power(
+        1.0 + rate, paid_periods
+    ) - monthly_payment * _compound_sum(rate, paid_periods)
+    interest = left_before * rate
+    principal = monthly_payment - interest
+    left = np.maximum(left_before - principal, 0.0)
+    payment = np.broadcast_to(monthly_payment, interest.shape)
+    return payment, principal, interest, left
+
+
+def linear_columns(periods, loan_amount, monthly_interest_rate, monthly_principal):
+    """Payment, principal, interest and left loan amount of linear periods."""
+    periods = np.asarray(periods, dtype=np.float64)
+    left_before = loan_amount - (periods - 1) * monthly_principal
+    interest = left_before * monthly_interest_rate
+    principal = np.broadcast_to(monthly_principal, interest.shape)
+    payment = principal + interest
+    left = np.maximum(left_before - monthly_principal, 0.0)
+    return payment, principal, interest, left
+
+
+# days of a year by day count convention.
+DAY_COUNTS = {"actual/365": 365, "actual/360": 360}
+
+
+def get_days_in_year(day_count):
+    if day_count not in DAY_COUNTS:
+        raise ValueError(f"Unknown day count: {day_count}")
+    return DAY_COUNTS[day_count]
+
+
+def daily_period_rates(annual_interest_rate, accrual_dates, days_in_year):
+    """Interest rate of each period by the actual days between dates.
+
+    `accrual_dates` are yyyymmdd integers along the last axis, the interest
+    of period i accrues from date i - 1 to date i.
+    """
+    days = np.diff(int_to_datetime64(accrual_dates), axis=-1).astype(np.float64)
+    return np.asarray(annual_interest_rate, dtype=np.float64) * days / days_in_year
+
+
+def _daily_discount(period_rates):
+    """Growth `G(i)` of a unit to period i and the sum of `1 / G` up to i."""
+    growth = np.cumprod(1.0 + period_rates, axis=-1)
+    return growth, np.cumsum(1.0 / growth, axis=-1)
+
+
+def daily_annuity_payment(period_rates, loan_amount, loan_term_by_month=None):
+    """Level payment which pays off the loan over all the periods, or over
+    the first `loan_term_by_month` of them."""
+    _, discount_sum = _daily_discount(period_rates)
+    if loan_term_by_month is None:
+        discount_sum = discount_sum[..., -1:]
+    else:
+        discount_sum = np.take_along_axis(
+            discount_sum, np.asarray(loan_term_by_month) - 1, axis=-1
+        )
+    return (np.asarray(loan_amount) / discount_sum)[..., 0]
+
+
+def daily_annuity_columns(
+    period_rates, loan_amount, monthly_payment, accrued_interest=0.0
+):
+    """Payment, principal, interest and left loan amount of annuity periods
+    with a rate per period.
+
+    The left loan amount after period i is `G(i) * (L - P * S(i))`.
+    `accrued_interest` is interest of an earlier balance which is due on top
+    of the first payment, so its principal is the annuity one.
+    """
+    growth, discount_sum = _daily_discount(period_rates)
+    monthly_payment = np.asarray(monthly_payment, dtype=np.float64)[..., None]
+    left = growth * (loan_amount - monthly_payment * discount_sum)
+    left_before = np.concatenate(
+        [np.broadcast_to(loan_amount, left[..., :1].shape), left[..., :-1]], axis=-1
+    )
+    interest = left_before * period_rates
+    principal = monthly_payment - interest
+    interest[..., 0] += accrued_interest
+    payment = principal + interest
+    return payment, principal, interest, np.maximum(left, 0.0)
+
+
+def daily_linear_columns(
+    period_rates, loan_amount, monthly_principal, accrued_interest=0.0
+):
+    """Payment, principal, interest and left loan amount of linear periods
+    with a rate per period."""
+    periods = np.arange(period_rates.shape[-1], dtype=np.float64)
+    left_before = loan_amount - periods * monthly_principal
+    interest = left_before * period_rates
+    interest[..., 0] += accrued_interest
+    principal = np.broadcast_to(monthly_principal, interest.shape)
+    payment = principal + interest
+    left = np.maximum(left_before - monthly_principal, 0.0)
+    return payment, principal, interest, left
@@ -5,9 +5,24 @@ Authors: guanchenglichina@qq.com (Guancheng Li)
 Interface for loan calculator.
 """
 
+import copy
 from datetime import datetime
 
+import numpy as np
+
+from common.date_time_utils import (
+    get_date_int_next_n_month,
+    get_month_count_until,
+    int_to_date,
+)
+from common.instrumentation import instrumented, result_rows, schedule_rows
 from common.meta_info import MetaInfo
+from common.schedule import Schedule
+from common.schedule_export import ScheduleCsvWriter
+from common.schedule_aggregates import ScheduleAggregates
+from common.schedule_query import ScheduleQuery
+from core.rate_reset import get_rate_reset_records
+from core.schedule_tail import MaterializedTail
 
 
 class BaseCalculator:
@@ -21,8 +36,16 @@ class BaseCalculator:
         self.start_date = datetime.strptime(start_date_str, "%Y%m%d")
         self.total_interest = None
         self.total_payment = None
-        self.monthly_meta_info = {}
+        self.monthly_meta_info = Schedule()
+        # records applied to monthly_meta_info since `calculate()`.
+        self.early_payment_records = []
+        self._query = None
+        self._aggregates = None
+        # (schedule, row count, tail) where the last early payment sweep
+        # stopped, the tail keeps the balance after its last early payment.
+        self._open_tail = None
 
+    @instrumented("calculator.calculate_impl", rows=result_rows)
     def _calculate_impl(
         self,
         left_loan_term_by_month,
@@ -30,45 +53,103 @@ class BaseCalculator:
         executing_monthly_interest_rate,
         executing_start_date,
     ):
-        raise NotImplementedError
+        return self._calculate_tail(
+            left_loan_term_by_month,
+            left_loan_amount,
+            executing_monthly_interest_rate,
+            executing_start_date,
+        ).head(left_loan_term_by_month)
 
+    @instrumented("calculator.calculate_totals", rows=schedule_rows)
     def _calculate_total_interest_and_total_payment(self):
-        self.total_interest = 1.0 * sum(
-            [v.monthly_interest_amount for v in self.monthly_meta_info.values()]
-        )
-        self.total_payment = 1.0 * sum(
-            [v.monthly_payment for v in self.monthly_meta_info.values()]
-        )
+        aggregates = self.aggregates()
+        self.total_interest = aggregates.total("interest")
+        self.total_payment = aggregates.total("payment")
 
+    @instrumented("calculator.calculate", rows=schedule_rows)
     def calculate(self):
-        monthly_meta_info = self._calculate_impl(
+        self.monthly_meta_info = self._calculate_impl(
             self.loan_term_by_month,
             self.loan_amount,
             self.monthly_interest_rate,
             self.start_date,
         )
-        self.monthly_meta_info.update(monthly_meta_info)
+        self.early_payment_records = []
         self._calculate_total_interest_and_total_payment()
 
-    def get_info(self, add_monthly_info=False):
+    def _calculate_summary_impl(
+        self, paid_month_count, early_payment_amount, with_term_change, is_on_paid_date
+    ):
+        raise NotImplementedError
+
+    def calculate_summary(
+        self,
+        early_payment_date_str=None,
+        early_payment_amount=0,
+        with_term_change=False,
+    ):
+        """Calculate the totals in closed form, monthly_meta_info is not built.
+
+        At most one early payment is supported, the totals are the same as
+        `calculate()` followed by the early payment method.
+        """
+        paid_month_count = 0
+        is_on_paid_date = False
+        if early_payment_date_str is not None:
+            paid_month_count = min(
+                get_month_count_until(
+                    get_date_int_next_n_month(self.start_date, 0),
+                    int(early_payment_date_str),
+                ),
+                self.loan_term_by_month,
+            )
+            is_on_paid_date = paid_month_count > 0 and get_date_int_next_n_month(
+                self.start_date, paid_month_count - 1
+            ) == int(early_payment_date_str)
+        summary = self._calculate_summary_impl(
+            paid_month_count, early_payment_amount, with_term_change, is_on_paid_date
+        )
+        self.total_interest = float(summary["total_interest"])
+        self.total_payment = float(summary["total_payment"])
+        return summary
+
+    def get_yearly_info(self):
+        """Lines of the payment, principal and interest of every year."""
+        yearly = self.aggregates().yearly()
+        return [
+            f"{year}年: 还款 {payment:.2f}, 本金 {principal:.2f}, 利息 {interest:.2f}"
+            for year, payment, principal, interest in zip(
+                yearly["year"].tolist(),
+                yearly["payment"].tolist(),
+                yearly["principal"].tolist(),
+                yearly["interest"].tolist(),
+            )
+        ]
+
+    def get_info(self, add_monthly_info=False, add_yearly_info=False):
         lines = []
         lines.append(f"贷款总额: {self.loan_amount:.2f}")
         lines.append(f"贷款期限（月）: {self.loan_term_by_month}")
         lines.append(f"执行年利率: {100 * self.annual_interest_rate:.2f}%")
         lines.append(f"总还款额: {self.total_payment:.2f}")
         lines.append(f"总利息: {self.total_interest:.2f}")
+        if add_yearly_info:
+            lines.append("-" * 20)
+            lines.extend(self.get_yearly_info())
         if add_monthly_info:
             lines.append("-" * 20)
-            key_list = sorted(list(self.monthly_meta_info.keys()))
-            for key in key_list:
-                lines.append(",".join(self.monthly_meta_info[key].get_info()))
+            for meta in self.monthly_meta_info.values():
+                lines.append(",".join(meta.get_info()))
         return lines
 
-    def print_info(self, add_monthly_info=False):
+    def print_info(self, add_monthly_info=False, add_yearly_info=False):
         if add_monthly_info:
-            key_list = sorted(list(self.monthly_meta_info.keys()))
-            for key in key_list:
-                self.monthly_meta_info[key].print_info()
+            for meta in self.monthly_meta_info.values():
+                meta.print_info()
+        if add_yearly_info:
+            print("-" * 20)
+            for line in self.get_yearly_info():
+                print(line)
         print("-" * 20)
         print(f"贷款总额: {self.loan_amount:.2f}")
         print(f"贷款期限（月）: {self.loan_term_by_month}")
@@ -76,74 +157,387 @@ class BaseCalculator:
         print(f"总还款额: {self.total_payment:.2f}")
         print(f"总利息: {self.total_interest:.2f}")
 
+    @instrumented("export.save_to_csv_file", rows=schedule_rows)
     def save_to_csv_file(self, csv_file, with_header=False):
-        key_list = sorted(list(self.monthly_meta_info.keys()))
-        lines = []
-        if with_header:
-            lines.append("还款日期,还款额,本金,利息,剩余本金")
-        for key in key_list:
-            meta = self.monthly_meta_info[key]
-            meta_value = [
-                meta.date_str,
-                f"{meta.monthly_payment:.2f}",
-                f"{meta.monthly_principal_amount:.2f}",
-                f"{meta.monthly_interest_amount:.2f}",
-                f"{meta.left_loan_amount:.2f}",
-            ]
-            lines.append(",".join(meta_value))
-        with open(csv_file, "w") as f:
-            f.write("\n".join(lines) + "\n")
-
-    def _get_early_payment_date(self, early_payment_date_str):
-        pay_dates = sorted(list(self.monthly_meta_info.keys()))
-        past_months = []
-        left_months = []
-        for pay_date in pay_dates:
-            if pay_date <= early_payment_date_str:
-                past_months.append(pay_date)
-            else:
-                left_months.append(pay_date)
-        return past_months, left_months
+        """Stream the schedule to csv, a path ending with ".gz" is gzipped."""
+        with ScheduleCsvWriter(csv_file, with_header) as writer:
+            writer.write_schedule(self.monthly_meta_info)
 
-    def early_payment_without_term_change(
-        self, early_payment_date_str, early_payment_amount
-    ):
-        past_months, left_months = self._get_early_payment_date(early_payment_date_str)
-        if not left_months:
-            return
-        left_principal_amount = self.loan_amount
-        if past_months:
-            left_principal_amount = self.monthly_meta_info[
-                past_months[-1]
-            ].left_loan_amount
-        # all loan is paid.
-        if left_principal_amount <= early_payment_amount:
-            for item in left_months:
-                del self.monthly_meta_info[item]
-            self.monthly_meta_info[early_payment_date_str] = MetaInfo(
-                -1,
-                early_payment_date_str,
-                left_principal_amount,
-                0,
-                0,
-                0,
+    def query(self):
+        """ScheduleQuery of monthly_meta_info, rebuilt when it changes."""
+        if self._query is None or self._query.date is not self.monthly_meta_info.date:
+            self._query = ScheduleQuery(
+                self.monthly_meta_info,
+                self.loan_amount,
+                self.early_payment_records,
+                self.aggregates(),
             )
-            return
-        # part of loan is paid.
-        if not left_months:
-            return
-        restart_date_str = left_months[0]
-        restart_date = datetime.strptime(restart_date_str, "%Y%m%d")
-        monthly_meta_info = self._calculate_impl(
-            len(left_months),
-            left_principal_amount - early_payment_amount,
+        return self._query
+
+    def query_as_of(self, dates):
+        """Balance, interest and principal paid and left months by the dates,
+        early payments counted from their dates."""
+        return self.query().as_of(dates)
+
+    def aggregates(self):
+        """ScheduleAggregates of monthly_meta_info, rebuilt when it was
+        replaced other than by early payments."""
+        if (
+            self._aggregates is None
+            or self._aggregates.schedule is not self.monthly_meta_info
+        ):
+            self._aggregates = ScheduleAggregates(self.monthly_meta_info)
+        return self._aggregates
+
+    def _calculate_tail(
+        self,
+        left_loan_term_by_month,
+        left_loan_amount,
+        executing_monthly_interest_rate,
+        executing_start_date,
+    ):
+        raise NotImplementedError
+
+    def _early_payment_tail_with_term_change(
+        self, left_principal_amount_after_paid, left_dates
+    ):
+        raise NotImplementedError
+
+    def _early_payment_tail_without_term_change(
+        self, left_principal_amount_after_paid, left_dates
+    ):
+        restart_date = int_to_date(left_dates[0])
+        return self._calculate_tail(
+            len(left_dates),
+            left_principal_amount_after_paid,
             self.monthly_interest_rate,
             restart_date,
         )
-        self.monthly_meta_info.update(monthly_meta_info)
+
+    def _early_payment_tail(
+        self,
+        cycle_type,
+        tail,
+        past_month_count,
+        left_principal_amount,
+        early_payment_amount,
+        early_payment_date,
+        annual_interest_rate=None,
+    ):
+        """Tail after an early payment made after `past_month_count` rows of
+        the tail, at the new rate if `annual_interest_rate` is given."""
+        if annual_interest_rate is not None:
+            self._set_annual_interest_rate(annual_interest_rate)
+        left_dates = tail.dates[past_month_count:]
+        left_principal_amount_after_paid = left_principal_amount - early_payment_amount
+        if cycle_type == "short":
+            return self._early_payment_tail_with_term_change(
+                left_principal_amount_after_paid, left_dates
+            )
+        return self._early_payment_tail_without_term_change(
+            left_principal_amount_after_paid, left_dates
+        )
+
+    def _set_annual_interest_rate(self, annual_interest_rate):
+        self.annual_interest_rate = annual_interest_rate
+        self.monthly_interest_rate = self.annual_interest_rate / 12
+
+    @staticmethod
+    def _check_cycle_type(cycle_type):
+        if cycle_type not in ("short", "fixed"):
+            raise ValueError(f"Unknown cycle type: {cycle_type}")
+
+    def _accrued_interest(
+        self, tail, past_month_count, left_principal_amount, early_payment_date
+    ):
+        """Interest due on the date of an early payment, none as interest is
+        paid by month."""
+        return 0.0
+
+    @staticmethod
+    def _pay_off_row(
+        early_payment_date_str, left_principal_amount, paid_rows, accrued_interest=0.0
+    ):
+        pay_off = MetaInfo(
+            -1,
+            early_payment_date_str,
+            left_principal_amount + accrued_interest,
+            0,
+            accrued_interest,
+            0,
+        )
+        if early_payment_date_str in paid_rows:
+            # keep the monthly payment made on the same date.
+            paid_meta = paid_rows[early_payment_date_str]
+            pay_off.monthly_payment += paid_meta.monthly_payment
+            pay_off.monthly_principal_amount = paid_meta.monthly_principal_amount
+            pay_off.monthly_interest_amount += paid_meta.monthly_interest_amount
+        return pay_off
+
+    def _resume_sweep(self):
+        """Rows which are final and the tail where the last early payment
+        sweep stopped."""
+        schedule = self.monthly_meta_info
+        if self._open_tail is not None and self._open_tail[0] is schedule:
+            _, row_count, tail = self._open_tail
+            return [schedule.head(row_count)], tail
+        # the schedule was set from outside, its rows after the last record
+        # start from the balance after it.
+        row_count = 0
+        # without records it is the whole loan, not the float sum of a row.
+        loan_amount = self.loan_amount
+        if self.early_payment_records:
+            row_count = int(
+                np.searchsorted(
+                    schedule.date,
+                    int(self.early_payment_records[-1]["date"]),
+                    side="right",
+                )
+            )
+            loan_amount = None
+        left_rows = Schedule(*(column[row_count:] for column in schedule.columns()))
+        return [schedule.head(row_count)], MaterializedTail(left_rows, loan_amount)
+
+    def get_resume_state(self):
+        """Where later early payments resume: the left loan amount after the
+        last early payment, the date interest accrues from and the interest
+        accrued until it. The date is None when interest is paid by month or
+        accrues from the loan start."""
+        _, tail = self._resume_sweep()
+        return (
+            tail.loan_amount,
+            getattr(tail, "accrual_start_date", None),
+            getattr(tail, "accrued_interest", 0.0),
+        )
+
+    def set_resume_state(self, loan_amount, accrual_start_date, accrued_interest):
+        """Restore what `get_resume_state` returned after monthly_meta_info
+        and early_payment_records were set from outside, so later early
+        payments give what they give on the calculator which applied them."""
+        pieces, tail = self._resume_sweep()
+        self._open_tail = (
+            self.monthly_meta_info,
+            len(pieces[0]),
+            MaterializedTail(
+                tail.head(len(tail)), loan_amount, accrual_start_date, accrued_interest
+            ),
+        )
+
+    @instrumented("calculator.apply_early_payments", rows=schedule_rows)
+    def apply_early_payments(self, early_payment_records):
+        """Apply early payments in one forward sweep over the schedule.
+
+        Each record is a dict with "date" (YYYYMMDD), "amount" and
+        "cycle_type", which is "short" for the term change and "fixed" for
+        the unchanged term, as `ui_main.LoanCalculator.get_table_data` returns.
+        A record with an "annual_interest_rate" also resets the rate from its
+        date on, the rest of the loan is amortized again by the cycle type.
+
+        Records are applied in date order, records of the same date in the
+        given order. Applying them in one call or in several calls gives the
+        same result, but a record dated before an applied one raises
+        ValueError. Rows of a regenerated tail are only built up to the date
+        of the next record, so the records cost one pass over the schedule.
+        The records are added to `early_payment_records`.
+        """
+        for record in early_payment_records:
+            self._check_cycle_type(record["cycle_type"])
+        early_payment_records = sorted(
+            early_payment_records, key=lambda record: int(record["date"])
+        )
+        if (
+            early_payment_records
+            and self.early_payment_records
+            and int(early_payment_records[0]["date"])
+            < int(self.early_payment_records[-1]["date"])
+        ):
+            raise ValueError(
+                "Early payment records are dated before the applied ones, "
+                "calculate() again to apply all of them."
+            )
+        # Rows which are final, and the tail which is not built yet.
+        pieces, tail = self._resume_sweep()
+        applied_records = []
+        # rows before the first record are kept, their sums with them.
+        aggregates = self.aggregates()
+        unchanged_row_count = len(aggregates)
+        for record in early_payment_records:
+            applied_records.append(dict(record))
+            early_payment_date_str = record["date"]
+            early_payment_amount = float(record["amount"])
+            early_payment_date = int(early_payment_date_str)
+            unchanged_row_count = min(
+                unchanged_row_count,
+                int(np.searchsorted(aggregates.date, early_payment_date)),
+            )
+            past_month_count = int(
+                np.searchsorted(tail.dates, early_payment_date, side="right")
+            )
+            if past_month_count == len(tail):
+                continue
+            if past_month_count:
+                left_principal_amount = tail.left_at(past_month_count - 1)
+            else:
+                # also after an early payment earlier in the same month.
+                left_principal_amount = tail.loan_amount
+            pieces.append(tail.head(past_month_count))
+            # all loan is paid.
+            if left_principal_amount <= early_payment_amount:
+                paid_rows = Schedule.concatenate(pieces)
+                pay_off = self._pay_off_row(
+                    early_payment_date_str,
+                    left_principal_amount,
+                    paid_rows,
+                    self._accrued_interest(
+                        tail,
+                        past_month_count,
+                        left_principal_amount,
+                        early_payment_date,
+                    ),
+                )
+                pieces = [paid_rows.set_row(pay_off)]
+                tail = MaterializedTail(Schedule())
+                continue
+            # part of loan is paid.
+            tail = self._early_payment_tail(
+                record["cycle_type"],
+                tail,
+                past_month_count,
+                left_principal_amount,
+                early_payment_amount,
+                early_payment_date,
+                record.get("annual_interest_rate"),
+            )
+        paid_rows = Schedule.concatenate(pieces)
+        self.monthly_meta_info = paid_rows.concat(tail.head(len(tail)))
+        self._open_tail = (self.monthly_meta_info, len(paid_rows), tail)
+        self._aggregates = aggregates.update(
+            self.monthly_meta_info, unchanged_row_count
+        )
+        # a new list, copies of this calculator may share the old one.
+        self.early_payment_records = self.early_payment_records + applied_records
         self._calculate_total_interest_and_total_payment()
 
+    def iter_schedule(self, early_payment_records=(), block_size=64):
+        """Yield the MetaInfo rows of the schedule, monthly_meta_info is
+        not filled.
+
+        Early payment records are the ones `apply_early_payments` takes and
+        must be sorted by date. Rows are computed `block_size` at a time, so
+        taking the first months or stopping at a date costs only those
+        blocks. To stream a schedule to disk:
+
+            with ScheduleCsvWriter(csv_file) as writer:
+                writer.write_rows(calculator.iter_schedule(records))
+        """
+        # making tails sets the monthly payment, keep it off this calculator.
+        calculator = copy.copy(self)
+        tail = calculator._calculate_tail(
+            self.loan_term_by_month,
+            self.loan_amount,
+            self.monthly_interest_rate,
+            self.start_date,
+        )
+        # tail rows before position are yielded, the pending rows are paid
+        # on the date of the last early payment and held back as a later
+        # early payment on that date may pay off the loan.
+        position = 0
+        pending_rows = Schedule()
+        last_early_payment_date = 0
+        for record in early_payment_records:
+            early_payment_date_str = record["date"]
+            early_payment_amount = float(record["amount"])
+            self._check_cycle_type(record["cycle_type"])
+            early_payment_date = int(early_payment_date_str)
+            if early_payment_date < last_early_payment_date:
+                raise ValueError("Early payment records must be sorted by date.")
+            last_early_payment_date = early_payment_date
+            if len(pending_rows) and pending_rows.date[-1] < early_payment_date:
+                yield from pending_rows.values()
+                pending_rows = Schedule()
+            # a row on the date may still be merged into a pay off row.
+            paid_month_count = int(
+                np.searchsorted(tail.dates, early_payment_date, side="left")
+            )
+            yield from _iter_tail_rows(tail, position, paid_month_count, block_size)
+            position = paid_month_count
+            past_month_count = int(
+                np.searchsorted(tail.dates, early_payment_date, side="right")
+            )
+            if past_month_count == len(tail):
+                continue
+            if past_month_count:
+                left_principal_amount = tail.left_at(past_month_count - 1)
+            else:
+                left_principal_amount = tail.loan_amount
+            paid_rows = pending_rows.concat(tail.rows(position, past_month_count))
+            # all loan is paid.
+            if left_principal_amount <= early_payment_amount:
+                yield self._pay_off_row(
+                    early_payment_date_str,
+                    left_principal_amount,
+                    paid_rows,
+                    calculator._accrued_interest(
+                        tail,
+                        past_month_count,
+                        left_principal_amount,
+                        early_payment_date,
+                    ),
+                )
+                return
+            # part of loan is paid.
+            pending_rows = paid_rows
+            tail = calculator._early_payment_tail(
+                record["cycle_type"],
+                tail,
+                past_month_count,
+                left_principal_amount,
+                early_payment_amount,
+                early_payment_date,
+                record.get("annual_interest_rate"),
+            )
+            position = 0
+        yield from pending_rows.values()
+        yield from _iter_tail_rows(tail, position, len(tail), block_size)
+
+    def apply_rate_resets(self, rate_resets, cycle_type="fixed"):
+        """Reset the rate on dates, rate_resets are (date_str, annual rate).
+
+        Only the rows after each reset date are amortized again, with the
+        term kept ("fixed") or the monthly payment kept ("short"). The
+        calculator keeps the rate of the last reset.
+        """
+        self.apply_early_payments(get_rate_reset_records(rate_resets, cycle_type))
+
+    @instrumented("calculator.early_payment_without_term_change", rows=schedule_rows)
+    def early_payment_without_term_change(
+        self, early_payment_date_str, early_payment_amount
+    ):
+        self.apply_early_payments(
+            [
+                {
+                    "date": early_payment_date_str,
+                    "amount": early_payment_amount,
+                    "cycle_type": "fixed",
+                }
+            ]
+        )
+
+    @instrumented("calculator.early_payment_with_term_change", rows=schedule_rows)
     def early_payment_with_term_change(
         self, early_payment_date_str, early_payment_amount
     ):
-        raise NotImplementedError
+        self.apply_early_payments(
+            [
+                {
+                    "date": early_payment_date_str,
+                    "amount": early_payment_amount,
+                    "cycle_type": "short",
+                }
+            ]
+        )
+
+
+def _iter_tail_rows(tail, start, stop, block_size):
+    for block_start in range(start, stop, block_size):
+        yield from tail.rows(block_start, min(block_start + block_size, stop)).values()
@@ -0,0 +1,297 @@
+"""
+Copyright 2025. All rights reserved.
+Authors: guanchenglichina@qq.com (Guancheng Li)
+
+Batch runs of loan files, streamed to summary, schedule and error files.
+
+A loan is a CSV row or a JSON Lines object with "method",
+"annual_interest_rate", "loan_amount", "loan_term_by_month" and "start_date"
+(YYYYMMDD), and optional "loan_id", "day_count", "rounding" and
+"early_payments". In JSON Lines, "early_payments" is the list of records
+`apply_early_payments` takes; in CSV it is "date:amount:cycle_type" items
+separated by ";", with an optional fourth field of the new annual rate.
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import gzip
+import io
+import itertools
+import json
+import os
+
+from common.instrumentation import instrument
+from common.schedule_export import ScheduleCsvWriter
+from core.calculator_registry import new_calculator
+
+SUMMARY_COLUMNS = (
+    "loan_id",
+    "method",
+    "annual_interest_rate",
+    "loan_amount",
+    "loan_term_by_month",
+    "start_date",
+    "total_payment",
+    "total_interest",
+    "month_count",
+    "payoff_date",
+)
+ERROR_COLUMNS = ("line_number", "loan_id", "error")
+
+
+def get_file_format(loan_file):
+    if str(loan_file).endswith((".jsonl", ".json")):
+        return "jsonl"
+    return "csv"
+
+
+def iter_loan_file(loan_file, file_format=None):
+    """Yield (line number, loan record) of a CSV or JSON Lines file.
+
+    JSON lines are parsed by the workers, so a broken line is an error of
+    its loan and not of the whole file. Blank JSON lines are skipped.
+    """
+    file_format = file_format or get_file_format(loan_file)
+    with open(loan_file, encoding="utf-8", newline="") as f:
+        if file_format == "csv":
+            reader = csv.DictReader(f)
+            for record in reader:
+                yield reader.line_num, record
+        elif file_format == "jsonl":
+            for line_number, line in enumerate(f, start=1):
+                if line.strip():
+                    yield line_number, line
+        else:
+            raise ValueError(f"Unknown file format: {file_format}")
+
+
+def parse_early_payments(text):
+    """apply_early_payments records of "date:amount:cycle_type[:rate];..."."""
+    records = []
+    for item in text.split(";"):
+        if not item.strip():
+            continue
+        fields = item.strip().split(":")
+        if len(fields) not in (3, 4):
+            raise ValueError(f"Bad early payment: {item}")
+        record = {
+            "date": fields[0],
+            "amount": float(fields[1]),
+            "cycle_type": fields[2],
+        }
+        if len(fields) == 4:
+            record["annual_interest_rate"] = float(fields[3])
+        records.append(record)
+    return records
+
+
+def _optional(record, key):
+    value = record.get(key)
+    return None if value in (None, "") else value
+
+
+def run_loan(record, with_schedule=False):
+    """The summary row of SUMMARY_COLUMNS and the schedule, if asked for."""
+    calculator = new_calculator(
+        str(record["method"]).strip(),
+        float(record["annual_interest_rate"]),
+        float(record["loan_amount"]),
+        int(record["loan_term_by_month"]),
+        str(record["start_date"]).strip(),
+        _optional(record, "day_count"),
+        _optional(record, "rounding"),
+    )
+    calculator.calculate()
+    early_payments = _optional(record, "early_payments") or []
+    if isinstance(early_payments, str):
+        early_payments = parse_early_payments(early_payments)
+    if early_payments:
+        calculator.apply_early_payments(early_payments)
+    schedule = calculator.monthly_meta_info
+    row = (
+        record["loan_id"],
+        record["method"],
+        record["annual_interest_rate"],
+        record["loan_amount"],
+        record["loan_term_by_month"],
+        record["start_date"],
+        f"{calculator.total_payment:.2f}",
+        f"{calculator.total_interest:.2f}",
+        len(schedule),
+        str(schedule.date[-1]) if len(schedule) else "",
+    )
+    return row, schedule if with_schedule else None
+
+
+def _run_chunk(chunk, schedule_format, profile=False):
+    """Summary rows, schedule file data, error rows and, with `profile`, the
+    instrumented stages of the loans.
+
+    Schedules are formatted here in the worker, as csv bytes or as a gzip
+    member for "gz", so the writer only appends them.
+    """
+    if profile:
+        with instrument() as instrumentation:
+            results = _run_chunk(chunk, schedule_format)
+        return results[:3] + (instrumentation.stages,)
+    summaries, errors = [], []
+    schedule_text = io.StringIO()
+    with ScheduleCsvWriter(schedule_text, with_loan_id=True) as schedule_writer:
+        for line_number, record in chunk:
+            loan_id = str(line_number)
+            try:
+                if isinstance(record, str):
+                    record = json.loads(record)
+                record = dict(record)
+                loan_id = str(_optional(record, "loan_id") or line_number)
+                record["loan_id"] = loan_id
+                row, schedule = run_loan(record, schedule_format is not None)
+            except Exception as e:
+                # a bad loan is reported, it does not stop the batch.
+                errors.append((line_number, loan_id, f"{type(e).__name__}: {e}"))
+                continue
+            summaries.append(row)
+            if schedule is not None:
+                schedule_writer.write_schedule(schedule, loan_id)
+    schedule_data = schedule_text.getvalue().encode("utf-8")
+    if schedule_format == "gz":
+        schedule_data = gzip.compress(schedule_data)
+    return summaries, schedule_data, errors, None
+
+
+def _iter_chunks(records, chunk_size):
+    while True:
+        chunk = list(itertools.islice(records, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _map_chunks(chunks, schedule_format, max_workers, profile):
+    """Results of the chunks in order, with a bounded number in flight."""
+    if max_workers == 1:
+        for chunk in chunks:
+            yield _run_chunk(chunk, schedule_format, profile)
+        return
+    max_pending = 2 * (max_workers or os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(_run_chunk, chunk, schedule_format, profile))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _load_progress(progress_file):
+    if not os.path.exists(progress_file):
+        return None
+    with open(progress_file, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_progress(progress_file, progress):
+    # replace the file at once, a crash keeps the last whole progress.
+    tmp_file = progress_file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(progress, f)
+    os.replace(tmp_file, progress_file)
+
+
+def _start_outputs(output_files):
+    for name, path in output_files.items():
+        if name == "schedule":
+            with ScheduleCsvWriter(path, with_header=True, with_loan_id=True):
+                pass
+            continue
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            csv.writer(f).writerow(
+                SUMMARY_COLUMNS if name == "summary" else ERROR_COLUMNS
+            )
+
+
+def run_batch(
+    loan_file,
+    summary_file,
+    schedule_file=None,
+    error_file=None,
+    max_workers=None,
+    chunk_size=256,
+    resume=False,
+    file_format=None,
+    progress_file=None,
+    instrumentation=None,
+):
+    """Run every loan of the file and stream the results in file order.
+
+    Loans go to `max_workers` processes in chunks of `chunk_size`, and at
+    most two chunks per worker are in memory. Summaries go to the csv
+    `summary_file`, full schedules to `schedule_file` (".gz" is gzipped)
+    and loans which fail to `error_file`. After each chunk the progress is
+    saved to `progress_file`, by default next to the summary file; with
+    `resume`, a run cuts the outputs back to the saved progress and goes on
+    from the next loan. With an `instrumentation`, the stages of every
+    worker are added to it. Returns the progress, with the counts of loans
+    and errors.
+    """
+    progress_file = progress_file or f"{summary_file}.progress"
+    output_files = {
+        name: path
+        for name, path in (
+            ("summary", summary_file),
+            ("schedule", schedule_file),
+            ("error", error_file),
+        )
+        if path is not None
+    }
+    progress = _load_progress(progress_file) if resume else None
+    if progress is None:
+        _start_outputs(output_files)
+        progress = {
+            "loan_file": os.path.abspath(loan_file),
+            "loan_count": 0,
+            "error_count": 0,
+        }
+    else:
+        if progress["loan_file"] != os.path.abspath(loan_file):
+            raise ValueError(f"{progress_file} is the progress of another file.")
+        for name, path in output_files.items():
+            # drop what was written after the progress was saved.
+            if name not in progress["sizes"]:
+                raise ValueError(f"No progress of the {name} file to resume.")
+            with open(path, "r+b") as f:
+                f.truncate(progress["sizes"][name])
+
+    schedule_format = None
+    if schedule_file is not None:
+        schedule_format = "gz" if str(schedule_file).endswith(".gz") else "csv"
+    records = itertools.islice(
+        iter_loan_file(loan_file, file_format), progress["loan_count"], None
+    )
+    with open(summary_file, "a", encoding="utf-8", newline="") as summary_f, open(
+        error_file or os.devnull, "a", encoding="utf-8", newline=""
+    ) as error_f, open(schedule_file or os.devnull, "ab") as schedule_f:
+        summary_writer = csv.writer(summary_f)
+        error_writer = csv.writer(error_f)
+        for summaries, schedule_data, errors, stages in _map_chunks(
+            _iter_chunks(records, chunk_size),
+            schedule_format,
+            max_workers,
+            instrumentation is not None,
+        ):
+            if stages is not None:
+                instrumentation.merge(stages)
+            summary_writer.writerows(summaries)
+            error_writer.writerows(errors)
+            schedule_f.write(schedule_data)
+            for f in (summary_f, error_f, schedule_f):
+                f.flush()
+            progress["loan_count"] += len(summaries) + len(errors)
+            progress["error_count"] += len(errors)
+            progress["sizes"] = {
+                name: os.path.getsize(path) for name, path in output_files.items()
+            }
+            _save_progress(progress_file, progress)
+    return progress
@@ -0,0 +1,97 @@
+"""
+Copyright 2025. All rights reserved.
+Authors: guanchenglichina@qq.com (Guancheng Li)
+
+Calculator classes by repayment method, imported on first use.
+
+Importing this module is cheap, a calculator module (and NumPy with it) is
+only imported when its class is looked up, so short lived processes pay for
+the methods they use.
+"""
+
+from collections.abc import Mapping
+import importlib
+import threading
+
+ANNUITY = "annuity"
+LINEAR = "linear"
+
+
+class LazyRegistry(Mapping):
+    """Classes by name, given as "module:attribute" paths.
+
+    Looking a name up imports its module once, listing the names or checking
+    one with `in` imports nothing.
+    """
+
+    def __init__(self, paths):
+        self._paths = dict(paths)
+        self._classes = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name):
+        cls = self._classes.get(name)
+        if cls is None:
+            module_name, attribute = self._paths[name].split(":")
+            with self._lock:
+                cls = getattr(importlib.import_module(module_name), attribute)
+                self._classes[name] = cls
+        return cls
+
+    def __contains__(self, name):
+        return name in self._paths
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __len__(self):
+        return len(self._paths)
+
+    def register(self, name, path):
+        """Add or replace a class, by "module:attribute"."""
+        with self._lock:
+            self._paths[name] = path
+            self._classes.pop(name, None)
+
+
+CALCULATORS = LazyRegistry(
+    {
+        ANNUITY: "core.annuity_calculator:AnnuityCalculator",
+        LINEAR: "core.linear_calculator:LinearCalculator",
+    }
+)
+DAILY_CALCULATORS = LazyRegistry(
+    {
+        ANNUITY: "core.daily_accrual_calculator:DailyAnnuityCalculator",
+        LINEAR: "core.daily_accrual_calculator:DailyLinearCalculator",
+    }
+)
+EXACT_CALCULATORS = LazyRegistry(
+    {
+        ANNUITY: "core.exact_calculator:ExactAnnuityCalculator",
+        LINEAR: "core.exact_calculator:ExactLinearCalculator",
+    }
+)
+
+
+def new_calculator(
+    method,
+    annual_interest_rate,
+    loan_amount,
+    loan_term_by_month,
+    start_date_str,
+    day_count=None,
+    rounding=None,
+):
+    """A calculator of the method, by actual days with a `day_count` and in
+    integer cents with a `rounding`."""
+    if day_count is not None and rounding is not None:
+        raise ValueError("Exact cents only support monthly interest rates.")
+    if method not in CALCULATORS:
+        raise ValueError(f"Unknown method: {method}")
+    args = (annual_interest_rate, loan_amount, loan_term_by_month, start_date_str)
+    if day_count is not None:
+        return DAILY_CALCULATORS[method](*args, day_count=day_count)
+    if rounding is not None:
+        return EXACT_CALCULATORS[method](*args, rounding=rounding)
+    return CALCULATORS[method](*args)
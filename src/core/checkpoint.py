@@ -0,0 +1,343 @@
+"""
+Copyright 2025. All rights reserved.
+Authors: guanchenglichina@qq.com (Guancheng Li)
+
+Binary checkpoint of calculated calculators, memory mapped back.
+
+The file is the magic, a JSON header and sections of plain arrays, each
+aligned to 64 bytes:
+
+    b"LOANCKPT"  version (uint32)  header length (uint32)  header (JSON)
+    loans        one record of LOAN fields per calculator, sorted by id
+    events       the applied early payment records
+    index, date, payment, principal, interest, left
+                 the schedule columns of all calculators, one after another
+
+The header holds the offset, dtype and length of every section, dtypes are
+numpy descriptions, so nothing is unpickled. Loading maps the file and
+builds a calculator only when its id is looked up, its schedule columns are
+read-only views of the file.
+"""
+
+import json
+import math
+
+import numpy as np
+
+from common.date_time_utils import date_to_int
+from common.schedule import Schedule
+from core.calculator_registry import (
+    CALCULATORS,
+    DAILY_CALCULATORS,
+    EXACT_CALCULATORS,
+)
+
+CHECKPOINT_MAGIC = b"LOANCKPT"
+CHECKPOINT_VERSION = 2
+ALIGNMENT = 64
+
+# calculator registries by the kind stored in a checkpoint.
+CALCULATOR_KINDS = {
+    "monthly": CALCULATORS,
+    "daily": DAILY_CALCULATORS,
+    "exact": EXACT_CALCULATORS,
+}
+
+EVENT_DTYPE = np.dtype(
+    [
+        ("date", np.int32),
+        ("amount", np.float64),
+        ("cycle_type", "U8"),
+        # NaN when the record does not reset the rate.
+        ("annual_interest_rate", np.float64),
+    ]
+)
+
+
+def _loan_dtype(id_length):
+    return np.dtype(
+        [
+            ("loan_id", f"U{max(id_length, 1)}"),
+            ("kind", "U8"),
+            ("method", "U16"),
+            ("annual_interest_rate", np.float64),
+            ("loan_amount", np.float64),
+            ("loan_term_by_month", np.int32),
+            ("start_date", np.int32),
+            # NaN for None.
+            ("fixed_monthly_payment", np.float64),
+            ("total_interest", np.float64),
+            ("total_payment", np.float64),
+            ("day_count", "U16"),
+            ("rounding", "U16"),
+            ("balance_last_month", np.bool_),
+            # of `get_resume_state`, 0 for no accrual start date.
+            ("resume_loan_amount", np.float64),
+            ("accrual_start_date", np.int32),
+            ("accrued_interest", np.float64),
+            ("row_offset", np.int64),
+            ("row_count", np.int64),
+            ("event_offset", np.int64),
+            ("event_count", np.int64),
+        ]
+    )
+
+
+def _to_float(value):
+    return math.nan if value is None else float(value)
+
+
+def _from_float(value):
+    return None if math.isnan(value) else float(value)
+
+
+def _calculator_kinds():
+    """(kind, method) by calculator class."""
+    return {
+        registry[method]: (kind, method)
+        for kind, registry in CALCULATOR_KINDS.items()
+        for method in registry
+    }
+
+
+def _loan_records(items):
+    kinds = _calculator_kinds()
+    loan_ids = [str(loan_id) for loan_id, _ in items]
+    if len(set(loan_ids)) != len(loan_ids):
+        raise ValueError("Loan ids of a checkpoint must be unique.")
+    loans = np.zeros(len(items), dtype=_loan_dtype(max(map(len, loan_ids), default=1)))
+    row_offset = event_offset = 0
+    for record, loan_id, (_, calculator) in zip(loans, loan_ids, items):
+        kind = kinds.get(type(calculator))
+        if kind is None:
+            raise ValueError(f"Unknown calculator: {type(calculator).__name__}")
+        record["loan_id"] = loan_id
+        record["kind"], record["method"] = kind
+        record["annual_interest_rate"] = calculator.annual_interest_rate
+        record["loan_amount"] = calculator.loan_amount
+        record["loan_term_by_month"] = calculator.loan_term_by_month
+        record["start_date"] = date_to_int(calculator.start_date)
+        record["fixed_monthly_payment"] = _to_float(
+            getattr(calculator, "fixed_monthly_payment", None)
+        )
+        record["total_interest"] = _to_float(calculator.total_interest)
+        record["total_payment"] = _to_float(calculator.total_payment)
+        record["day_count"] = getattr(calculator, "day_count", "")
+        record["rounding"] = getattr(calculator, "rounding", "")
+        record["balance_last_month"] = getattr(calculator, "balance_last_month", True)
+        (
+            record["resume_loan_amount"],
+            accrual_start_date,
+            accrued_interest,
+        ) = calculator.get_resume_state()
+        record["accrual_start_date"] = accrual_start_date or 0
+        record["accrued_interest"] = accrued_interest
+        record["row_offset"] = row_offset
+        record["row_count"] = len(calculator.monthly_meta_info)
+        record["event_offset"] = event_offset
+        record["event_count"] = len(calculator.early_payment_records)
+        row_offset += len(calculator.monthly_meta_info)
+        event_offset += len(calculator.early_payment_records)
+    return loans
+
+
+def _event_records(early_payment_records):
+    events = np.zeros(len(early_payment_records), dtype=EVENT_DTYPE)
+    for event, record in zip(events, early_payment_records):
+        event["date"] = int(record["date"])
+        event["amount"] = float(record["amount"])
+        event["cycle_type"] = record["cycle_type"]
+        event["annual_interest_rate"] = _to_float(record.get("annual_interest_rate"))
+    return events
+
+
+def _section_layout(loans):
+    """Offsets of the sections from the start of the data, with dtypes and
+    lengths, aligned to ALIGNMENT."""
+    lengths = {
+        "loans": len(loans),
+        "events": int(loans["event_count"].sum()),
+    }
+    dtypes = {"loans": loans.dtype, "events": EVENT_DTYPE}
+    for name in Schedule.COLUMNS:
+        lengths[name] = int(loans["row_count"].sum())
+        dtypes[name] = np.dtype(np.int32 if name in ("index", "date") else np.float64)
+    sections = {}
+    offset = 0
+    for name, length in lengths.items():
+        offset += -offset % ALIGNMENT
+        sections[name] = {
+            "offset": offset,
+            "dtype": np.lib.format.dtype_to_descr(dtypes[name]),
+            "length": length,
+        }
+        offset += length * dtypes[name].itemsize
+    return sections
+
+
+def _write_section(f, data_start, section, arrays):
+    f.write(b"\0" * (data_start + section["offset"] - f.tell()))
+    dtype = np.lib.format.descr_to_dtype(section["dtype"])
+    for array in arrays:
+        f.write(np.ascontiguousarray(array, dtype=dtype).tobytes())
+
+
+def save_checkpoint(checkpoint_file, calculators):
+    """Write calculators to a checkpoint, `calculators` maps loan ids to
+    calculators after `calculate()`, or is a sequence of such pairs.
+
+    Columns are written calculator by calculator, nothing of the schedules
+    is copied in memory.
+    """
+    items = sorted(
+        (calculators.items() if hasattr(calculators, "items") else list(calculators)),
+        key=lambda item: str(item[0]),
+    )
+    loans = _loan_records(items)
+    sections = _section_layout(loans)
+    header = json.dumps({"sections": sections}).encode("utf-8")
+    # the data starts aligned, after the magic, version and header length.
+    prefix_size = len(CHECKPOINT_MAGIC) + 8
+    header += b" " * (-(prefix_size + len(header)) % ALIGNMENT)
+    data_start = prefix_size + len(header)
+    with open(checkpoint_file, "wb") as f:
+        f.write(CHECKPOINT_MAGIC)
+        f.write(np.array([CHECKPOINT_VERSION, len(header)], dtype="<u4").tobytes())
+        f.write(header)
+        _write_section(f, data_start, sections["loans"], [loans])
+        _write_section(
+            f,
+            data_start,
+            sections["events"],
+            (
+                _event_records(calculator.early_payment_records)
+                for _, calculator in items
+            ),
+        )
+        for name in Schedule.COLUMNS:
+            _write_section(
+                f,
+                data_start,
+                sections[name],
+                (
+                    getattr(calculator.monthly_meta_info, name)
+                    for _, calculator in items
+                ),
+            )
+
+
+class CalculatorCheckpoint:
+    """Calculators of a checkpoint file, built when they are looked up.
+
+    The file is memory mapped, a loaded calculator's `monthly_meta_info`
+    reads its rows from the page cache, and only the pages of the loans
+    looked up are read. The columns are read-only; applying early payments
+    to a loaded calculator builds new columns as usual.
+    """
+
+    def __init__(self, checkpoint_file):
+        self._buffer = np.memmap(checkpoint_file, dtype=np.uint8, mode="r")
+        prefix_size = len(CHECKPOINT_MAGIC) + 8
+        if bytes(self._buffer[: len(CHECKPOINT_MAGIC)]) != CHECKPOINT_MAGIC:
+            raise ValueError(f"{checkpoint_file} is not a checkpoint.")
+        version, header_size = np.frombuffer(
+            self._buffer, dtype="<u4", count=2, offset=len(CHECKPOINT_MAGIC)
+        ).tolist()
+        if version != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported checkpoint version: {version}")
+        header = json.loads(
+            bytes(self._buffer[prefix_size : prefix_size + header_size])
+        )
+        data_start = prefix_size + header_size
+        self._sections = {
+            name: np.frombuffer(
+                self._buffer,
+                dtype=np.lib.format.descr_to_dtype(section["dtype"]),
+                count=section["length"],
+                offset=data_start + section["offset"],
+            )
+            for name, section in header["sections"].items()
+        }
+        self.loans = self._sections["loans"]
+
+    def __len__(self):
+        return len(self.loans)
+
+    def __contains__(self, loan_id):
+        return self._position(loan_id) is not None
+
+    def __getitem__(self, loan_id):
+        position = self._position(loan_id)
+        if position is None:
+            raise KeyError(loan_id)
+        return self._load(self.loans[position])
+
+    def get(self, loan_id, default=None):
+        position = self._position(loan_id)
+        return default if position is None else self._load(self.loans[position])
+
+    def ids(self):
+        return self.loans["loan_id"].tolist()
+
+    def items(self):
+        for loan in self.loans:
+            yield str(loan["loan_id"]), self._load(loan)
+
+    def _position(self, loan_id):
+        loan_ids = self.loans["loan_id"]
+        position = int(np.searchsorted(loan_ids, str(loan_id)))
+        if position < len(loan_ids) and loan_ids[position] == str(loan_id):
+            return position
+        return None
+
+    def _load(self, loan):
+        kind = str(loan["kind"])
+        kwargs = {}
+        if kind == "daily":
+            kwargs["day_count"] = str(loan["day_count"])
+        elif kind == "exact":
+            kwargs["rounding"] = str(loan["rounding"])
+            kwargs["balance_last_month"] = bool(loan["balance_last_month"])
+        calculator = CALCULATOR_KINDS[kind][str(loan["method"])](
+            float(loan["annual_interest_rate"]),
+            float(loan["loan_amount"]),
+            int(loan["loan_term_by_month"]),
+            str(loan["start_date"]),
+            **kwargs,
+        )
+        # the rate of the last reset, the loan was created at its first rate.
+        calculator._set_annual_interest_rate(float(loan["annual_interest_rate"]))
+        if hasattr(calculator, "fixed_monthly_payment"):
+            calculator.fixed_monthly_payment = _from_float(
+                loan["fixed_monthly_payment"]
+            )
+        calculator.total_interest = _from_float(loan["total_interest"])
+        calculator.total_payment = _from_float(loan["total_payment"])
+        rows = slice(loan["row_offset"], loan["row_offset"] + loan["row_count"])
+        calculator.monthly_meta_info = Schedule(
+            *(self._sections[name][rows] for name in Schedule.COLUMNS)
+        )
+        events = self._sections["events"][
+            loan["event_offset"] : loan["event_offset"] + loan["event_count"]
+        ]
+        calculator.early_payment_records = [
+            _early_payment_record(event) for event in events
+        ]
+        calculator.set_resume_state(
+            float(loan["resume_loan_amount"]),
+            int(loan["accrual_start_date"]) or None,
+            float(loan["accrued_interest"]),
+        )
+        return calculator
+
+
+def _early_payment_record(event):
+    record = {
+        "date": str(event["date"]),
+        "amount": float(event["amount"]),
+        "cycle_type": str(event["cycle_type"]),
+    }
+    annual_interest_rate = _from_float(event["annual_interest_rate"])
+    if annual_interest_rate is not None:
+        record["annual_interest_rate"] = annual_interest_rate
+    return record
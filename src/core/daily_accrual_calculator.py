@@ -0,0 +1,266 @@
+"""
+Copyright 2025. All rights reserved.
+Authors: guanchenglichina@qq.com (Guancheng Li)
+
+Classes for calculating loans whose interest accrues by actual days.
+"""
+
+import numpy as np
+
+from common.date_time_utils import date_to_int, get_date_int_array_next_n_month
+from common.payment_calendar import get_payment_dates
+from core.amortization import (
+    ceil_term,
+    daily_annuity_columns,
+    daily_annuity_payment,
+    daily_linear_columns,
+    daily_period_rates,
+    get_days_in_year,
+)
+from core.base_calculator import BaseCalculator
+from core.schedule_tail import PrecomputedTail
+
+# a term change never extends the loan beyond this.
+MAX_LOAN_TERM_BY_MONTH = 100 * 12
+
+
+def get_previous_payment_date(date_int):
+    """The date a month before, where the interest of a first row accrues."""
+    date_int = int(date_int)
+    return int(
+        get_date_int_array_next_n_month(
+            date_int // 10000, date_int // 100 % 100, date_int % 100, -1
+        )
+    )
+
+
+class DailyAccrualCalculator(BaseCalculator):
+    """Interest of a row accrues by the actual days since the previous row.
+
+    The first row accrues from a month before the start date. An early
+    payment made between two payment dates splits the period: the interest
+    until the early payment date is on the balance before it, and is due
+    with the next monthly payment. `monthly_interest_rate` is only kept for
+    the interface, rates come from the dates and `day_count`.
+    """
+
+    def __init__(
+        self,
+        annual_interest_rate,
+        loan_amount,
+        loan_term_by_month,
+        start_date_str,
+        day_count="actual/365",
+    ):
+        super().__init__(
+            annual_interest_rate, loan_amount, loan_term_by_month, start_date_str
+        )
+        self.day_count = day_count
+        self.days_in_year = get_days_in_year(day_count)
+
+    def _period_rates(self, dates, accrual_start_date):
+        return daily_period_rates(
+            self.annual_interest_rate,
+            np.concatenate([[accrual_start_date], dates]),
+            self.days_in_year,
+        )
+
+    def _daily_tail(
+        self,
+        with_term_change,
+        loan_amount,
+        dates,
+        accrual_start_date,
+        accrued_interest=0.0,
+    ):
+        raise NotImplementedError
+
+    def _calculate_tail(
+        self,
+        left_loan_term_by_month,
+        left_loan_amount,
+        executing_monthly_interest_rate,
+        executing_start_date,
+    ):
+        dates = get_payment_dates(executing_start_date, left_loan_term_by_month)
+        return self._daily_tail(
+            False,
+            left_loan_amount,
+            dates,
+            get_previous_payment_date(date_to_int(executing_start_date)),
+        )
+
+    def _accrual_start(self, tail, past_month_count):
+        """The date interest accrues from and the interest accrued until it,
+        right after `past_month_count` rows of the tail."""
+        if past_month_count:
+            return int(tail.dates[past_month_count - 1]), 0.0
+        accrual_start_date = getattr(tail, "accrual_start_date", None)
+        if accrual_start_date is None:
+            # a tail built from rows accrues from the start of the loan.
+            accrual_start_date = get_previous_payment_date(date_to_int(self.start_date))
+        return accrual_start_date, getattr(tail, "accrued_interest", 0.0)
+
+    def _accrued_interest(
+        self, tail, past_month_count, left_principal_amount, early_payment_date
+    ):
+        accrual_start_date, accrued_interest = self._accrual_start(
+            tail, past_month_count
+        )
+        if early_payment_date > accrual_start_date:
+            accrued_interest += float(
+                left_principal_amount
+                * self._period_rates([early_payment_date], accrual_start_date)[0]
+            )
+        return accrued_interest
+
+    def _early_payment_tail(
+        self,
+        cycle_type,
+        tail,
+        past_month_count,
+        left_principal_amount,
+        early_payment_amount,
+        early_payment_date,
+        annual_interest_rate=None,
+    ):
+        accrual_start_date, _ = self._accrual_start(tail, past_month_count)
+        # interest until the date is at the rate before a reset.
+        accrued_interest = self._accrued_interest(
+            tail, past_month_count, left_principal_amount, early_payment_date
+        )
+        if annual_interest_rate is not None:
+            self._set_annual_interest_rate(annual_interest_rate)
+        return self._daily_tail(
+            cycle_type == "short",
+            left_principal_amount - early_payment_amount,
+            tail.dates[past_month_count:],
+            max(early_payment_date, accrual_start_date),
+            accrued_interest,
+        )
+
+    def _calculate_summary_impl(
+        self, paid_month_count, early_payment_amount, with_term_change, is_on_paid_date
+    ):
+        # rates change by period, there is no closed form of the totals.
+        raise NotImplementedError
+
+
+class DailyAnnuityCalculator(DailyAccrualCalculator):
+    def __init__(
+        self,
+        annual_interest_rate,
+        loan_amount,
+        loan_term_by_month,
+        start_date_str,
+        day_count="actual/365",
+    ):
+        super().__init__(
+            annual_interest_rate,
+            loan_amount,
+            loan_term_by_month,
+            start_date_str,
+            day_count,
+        )
+        self.fixed_monthly_payment = None
+
+    def _daily_tail(
+        self,
+        with_term_change,
+        loan_amount,
+        dates,
+        accrual_start_date,
+        accrued_interest=0.0,
+    ):
+        period_rates = self._period_rates(dates, accrual_start_date)
+        if not with_term_change:
+            self.fixed_monthly_payment = float(
+                daily_annuity_payment(period_rates, loan_amount)
+            )
+            return PrecomputedTail(
+                dates,
+                loan_amount,
+                daily_annuity_columns(
+                    period_rates,
+                    loan_amount,
+                    self.fixed_monthly_payment,
+                    accrued_interest,
+                ),
+                accrual_start_date,
+                accrued_interest,
+            )
+        # keep the monthly payment, the term ends when the balance is paid.
+        while True:
+            payment, principal, interest, left = daily_annuity_columns(
+                period_rates, loan_amount, self.fixed_monthly_payment, accrued_interest
+            )
+            paid = np.flatnonzero(left <= 1e-6 * self.fixed_monthly_payment)
+            if len(paid):
+                break
+            if len(dates) > MAX_LOAN_TERM_BY_MONTH:
+                raise ValueError("The monthly payment does not cover the interest.")
+            # The monthly payment was lowered by an earlier fixed term payment.
+            dates = np.concatenate(
+                [dates, get_payment_dates(int(dates[-1]), len(dates) + 1)[1:]]
+            )
+            period_rates = self._period_rates(dates, accrual_start_date)
+        n = int(paid[0]) + 1
+        payment, principal, interest, left = (
+            np.array(column[:n]) for column in (payment, principal, interest, left)
+        )
+        # the last month pays the left principal and its interest.
+        principal[-1] = left[-2] if n > 1 else loan_amount
+        payment[-1] = principal[-1] + interest[-1]
+        left[-1] = 0
+        return PrecomputedTail(
+            dates[:n],
+            loan_amount,
+            (payment, principal, interest, left),
+            accrual_start_date,
+            accrued_interest,
+        )
+
+
+class DailyLinearCalculator(DailyAccrualCalculator):
+    def __init__(
+        self,
+        annual_interest_rate,
+        loan_amount,
+        loan_term_by_month,
+        start_date_str,
+        day_count="actual/365",
+    ):
+        super().__init__(
+            annual_interest_rate,
+            loan_amount,
+            loan_term_by_month,
+            start_date_str,
+            day_count,
+        )
+        self.fixed_monthly_principal_amount = self.loan_amount / self.loan_term_by_month
+
+    def _daily_tail(
+        self,
+        with_term_change,
+        loan_amount,
+        dates,
+        accrual_start_date,
+        accrued_interest=0.0,
+    ):
+        if with_term_change:
+            # keep the monthly principal amount.
+            dates = dates[
+                : int(ceil_term(loan_amount / self.fixed_monthly_principal_amount))
+            ]
+        return PrecomputedTail(
+            dates,
+            loan_amount,
+            daily_linear_columns(
+                self._period_rates(dates, accrual_start_date),
+                loan_amount,
+                loan_amount / len(dates),
+                accrued_interest,
+            ),
+            accrual_start_date,
+            accrued_interest,
+        )
@@ -0,0 +1,235 @@
+"""
+Copyright 2025. All rights reserved.
+Authors: guanchenglichina@qq.com (Guancheng Li)
+
+Amortization in integer cents, rounded every month as banks do.
+
+Amounts are int64 cents and rates are int64 units of `1 / RATE_SCALE`, so
+the monthly interest `left * rate / (12 * RATE_SCALE)` is an exact integer
+division which is rounded by the rounding mode. Functions take one item per
+loan and return (loan count, longest term) columns which are zero after the
+term of a loan.
+"""
+
+import numpy as np
+
+from core.amortization import annuity_payment, annuity_term, ceil_term
+
+ROUNDINGS = ("half_up", "half_even", "down", "up")
+
+# annual rates are kept to 1e-6, a hundredth of a basis point. The interest
+# numerator `2 * left * rate` stays in int64 for balances up to about
+# 4e11 yuan at a 10% rate.
+RATE_SCALE = 10**6
+MONTHLY_RATE_DENOMINATOR = 12 * RATE_SCALE
+
+
+def check_rounding(rounding):
+    if rounding not in ROUNDINGS:
+        raise ValueError(f"Unknown rounding: {rounding}")
+
+
+def to_cents(amount, rounding="half_up"):
+    """Cents of yuan amounts, "half_up" rounds halves away from zero."""
+    check_rounding(rounding)
+    # drop the binary noise of amounts such as 1.005 before rounding.
+    scaled = np.round(np.asarray(amount, dtype=np.float64) * 100, 6)
+    if rounding == "half_even":
+        cents = np.rint(scaled)
+    elif rounding == "down":
+        cents = np.trunc(scaled)
+    elif rounding == "up":
+        cents = np.sign(scaled) * np.ceil(np.abs(scaled))
+    else:
+        cents = np.sign(scaled) * np.floor(np.abs(scaled) + 0.5)
+    return cents.astype(np.int64)[()]
+
+
+def from_cents(cents):
+    """Yuan amounts of cents, the nearest floats which print exactly."""
+    return (np.asarray(cents, dtype=np.int64) / 100)[()]
+
+
+def to_rate_units(annual_interest_rate):
+    return np.rint(
+        np.asarray(annual_interest_rate, dtype=np.float64) * RATE_SCALE
+    ).astype(np.int64)
+
+
+def divide_rounded(numerator, denominator, rounding="half_up"):
+    """numerator / denominator of non-negative int64, rounded to integer."""
+    if rounding == "down":
+        return numerator // denominator
+    if rounding == "up":
+        return -(-numerator // denominator)
+    if rounding == "half_even":
+        quotient, remainder = np.divmod(numerator, denominator)
+        return quotient + (
+            (2 * remainder > denominator)
+            | ((2 * remainder == denominator) & (quotient % 2 == 1))
+        )
+    return (2 * numerator + denominator) // (2 * denominator)
+
+
+def _loan_arrays(loan_cents, annual_interest_rate, loan_term_by_month):
+    return np.broadcast_arrays(
+        np.atleast_1d(np.asarray(loan_cents, dtype=np.int64)),
+        np.atleast_1d(to_rate_units(annual_interest_rate)),
+        np.atleast_1d(np.asarray(loan_term_by_month, dtype=np.int64)),
+    )
+
+
+def exact_annuity_payment(
+    annual_interest_rate, loan_term_by_month, loan_cents, rounding="half_up"
+):
+    """Fixed monthly payment in cents, the float payment at the rate kept to
+    `RATE_SCALE` rounded once."""
+    return to_cents(
+        annuity_payment(
+            to_rate_units(annual_interest_rate) / MONTHLY_RATE_DENOMINATOR,
+            loan_term_by_month,
+            np.asarray(loan_cents, dtype=np.float64) / 100,
+        ),
+        rounding,
+    )
+
+
+def exact_annuity_term(
+    annual_interest_rate, monthly_payment_cents, loan_cents, drift_month_count=None
+):
+    """Months to pay off loans by a payment in cents, the last month pays
+    the left principal.
+
+    Rounding the payment and the interest moves the balance by at most a
+    cent a month, with interest on it. A term which is over a whole number
+    of months by less than the drift of `drift_month_count` months, the
+    term by default, is not rounded up. NaN where the payment does not
+    cover the interest.
+    """
+    rate = to_rate_units(annual_interest_rate) / MONTHLY_RATE_DENOMINATOR
+    monthly_payment = np.asarray(monthly_payment_cents, dtype=np.float64) / 100
+    term = annuity_term(rate, monthly_payment, np.asarray(loan_cents) / 100)
+    if drift_month_count is None:
+        drift_month_count = term
+    # a cent a month at compound interest, `(1 + r) ^ n` over the payment
+    # of a unit loan is the compound sum of n months.
+    drift = (
+        0.01
+        * np.power(1.0 + rate, drift_month_count)
+        / annuity_payment(rate, drift_month_count, 1.0)
+    )
+    return ceil_term(term - drift / monthly_payment)
+
+
+def exact_annuity_columns(
+    loan_cents,
+    annual_interest_rate,
+    loan_term_by_month,
+    monthly_payment_cents=None,
+    rounding="half_up",
+    balance_last_month=True,
+):
+    """Payment, principal, interest and left loan amount of annuity loans.
+
+    Each month's interest is rounded on the balance left by the rounded
+    months before it, which is a recurrence, so it runs month by month over
+    all loans at once. With `balance_last_month` the last month pays the
+    left principal, otherwise it keeps the fixed payment and the rounding
+    residual stays in the left loan amount.
+    """
+    check_rounding(rounding)
+    loan_cents, rate_units, term = _loan_arrays(
+        loan_cents, annual_interest_rate, loan_term_by_month
+    )
+    if monthly_payment_cents is None:
+        monthly_payment_cents = exact_annuity_payment(
+            annual_interest_rate, term, loan_cents, rounding
+        )
+    monthly_payment_cents = np.broadcast_to(
+        np.asarray(monthly_payment_cents, dtype=np.int64), loan_cents.shape
+    )
+    month_count = int(term.max(initial=0))
+    # loans whose last month it is, by month.
+    last_months = {
+        int(month): np.flatnonzero(term - 1 == month) for month in np.unique(term - 1)
+    }
+    # month major, so every month writes contiguous rows.
+    principal, interest, left = np.zeros((3, month_count, len(loan_cents)), np.int64)
+    left_before = loan_cents.copy()
+    for month in range(month_count):
+        interest[month] = divide_rounded(
+            left_before * rate_units, MONTHLY_RATE_DENOMINATOR, rounding
+        )
+        # an early last month never pays more than the balance.
+        np.minimum(
+            monthly_payment_cents - interest[month], left_before, out=principal[month]
+        )
+        if balance_last_month and month in last_months:
+            last = last_months[month]
+            principal[month, last] = left_before[last]
+        left_before -= principal[month]
+        left[month] = left_before
+    # a paid off loan has no interest left, only the residual of a loan
+    # which is not balanced runs on after its term.
+    active = np.arange(month_count)[:, None] < term
+    principal *= active
+    interest *= active
+    left *= active
+    return tuple(
+        column.T for column in (principal + interest, principal, interest, left)
+    )
+
+
+def exact_linear_columns(
+    loan_cents,
+    annual_interest_rate,
+    loan_term_by_month,
+    monthly_principal_cents=None,
+    rounding="half_up",
+    balance_last_month=True,
+):
+    """Payment, principal, interest and left loan amount of linear loans.
+
+    Balances are known up front, only the interest is rounded, so all months
+    are computed at once.
+    """
+    check_rounding(rounding)
+    loan_cents, rate_units, term = _loan_arrays(
+        loan_cents, annual_interest_rate, loan_term_by_month
+    )
+    if monthly_principal_cents is None:
+        monthly_principal_cents = divide_rounded(loan_cents, term, rounding)
+    monthly_principal_cents = np.broadcast_to(
+        np.asarray(monthly_principal_cents, dtype=np.int64), loan_cents.shape
+    )[:, None]
+    months = np.arange(int(term.max(initial=0)))
+    active = months < term[:, None]
+    left_before = np.maximum(loan_cents[:, None] - months * monthly_principal_cents, 0)
+    interest = divide_rounded(
+        left_before * rate_units[:, None], MONTHLY_RATE_DENOMINATOR, rounding
+    )
+    principal = np.minimum(monthly_principal_cents, left_before)
+    if balance_last_month:
+        principal = np.where(months == term[:, None] - 1, left_before, principal)
+    principal = np.where(active, principal, 0)
+    interest = np.where(active, interest, 0)
+    left = np.where(active, left_before - principal, 0)
+    return principal + interest, principal, interest, left
+
+
+def reconcile(exact, result):
+    """Exact minus float amounts in yuan, of two schedules or portfolios.
+
+    "total_payment" and "total_interest" are the differences of the totals,
+    "max_left" is the largest difference of the left loan amount over the
+    months both have. Values are arrays with one item per loan for
+    portfolios.
+    """
+    month_count = min(exact.left.shape[-1], result.left.shape[-1])
+    return {
+        "total_payment": exact.payment.sum(axis=-1) - result.payment.sum(axis=-1),
+        "total_interest": exact.interest.sum(axis=-1) - result.interest.sum(axis=-1),
+        "max_left": np.abs(
+            exact.left[..., :month_count] - result.left[..., :month_count]
+        ).max(axis=-1, initial=0),
+    }
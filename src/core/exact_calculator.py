@@ -0,0 +1,198 @@
+"""
+Copyright 2025. All rights reserved.
+Authors: guanchenglichina@qq.com (Guancheng Li)
+
+Classes for calculating loans in integer cents, as bank statements show them.
+"""
+
+import math
+
+import numpy as np
+
+from common.instrumentation import instrumented, schedule_rows
+from common.payment_calendar import get_payment_dates
+from core.base_calculator import BaseCalculator
+from core.exact_amortization import (
+    check_rounding,
+    exact_annuity_columns,
+    exact_annuity_payment,
+    exact_annuity_term,
+    exact_linear_columns,
+    from_cents,
+    to_cents,
+)
+from core.schedule_tail import PrecomputedTail
+
+
+class ExactCentsCalculator(BaseCalculator):
+    """Every month's amounts are rounded to cents by `rounding`.
+
+    The schedule keeps yuan floats which are exact cents, so it prints and
+    sums to what a bank statement shows. `reconcile` in
+    core.exact_amortization compares it to the float calculators.
+    """
+
+    def __init__(
+        self,
+        annual_interest_rate,
+        loan_amount,
+        loan_term_by_month,
+        start_date_str,
+        rounding="half_up",
+        balance_last_month=True,
+    ):
+        check_rounding(rounding)
+        super().__init__(
+            annual_interest_rate, loan_amount, loan_term_by_month, start_date_str
+        )
+        self.rounding = rounding
+        self.balance_last_month = balance_last_month
+
+    @instrumented("calculator.calculate_totals", rows=schedule_rows)
+    def _calculate_total_interest_and_total_payment(self):
+        # sum in cents, so the totals do not drift from the rows.
+        self.total_interest = float(
+            from_cents(to_cents(self.monthly_meta_info.interest).sum())
+        )
+        self.total_payment = float(
+            from_cents(to_cents(self.monthly_meta_info.payment).sum())
+        )
+
+    def _exact_columns(self, loan_cents, loan_term_by_month, monthly_cents=None):
+        raise NotImplementedError
+
+    def _exact_tail(self, dates, left_loan_amount, monthly_cents=None):
+        loan_cents = to_cents(left_loan_amount, self.rounding)
+        columns = self._exact_columns(loan_cents, len(dates), monthly_cents)
+        return PrecomputedTail(
+            dates,
+            from_cents(loan_cents),
+            (from_cents(column[0]) for column in columns),
+        )
+
+    def _calculate_tail(
+        self,
+        left_loan_term_by_month,
+        left_loan_amount,
+        executing_monthly_interest_rate,
+        executing_start_date,
+    ):
+        return self._exact_tail(
+            get_payment_dates(executing_start_date, left_loan_term_by_month),
+            left_loan_amount,
+        )
+
+    def _calculate_summary_impl(
+        self, paid_month_count, early_payment_amount, with_term_change, is_on_paid_date
+    ):
+        # rounding by month has no closed form of the totals.
+        raise NotImplementedError
+
+
+class ExactAnnuityCalculator(ExactCentsCalculator):
+    def __init__(
+        self,
+        annual_interest_rate,
+        loan_amount,
+        loan_term_by_month,
+        start_date_str,
+        rounding="half_up",
+        balance_last_month=True,
+    ):
+        super().__init__(
+            annual_interest_rate,
+            loan_amount,
+            loan_term_by_month,
+            start_date_str,
+            rounding,
+            balance_last_month,
+        )
+        self.fixed_monthly_payment = None
+
+    def _exact_columns(self, loan_cents, loan_term_by_month, monthly_cents=None):
+        if monthly_cents is None:
+            monthly_cents = exact_annuity_payment(
+                self.annual_interest_rate, loan_term_by_month, loan_cents, self.rounding
+            )
+            self.fixed_monthly_payment = float(from_cents(monthly_cents))
+        return exact_annuity_columns(
+            loan_cents,
+            self.annual_interest_rate,
+            loan_term_by_month,
+            monthly_cents,
+            self.rounding,
+            self.balance_last_month,
+        )
+
+    def _early_payment_tail_with_term_change(
+        self, left_principal_amount_after_paid, left_dates
+    ):
+        """Keep the monthly payment, the last month pays the rest."""
+        monthly_cents = to_cents(self.fixed_monthly_payment, self.rounding)
+        left_loan_term_by_month = exact_annuity_term(
+            self.annual_interest_rate,
+            monthly_cents,
+            to_cents(left_principal_amount_after_paid, self.rounding),
+            # the drift of the rows before is in the balance.
+            self.loan_term_by_month,
+        )
+        if not np.isfinite(left_loan_term_by_month):
+            raise ValueError("The monthly payment does not cover the interest.")
+        left_loan_term_by_month = int(left_loan_term_by_month)
+        extra_month_count = left_loan_term_by_month - len(left_dates)
+        if extra_month_count > 0:
+            # The monthly payment was lowered by an earlier fixed term payment.
+            left_dates = np.concatenate(
+                [
+                    left_dates,
+                    get_payment_dates(int(left_dates[-1]), extra_month_count + 1)[1:],
+                ]
+            )
+        return self._exact_tail(
+            left_dates[:left_loan_term_by_month],
+            left_principal_amount_after_paid,
+            monthly_cents,
+        )
+
+
+class ExactLinearCalculator(ExactCentsCalculator):
+    def __init__(
+        self,
+        annual_interest_rate,
+        loan_amount,
+        loan_term_by_month,
+        start_date_str,
+        rounding="half_up",
+        balance_last_month=True,
+    ):
+        super().__init__(
+            annual_interest_rate,
+            loan_amount,
+            loan_term_by_month,
+            start_date_str,
+            rounding,
+            balance_last_month,
+        )
+        self.fixed_monthly_principal_amount = self.loan_amount / self.loan_term_by_month
+
+    def _exact_columns(self, loan_cents, loan_term_by_month, monthly_cents=None):
+        return exact_linear_columns(
+            loan_cents,
+            self.annual_interest_rate,
+            loan_term_by_month,
+            monthly_cents,
+            self.rounding,
+            self.balance_last_month,
+        )
+
+    def _early_payment_tail_with_term_change(
+        self, left_principal_amount_after_paid, left_dates
+    ):
+        """Keep the monthly principal amount, the last month pays the rest."""
+        monthly_cents = to_cents(self.fixed_monthly_principal_amount, self.rounding)
+        left_cents = to_cents(left_principal_amount_after_paid, self.rounding)
+        return self._exact_tail(
+            left_dates[: math.ceil(left_cents / monthly_cents)],
+            left_principal_amount_after_paid,
+            monthly_cents,
+        )
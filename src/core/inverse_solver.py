@@ -0,0 +1,227 @@
+"""
+Copyright 2025. All rights reserved.
+Authors: guanchenglichina@qq.com (Guancheng Li)
+
+Inverse questions of loans, solved for a batch at once.
+
+Every function accepts numpy broadcastable arguments, one item per loan or
+one for all, and `methods` holds "annuity" or "linear". The answers agree
+with the calculators: the monthly payment of a linear loan is its first,
+highest one, and early payments keep the monthly payment ("short" cycle)
+as `early_payment_with_term_change` does.
+"""
+
+import numpy as np
+
+from common.date_time_utils import (
+    get_date_int_array_next_n_month,
+    get_month_count_until,
+)
+from core.amortization import (
+    annuity_columns,
+    annuity_payment,
+    annuity_term,
+    ceil_term,
+)
+from core.calculator_registry import ANNUITY, LINEAR
+
+
+def _check_methods(methods):
+    methods = np.asarray(methods)
+    unknown_methods = set(np.unique(methods).tolist()) - {ANNUITY, LINEAR}
+    if unknown_methods:
+        raise ValueError(f"Unknown methods: {sorted(unknown_methods)}")
+    return methods
+
+
+def max_loan_amount(methods, annual_interest_rates, loan_terms_by_month, payments):
+    """The largest loan whose monthly payment is at most `payments`."""
+    methods = _check_methods(methods)
+    rate = np.asarray(annual_interest_rates, dtype=np.float64) / 12
+    n = np.asarray(loan_terms_by_month, dtype=np.float64)
+    payments = np.asarray(payments, dtype=np.float64)
+    # payments grow linearly with the loan amount.
+    return np.where(
+        methods == ANNUITY,
+        payments / annuity_payment(rate, n, 1.0),
+        payments / (1 / n + rate),
+    )[()]
+
+
+def min_loan_term(methods, annual_interest_rates, loan_amounts, payments):
+    """The shortest term in months whose monthly payment is at most
+    `payments`, inf where the payment does not cover the first interest."""
+    methods = _check_methods(methods)
+    rate = np.asarray(annual_interest_rates, dtype=np.float64) / 12
+    loan_amounts = np.asarray(loan_amounts, dtype=np.float64)
+    payments = np.asarray(payments, dtype=np.float64)
+    covers_interest = payments > loan_amounts * rate
+    safe_payments = np.where(covers_interest, payments, loan_amounts * rate + 1.0)
+    with np.errstate(divide="ignore"):
+        term = np.where(
+            methods == ANNUITY,
+            annuity_term(rate, safe_payments, loan_amounts),
+            loan_amounts / (safe_payments - loan_amounts * rate),
+        )
+    return np.where(covers_interest, np.maximum(ceil_term(term), 1), np.inf)[()]
+
+
+def _linear_pays_off(
+    amounts,
+    loan_amounts,
+    loan_terms_by_month,
+    target_month_counts,
+    prepayment_month_counts,
+    is_prepayment,
+):
+    """Whether linear loans with prepayments of `amounts` pay off by the
+    target, the calculator's term changes replayed one prepayment at a
+    time."""
+    fixed_monthly_principal = loan_amounts / loan_terms_by_month
+    balance = loan_amounts.copy()
+    principal = fixed_monthly_principal.copy()
+    paid_month_count = np.zeros_like(loan_terms_by_month)
+    end = loan_terms_by_month.copy()
+    is_paid_off = end <= target_month_counts
+    for prepayment_id in range(prepayment_month_counts.shape[1]):
+        month_count = prepayment_month_counts[:, prepayment_id]
+        prepays = is_prepayment[:, prepayment_id] & (month_count < end) & ~is_paid_off
+        rows = month_count - paid_month_count
+        # the same float steps as `linear_columns`, a term change rounds up.
+        left = np.where(
+            rows > 0,
+            np.maximum(balance - (rows - 1) * principal - principal, 0.0),
+            balance,
+        )
+        is_paid_off |= prepays & (left <= amounts)
+        prepays &= ~is_paid_off
+        left = left - amounts
+        term = ceil_term(left / fixed_monthly_principal)
+        balance = np.where(prepays, left, balance)
+        principal = np.where(prepays, left / np.maximum(term, 1), principal)
+        paid_month_count = np.where(prepays, month_count, paid_month_count)
+        end = np.where(prepays, month_count + term, end)
+        is_paid_off |= end <= target_month_counts
+    return is_paid_off
+
+
+def prepayment_for_payoff(
+    methods,
+    annual_interest_rates,
+    loan_amounts,
+    loan_terms_by_month,
+    start_date_strs,
+    target_payoff_date_strs,
+    first_prepayment_date_strs,
+    interval_months=None,
+    max_prepayment_count=None,
+):
+    """The prepayment, in yuan rounded up to the cent, which pays loans off
+    on or before the target date.
+
+    The loans pay one prepayment on `first_prepayment_date_strs`, or with an
+    `interval_months` the same amount again every interval until the target
+    date, at most `max_prepayment_count` times. Loans which pay off by the
+    target without prepayment need 0; loans without a prepayment before the
+    target payoff month get NaN.
+    """
+    methods = _check_methods(methods)
+    (
+        methods,
+        rate,
+        loan_amounts,
+        n,
+        start_dates,
+        target_dates,
+        first_dates,
+    ) = np.broadcast_arrays(
+        methods,
+        np.asarray(annual_interest_rates, dtype=np.float64) / 12,
+        np.asarray(loan_amounts, dtype=np.float64),
+        np.asarray(loan_terms_by_month, dtype=np.int64),
+        np.asarray(start_date_strs).astype(np.int64),
+        np.asarray(target_payoff_date_strs).astype(np.int64),
+        np.asarray(first_prepayment_date_strs).astype(np.int64),
+    )
+    shape = methods.shape
+    methods, rate, loan_amounts, n, start_dates, target_dates, first_dates = (
+        array.ravel()
+        for array in (
+            methods,
+            rate,
+            loan_amounts,
+            n,
+            start_dates,
+            target_dates,
+            first_dates,
+        )
+    )
+    # payment rows on or before the dates, the first payment is on the start.
+    target_month_counts = get_month_count_until(start_dates, target_dates)
+    if interval_months is None:
+        prepayment_offsets = np.zeros(1, dtype=np.int64)
+    else:
+        prepayment_count = (
+            int(np.max(target_month_counts, initial=0)) // interval_months
+        )
+        if max_prepayment_count is not None:
+            prepayment_count = min(prepayment_count, max_prepayment_count - 1)
+        prepayment_offsets = interval_months * np.arange(prepayment_count + 1)
+    prepayment_dates = get_date_int_array_next_n_month(
+        first_dates[:, None] // 10000,
+        first_dates[:, None] // 100 % 100,
+        first_dates[:, None] % 100,
+        prepayment_offsets,
+    )
+    prepayment_month_counts = get_month_count_until(
+        start_dates[:, None], prepayment_dates
+    )
+    # a prepayment after the target date is too late, one after the last
+    # row is not made.
+    is_prepayment = (prepayment_dates <= target_dates[:, None]) & (
+        prepayment_month_counts < n[:, None]
+    )
+
+    amounts = np.full(len(methods), np.nan)
+    is_paid_off = n <= target_month_counts
+    amounts[is_paid_off] = 0.0
+    is_solvable = ~is_paid_off & is_prepayment.any(axis=1)
+
+    rows = np.flatnonzero(is_solvable & (methods == ANNUITY))
+    if len(rows):
+        # the left loan amount at the target is linear in the prepayment.
+        r = rate[rows]
+        t = target_month_counts[rows]
+        payment = annuity_payment(r, n[rows], loan_amounts[rows])
+        future_left = np.where(
+            t > 0,
+            annuity_columns(np.maximum(t, 1), loan_amounts[rows], r, payment)[3],
+            loan_amounts[rows],
+        )
+        prepayment_growth = np.where(
+            is_prepayment[rows],
+            np.power(1 + r[:, None], t[:, None] - prepayment_month_counts[rows]),
+            0.0,
+        ).sum(axis=1)
+        amounts[rows] = (
+            np.ceil(np.round(100 * future_left / prepayment_growth, 6)) / 100
+        )
+    rows = np.flatnonzero(is_solvable & (methods == LINEAR))
+    if len(rows):
+        # the least cents which pay off, by bisection on all loans at once.
+        low = np.zeros(len(rows))
+        high = np.ceil(100 * loan_amounts[rows])
+        while np.any(high - low > 1):
+            middle = np.floor((low + high) / 2)
+            pays_off = _linear_pays_off(
+                middle / 100,
+                loan_amounts[rows],
+                n[rows],
+                target_month_counts[rows],
+                prepayment_month_counts[rows],
+                is_prepayment[rows],
+            )
+            high = np.where(pays_off, middle, high)
+            low = np.where(pays_off, low, middle)
+        amounts[rows] = high / 100
+    return amounts.reshape(shape)[()]
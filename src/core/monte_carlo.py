@@ -0,0 +1,340 @@
+"""
+Copyright 2025. All rights reserved.
+Authors: guanchenglichina@qq.com (Guancheng Li)
+
+Monte Carlo simulation of floating rate loans over random rate paths.
+
+A path is the annual rate of every reset date, the loan is amortized again
+after each reset as `apply_rate_resets` does. Between two resets the
+payment is fixed, so a path only needs the closed forms of
+`core.amortization` once per reset and never builds its monthly rows:
+all paths of a chunk are computed together, one reset at a time.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import functools
+
+import numpy as np
+
+from common.date_time_utils import get_date_int_array_next_n_month
+from common.instrumentation import instrumented, result_rows
+from common.payment_calendar import get_payment_dates
+from core.amortization import (
+    annuity_columns,
+    annuity_payment,
+    annuity_term,
+    ceil_term,
+)
+from core.calculator_registry import ANNUITY, CALCULATORS, LINEAR
+from core.rate_reset import get_yearly_reset_dates
+
+
+class VasicekRateModel:
+    """Mean-reverting annual rates, dr = speed * (mean - r) dt + vol dW.
+
+    Rates are drawn from the exact transition between the reset times, so
+    the reset interval does not bias them, and floored at `min_rate`.
+    """
+
+    def __init__(self, mean_rate, reversion_speed, volatility, min_rate=0.0):
+        self.mean_rate = mean_rate
+        self.reversion_speed = reversion_speed
+        self.volatility = volatility
+        self.min_rate = min_rate
+
+    def simulate(self, rng, initial_rate, years, path_count):
+        """(path_count, len(years)) rates at `years` after the start."""
+        rates = np.empty((path_count, len(years)))
+        rate = np.full(path_count, float(initial_rate))
+        for i, dt in enumerate(np.diff(years, prepend=0.0)):
+            decay = np.exp(-self.reversion_speed * dt)
+            if self.reversion_speed > 0:
+                variance = (1 - decay**2) / (2 * self.reversion_speed)
+            else:
+                variance = dt
+            rate = (
+                self.mean_rate
+                + (rate - self.mean_rate) * decay
+                + self.volatility * np.sqrt(variance) * rng.standard_normal(path_count)
+            )
+            rates[:, i] = np.maximum(rate, self.min_rate)
+        return rates
+
+
+class MonteCarloResult:
+    """Outcome of every path, one item per path.
+
+    `reset_rates` holds the rate of each reset date. A path whose kept
+    monthly payment no longer covers the interest ("short" cycle only)
+    never pays off: its `total_interest` is NaN, its payoff month count 0
+    and its payoff date 0.
+    """
+
+    def __init__(
+        self,
+        reset_date_strs,
+        reset_rates,
+        total_interest,
+        max_monthly_payment,
+        payoff_month_count,
+        payoff_date,
+    ):
+        self.reset_date_strs = reset_date_strs
+        self.reset_rates = reset_rates
+        self.total_interest = total_interest
+        self.max_monthly_payment = max_monthly_payment
+        self.payoff_month_count = payoff_month_count
+        self.payoff_date = payoff_date
+        self.is_paid_off = payoff_month_count > 0
+
+    def __len__(self):
+        return len(self.total_interest)
+
+    @staticmethod
+    def concatenate(results):
+        return MonteCarloResult(
+            results[0].reset_date_strs,
+            *(
+                np.concatenate([getattr(result, name) for result in results])
+                for name in (
+                    "reset_rates",
+                    "total_interest",
+                    "max_monthly_payment",
+                    "payoff_month_count",
+                    "payoff_date",
+                )
+            ),
+        )
+
+    def payoff_date_counts(self):
+        """Paths by payoff date, of the paths which pay off."""
+        dates, counts = np.unique(
+            self.payoff_date[self.is_paid_off], return_counts=True
+        )
+        return {str(date): int(count) for date, count in zip(dates, counts)}
+
+    def summary(self, percentiles=(5, 50, 95)):
+        """Mean, standard deviation and percentiles over the paths which
+        pay off."""
+        summary = {
+            "path_count": len(self),
+            "paid_off_ratio": float(self.is_paid_off.mean()) if len(self) else 0.0,
+        }
+        for name in ("total_interest", "max_monthly_payment", "payoff_month_count"):
+            values = getattr(self, name)[self.is_paid_off]
+            stats = {"mean": np.nan, "std": np.nan}
+            stats.update({f"p{p}": np.nan for p in percentiles})
+            if len(values):
+                stats["mean"] = float(values.mean())
+                stats["std"] = float(values.std())
+                for p, value in zip(
+                    percentiles, np.percentile(values, percentiles).tolist()
+                ):
+                    stats[f"p{p}"] = value
+            summary[name] = stats
+        return summary
+
+
+@instrumented("monte_carlo.path_totals", rows=result_rows)
+def simulate_path_totals(
+    method,
+    annual_interest_rate,
+    loan_amount,
+    payment_dates,
+    reset_month_counts,
+    reset_rates,
+    cycle_type="fixed",
+):
+    """Totals of a loan over rate paths, the same as `apply_rate_resets`.
+
+    `payment_dates` are the dates of the schedule, `reset_month_counts` the
+    rows paid on or before each reset date and `reset_rates` a
+    (path count, reset count) array. Returns a MonteCarloResult without
+    reset dates.
+
+    Payoff dates follow `payment_dates`; a calculator dates the rows after a
+    reset from the reset row, so for loans starting after the 28th its
+    dates may be a few days earlier. Month counts and totals are the same.
+    """
+    if method not in (ANNUITY, LINEAR):
+        raise ValueError(f"Unknown method: {method}")
+    if cycle_type not in ("short", "fixed"):
+        raise ValueError(f"Unknown cycle type: {cycle_type}")
+    reset_rates = np.asarray(reset_rates, dtype=np.float64)
+    path_count = len(reset_rates)
+    n = len(payment_dates)
+    monthly_interest_rates = (
+        np.column_stack([np.full(path_count, annual_interest_rate), reset_rates]) / 12
+    )
+    starts = [0] + [int(m) for m in reset_month_counts]
+    stops = starts[1:] + [np.iinfo(np.int64).max]
+
+    balance = np.full(path_count, float(loan_amount))
+    # rows of the schedule, a "short" reset moves the end.
+    end = np.full(path_count, n, dtype=np.int64)
+    is_payable = np.ones(path_count, dtype=bool)
+    total_interest = np.zeros(path_count)
+    max_monthly_payment = np.zeros(path_count)
+    rate = monthly_interest_rates[:, 0]
+    if method == ANNUITY:
+        payment = np.broadcast_to(annuity_payment(rate, n, loan_amount), path_count)
+        # a tail of kept payments pays the left principal in its last month.
+        balance_last_month = np.zeros(path_count, dtype=bool)
+    else:
+        # the principal which a term change keeps, as the calculator does.
+        fixed_monthly_principal = loan_amount / n
+        principal = np.full(path_count, fixed_monthly_principal)
+
+    for reset_id, (start, stop) in enumerate(zip(starts, stops)):
+        rate = monthly_interest_rates[:, reset_id]
+        if reset_id > 0:
+            resets = is_payable & (start < end)
+            left_term = end - start
+            if method == ANNUITY and cycle_type == "fixed":
+                payment = np.where(
+                    resets, annuity_payment(rate, left_term, balance), payment
+                )
+                balance_last_month &= ~resets
+            elif method == ANNUITY:
+                with np.errstate(invalid="ignore"):
+                    term = ceil_term(annuity_term(rate, payment, balance))
+                is_payable &= ~resets | np.isfinite(term)
+                resets &= is_payable
+                end = np.where(resets, start + np.nan_to_num(term), end).astype(
+                    np.int64
+                )
+                balance_last_month |= resets
+            else:
+                if cycle_type == "short":
+                    left_term = ceil_term(balance / fixed_monthly_principal)
+                    end = np.where(resets, start + left_term, end).astype(np.int64)
+                principal = np.where(
+                    resets, balance / np.maximum(left_term, 1), principal
+                )
+        rows = np.where(is_payable, np.clip(np.minimum(stop, end) - start, 0, None), 0)
+        if method == ANNUITY:
+            left = annuity_columns(np.maximum(rows, 1), balance, rate, payment)[3]
+            left = np.where(balance_last_month & (start + rows == end), 0.0, left)
+            left = np.where(rows > 0, left, balance)
+            total_interest += rows * payment - (balance - left)
+            first_payment = payment
+        else:
+            # the same float steps as `linear_columns`, a term change rounds up.
+            left = np.maximum(balance - (rows - 1) * principal - principal, 0.0)
+            total_interest += rate * (
+                rows * balance - principal * rows * (rows - 1) / 2
+            )
+            first_payment = principal + balance * rate
+        max_monthly_payment = np.where(
+            rows > 0,
+            np.maximum(max_monthly_payment, first_payment),
+            max_monthly_payment,
+        )
+        balance = left
+
+    payoff_month_count = np.where(is_payable, end, 0)
+    # dates after the scheduled ones follow the last of them.
+    last_date = int(payment_dates[-1])
+    payoff_date = np.where(
+        payoff_month_count > n,
+        get_date_int_array_next_n_month(
+            last_date // 10000,
+            last_date // 100 % 100,
+            last_date % 100,
+            np.maximum(payoff_month_count - n, 0),
+        ),
+        np.asarray(payment_dates)[np.clip(payoff_month_count - 1, 0, n - 1)],
+    )
+    return MonteCarloResult(
+        None,
+        reset_rates,
+        np.where(is_payable, total_interest, np.nan),
+        max_monthly_payment,
+        payoff_month_count,
+        np.where(is_payable, payoff_date, 0).astype(np.int32),
+    )
+
+
+def _run_paths(
+    method,
+    annual_interest_rate,
+    loan_amount,
+    payment_dates,
+    reset_month_counts,
+    rate_model,
+    cycle_type,
+    path_count,
+    seed_sequence,
+):
+    reset_rates = rate_model.simulate(
+        np.random.default_rng(seed_sequence),
+        annual_interest_rate,
+        np.asarray(reset_month_counts) / 12,
+        path_count,
+    )
+    return simulate_path_totals(
+        method,
+        annual_interest_rate,
+        loan_amount,
+        payment_dates,
+        reset_month_counts,
+        reset_rates,
+        cycle_type,
+    )
+
+
+def run_monte_carlo(
+    method,
+    annual_interest_rate,
+    loan_amount,
+    loan_term_by_month,
+    start_date_str,
+    rate_model,
+    path_count,
+    reset_date_strs=None,
+    cycle_type="fixed",
+    seed=None,
+    chunk_size=10000,
+    max_workers=1,
+):
+    """Simulate `path_count` rate paths of a loan.
+
+    Rates start at `annual_interest_rate` and reset on `reset_date_strs`,
+    the anniversaries by default, to the rates of `rate_model`. Paths run
+    in chunks of `chunk_size` on `max_workers` processes, each chunk with
+    its own seed drawn from `seed`, so a seed and chunk size give the same
+    paths for any number of workers.
+    """
+    if method not in CALCULATORS:
+        raise ValueError(f"Unknown method: {method}")
+    if path_count <= 0:
+        raise ValueError("path_count must be positive.")
+    if reset_date_strs is None:
+        reset_date_strs = get_yearly_reset_dates(start_date_str, loan_term_by_month)
+    payment_dates = get_payment_dates(int(start_date_str), loan_term_by_month)
+    reset_month_counts = np.searchsorted(
+        payment_dates, np.asarray(reset_date_strs).astype(np.int64), side="right"
+    )
+    chunk_path_counts = [
+        min(chunk_size, path_count - offset)
+        for offset in range(0, path_count, chunk_size)
+    ]
+    run_chunk = functools.partial(
+        _run_paths,
+        method,
+        annual_interest_rate,
+        loan_amount,
+        payment_dates,
+        reset_month_counts,
+        rate_model,
+        cycle_type,
+    )
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(chunk_path_counts))
+    if max_workers == 1:
+        results = list(map(run_chunk, chunk_path_counts, seed_sequences))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(run_chunk, chunk_path_counts, seed_sequences))
+    result = MonteCarloResult.concatenate(results)
+    result.reset_date_strs = list(reset_date_strs)
+    return result
@@ -0,0 +1,303 @@
+"""
+Copyright 2025. All rights reserved.
+Authors: guanchenglichina@qq.com (Guancheng Li)
+
+Batch calculation of many loans at once.
+"""
+
+import numpy as np
+
+from common.date_time_utils import get_date_int_array_next_n_month
+from common.instrumentation import instrumented
+from common.schedule import Schedule
+from core.amortization import (
+    annuity_columns,
+    annuity_payment,
+    daily_annuity_columns,
+    daily_annuity_payment,
+    daily_linear_columns,
+    daily_period_rates,
+    get_days_in_year,
+    linear_columns,
+)
+from core.calculator_registry import ANNUITY, LINEAR
+from core.exact_amortization import (
+    exact_annuity_columns,
+    exact_linear_columns,
+    from_cents,
+    to_cents,
+)
+
+
+def _portfolio_rows(result, *args, **kwargs):
+    return int(result.mask.sum())
+
+
+class PortfolioResult:
+    """Schedules of a batch of loans, padded to the longest term.
+
+    Every column is a (loan count, longest term) array. Months after the term
+    of a loan are zero and `mask` is False there.
+    """
+
+    def __init__(
+        self,
+        loan_term_by_month,
+        mask,
+        date,
+        payment,
+        principal,
+        interest,
+        left,
+        methods=None,
+    ):
+        self.loan_term_by_month = loan_term_by_month
+        self.methods = methods
+        self.mask = mask
+        self.date = date
+        self.payment = payment
+        self.principal = principal
+        self.interest = interest
+        self.left = left
+        self.total_interest = interest.sum(axis=1)
+        self.total_payment = payment.sum(axis=1)
+        rows = np.arange(len(self))
+        self.first_monthly_payment = payment[:, 0]
+        self.last_monthly_payment = payment[rows, loan_term_by_month - 1]
+
+    def __len__(self):
+        return len(self.loan_term_by_month)
+
+    def get_schedule(self, loan_id):
+        """The schedule of one loan, same as the calculator's monthly_meta_info."""
+        n = self.loan_term_by_month[loan_id]
+        return Schedule(
+            np.arange(1, n + 1),
+            self.date[loan_id, :n],
+            self.payment[loan_id, :n],
+            self.principal[loan_id, :n],
+            self.interest[loan_id, :n],
+            self.left[loan_id, :n],
+        )
+
+    def yearly_totals(self):
+        """A dict of "year" and the (loan count, year count) sums of payment,
+        principal and interest by calendar year.
+
+        Payments are monthly from the start date, so the rows of a year
+        follow from the start month, and a sum is the difference of two
+        prefix sums of the row.
+        """
+        start_dates = self.date[:, 0].astype(np.int64)
+        start_years = start_dates // 10000
+        end_years = (
+            self.date[np.arange(len(self)), self.loan_term_by_month - 1] // 10000
+        )
+        years = np.arange(
+            start_years.min() if len(self) else 0,
+            end_years.max() + 1 if len(self) else 0,
+        )
+        # rows before January of each year, and of the year after the last.
+        boundaries = np.clip(
+            (np.append(years, years[-1:] + 1) - start_years[:, None]) * 12
+            - (start_dates[:, None] // 100 % 100 - 1),
+            0,
+            self.loan_term_by_month[:, None],
+        )
+        yearly = {"year": years}
+        for name in ("payment", "principal", "interest"):
+            column = getattr(self, name)
+            prefix_sum = np.zeros((len(self), column.shape[1] + 1))
+            np.cumsum(column, axis=1, out=prefix_sum[:, 1:])
+            yearly[name] = np.diff(
+                np.take_along_axis(prefix_sum, boundaries, axis=1), axis=1
+            )
+        return yearly
+
+
+@instrumented("portfolio.calculate_portfolio", rows=_portfolio_rows)
+def calculate_portfolio(
+    annual_interest_rates,
+    loan_amounts,
+    loan_terms_by_month,
+    start_date_strs,
+    methods,
+    day_count=None,
+    rounding=None,
+    balance_last_month=True,
+):
+    """Calculate the schedules of all loans in one batched pass.
+
+    Every argument is a sequence with one item per loan, `methods` holds
+    "annuity" or "linear". With a `day_count` such as "actual/365", interest
+    accrues by actual days as the daily accrual calculators do. With a
+    `rounding` such as "half_up", amounts are integer cents rounded every
+    month as the exact cents calculators do.
+    """
+    if day_count is not None and rounding is not None:
+        raise ValueError("Exact cents only support monthly interest rates.")
+    monthly_interest_rates = np.asarray(annual_interest_rates, dtype=np.float64) / 12
+    loan_amounts = np.asarray(loan_amounts, dtype=np.float64)
+    loan_terms_by_month = np.asarray(loan_terms_by_month, dtype=np.int64)
+    methods = np.asarray(methods)
+    unknown_methods = set(np.unique(methods).tolist()) - {ANNUITY, LINEAR}
+    if unknown_methods:
+        raise ValueError(f"Unknown methods: {sorted(unknown_methods)}")
+
+    months = np.arange(max(loan_terms_by_month.max(initial=0), 1))
+    mask = months < loan_terms_by_month[:, None]
+    # loans of a book share few start dates, build each date row once.
+    start_dates, start_date_index = np.unique(
+        np.asarray(start_date_strs).astype(np.int64), return_inverse=True
+    )
+    # the month before the start date is where the first interest accrues.
+    accrual_dates = get_date_int_array_next_n_month(
+        start_dates[:, None] // 10000,
+        start_dates[:, None] // 100 % 100,
+        start_dates[:, None] % 100,
+        np.arange(-1, len(months)),
+    )
+    start_date_index = start_date_index.reshape(-1)
+    date = accrual_dates[:, 1:][start_date_index]
+    date[~mask] = 0
+    if day_count is not None:
+        period_rates = (
+            daily_period_rates(1.0, accrual_dates, get_days_in_year(day_count))[
+                start_date_index
+            ]
+            * np.asarray(annual_interest_rates, dtype=np.float64)[:, None]
+        )
+
+    columns = [np.zeros(mask.shape) for _ in range(4)]
+    for method in (ANNUITY, LINEAR):
+        rows = np.flatnonzero(methods == method)
+        if not len(rows):
+            continue
+        rate = monthly_interest_rates[rows, None]
+        amount = loan_amounts[rows, None]
+        term = loan_terms_by_month[rows, None]
+        if rounding is not None:
+            exact_columns = (
+                exact_annuity_columns if method == ANNUITY else exact_linear_columns
+            )
+            method_columns = (
+                from_cents(column)
+                for column in exact_columns(
+                    to_cents(loan_amounts[rows], rounding),
+                    np.asarray(annual_interest_rates, dtype=np.float64)[rows],
+                    loan_terms_by_month[rows],
+                    rounding=rounding,
+                    balance_last_month=balance_last_month,
+                )
+            )
+        elif day_count is not None:
+            rate = period_rates[rows]
+            if method == ANNUITY:
+                method_columns = daily_annuity_columns(
+                    rate,
+                    amount,
+                    daily_annuity_payment(rate, amount, loan_term_by_month=term),
+                )
+            else:
+                method_columns = daily_linear_columns(rate, amount, amount / term)
+        elif method == ANNUITY:
+            method_columns = annuity_columns(
+                months + 1, amount, rate, annuity_payment(rate, term, amount)
+            )
+        else:
+            method_columns = linear_columns(months + 1, amount, rate, amount / term)
+        for column, method_column in zip(columns, method_columns):
+            # exact columns only span the longest term of their loans.
+            column[rows, : method_column.shape[-1]] = np.where(
+                mask[rows, : method_column.shape[-1]], method_column, 0
+            )
+    return PortfolioResult(loan_terms_by_month, mask, date, *columns, methods)
+
+
+@instrumented("portfolio.reprice_portfolio", rows=_portfolio_rows)
+def reprice_portfolio(result, reset_date_strs, annual_interest_rates):
+    """Reset the rates of a portfolio, only months after the reset dates are
+    amortized again.
+
+    `reset_date_strs` and `annual_interest_rates` hold one item per loan or
+    one for all. The left loan amount after the reset date is amortized over
+    the left term at the new rate, as `apply_rate_resets` does with the
+    term kept. Returns a new PortfolioResult, monthly rates only.
+    """
+    reset_dates = np.broadcast_to(
+        np.asarray(reset_date_strs).astype(np.int64), (len(result),)
+    )
+    monthly_interest_rates = np.broadcast_to(
+        np.asarray(annual_interest_rates, dtype=np.float64) / 12, (len(result),)
+    )
+    months = np.arange(result.mask.shape[1])
+    rows = np.arange(len(result))
+    paid_month_count = ((result.date <= reset_dates[:, None]) & result.mask).sum(axis=1)
+    left_loan_amount = np.where(
+        paid_month_count > 0,
+        result.left[rows, np.maximum(paid_month_count - 1, 0)],
+        result.left[:, 0] + result.principal[:, 0],
+    )
+    left_loan_term_by_month = result.loan_term_by_month - paid_month_count
+    # only the months after the reset are changed.
+    repriced = result.mask & (months >= paid_month_count[:, None])
+
+    columns = [
+        column.copy()
+        for column in (result.payment, result.principal, result.interest, result.left)
+    ]
+    for method in (ANNUITY, LINEAR):
+        method_rows = np.flatnonzero(
+            (result.methods == method) & (left_loan_term_by_month > 0)
+        )
+        if not len(method_rows):
+            continue
+        rate = monthly_interest_rates[method_rows, None]
+        amount = left_loan_amount[method_rows, None]
+        term = left_loan_term_by_month[method_rows, None]
+        periods = months + 1 - paid_month_count[method_rows, None]
+        if method == ANNUITY:
+            method_columns = annuity_columns(
+                periods, amount, rate, annuity_payment(rate, term, amount)
+            )
+        else:
+            method_columns = linear_columns(periods, amount, rate, amount / term)
+        row_mask = repriced[method_rows]
+        for column, method_column in zip(columns, method_columns):
+            column[method_rows] = np.where(row_mask, method_column, column[method_rows])
+    return PortfolioResult(
+        result.loan_term_by_month,
+        result.mask,
+        result.date,
+        *columns,
+        result.methods,
+    )
+
+
+def iter_portfolio(
+    annual_interest_rates,
+    loan_amounts,
+    loan_terms_by_month,
+    start_date_strs,
+    methods,
+    chunk_size=10000,
+    day_count=None,
+    rounding=None,
+    balance_last_month=True,
+):
+    """Calculate a large portfolio in chunks to bound the memory.
+
+    Yields (offset of the first loan, PortfolioResult of the chunk).
+    """
+    for offset in range(0, len(loan_amounts), chunk_size):
+        chunk = slice(offset, offset + chunk_size)
+        yield offset, calculate_portfolio(
+            annual_interest_rates[chunk],
+            loan_amounts[chunk],
+            loan_terms_by_month[chunk],
+            start_date_strs[chunk],
+            methods[chunk],
+            day_count,
+            rounding,
+            balance_last_month,
+        )
@@ -0,0 +1,205 @@
+"""
+Copyright 2025. All rights reserved.
+Authors: guanchenglichina@qq.com (Guancheng Li)
+
+Search of early payment plans for a cash budget.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+from common.date_time_utils import get_date_str_next_n_month
+from core.calculator_registry import CALCULATORS
+
+
+def evaluate_plan(loan, early_payment_records):
+    """Total interest, payoff date and used cash of a plan.
+
+    `loan` is (method, annual_interest_rate, loan_amount, loan_term_by_month,
+    start_date_str), records are the ones `apply_early_payments` takes.
+    """
+    method, *loan_args = loan
+    calculator = CALCULATORS[method](*loan_args)
+    calculator.calculate()
+    calculator.apply_early_payments(early_payment_records)
+    return (
+        round(calculator.total_interest, 2),
+        str(calculator.monthly_meta_info.date[-1]),
+        round(sum(record["amount"] for record in early_payment_records), 2),
+    )
+
+
+def _evaluate_plans(loan, plans):
+    return [evaluate_plan(loan, plan) for plan in plans]
+
+
+def _dominates(objectives, other_objectives):
+    return all(a <= b for a, b in zip(objectives, other_objectives)) and (
+        objectives != other_objectives
+    )
+
+
+class PrepaymentPlan:
+    def __init__(self, early_payment_records, total_interest, payoff_date_str, cash):
+        self.early_payment_records = early_payment_records
+        self.total_interest = total_interest
+        self.payoff_date_str = payoff_date_str
+        self.cash = cash
+
+    def objectives(self):
+        return (self.total_interest, self.payoff_date_str, self.cash)
+
+    def get_info(self):
+        lines = [
+            f"总利息: {self.total_interest:.2f}",
+            f"结清日期: {self.payoff_date_str}",
+            f"提前还款总额: {self.cash:.2f}",
+        ]
+        for record in self.early_payment_records:
+            lines.append(
+                f"{record['date']},{record['amount']:.2f},{record['cycle_type']}"
+            )
+        return lines
+
+
+class PrepaymentOptimizer:
+    """Find the Pareto-best early payment plans for a cash budget.
+
+    Every budget item (date_str, amount) is cash that becomes available on
+    the date. A plan skips it, or pays it `delay_months` later with one of
+    the cycle types. Plans are compared by total interest, payoff date and
+    used cash, all minimized.
+
+    The search is a branch and bound over budget items in order. A partial
+    plan is completed by paying all later items at once with term change,
+    paying earlier and keeping the monthly payment saves the most interest,
+    so it bounds the interest and payoff date of any completion. The
+    completion is a real plan which joins the Pareto front, and the partial
+    plan is pruned when a front plan dominates its bound. Each level
+    of the search is evaluated on a process pool.
+    """
+
+    def __init__(
+        self,
+        method,
+        annual_interest_rate,
+        loan_amount,
+        loan_term_by_month,
+        start_date_str,
+        cash_budget,
+        delay_months=(0, 6, 12),
+        cycle_types=("short", "fixed"),
+        max_workers=None,
+        chunk_size=32,
+    ):
+        if method not in CALCULATORS:
+            raise ValueError(f"Unknown method: {method}")
+        self.loan = (
+            method,
+            annual_interest_rate,
+            loan_amount,
+            loan_term_by_month,
+            start_date_str,
+        )
+        self.cash_budget = sorted(cash_budget)
+        self.delay_months = delay_months
+        self.cycle_types = cycle_types
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.evaluated_count = 0
+        self.pruned_count = 0
+        self.pareto_plans = []
+
+    def _options(self, date_str, amount):
+        options = [None]
+        for delay in self.delay_months:
+            for cycle_type in self.cycle_types:
+                options.append(
+                    {
+                        "date": get_date_str_next_n_month(date_str, delay),
+                        "amount": amount,
+                        "cycle_type": cycle_type,
+                    }
+                )
+        return options
+
+    def _complete(self, partial_plan, level):
+        """The bound completion of a partial plan."""
+        records = [record for record in partial_plan if record is not None]
+        for date_str, amount in self.cash_budget[level:]:
+            records.append({"date": date_str, "amount": amount, "cycle_type": "short"})
+        return sorted(records, key=lambda record: record["date"])
+
+    def _evaluate(self, executor, plans):
+        self.evaluated_count += len(plans)
+        chunks = [
+            plans[i : i + self.chunk_size]
+            for i in range(0, len(plans), self.chunk_size)
+        ]
+        if executor is None:
+            results = [_evaluate_plans(self.loan, chunk) for chunk in chunks]
+        else:
+            results = executor.map(_evaluate_plans, [self.loan] * len(chunks), chunks)
+        return [objectives for chunk in results for objectives in chunk]
+
+    def _add_to_front(self, plan):
+        objectives = plan.objectives()
+        for front_plan in self.pareto_plans:
+            front_objectives = front_plan.objectives()
+            if _dominates(front_objectives, objectives) or (
+                front_objectives == objectives
+            ):
+                return
+        self.pareto_plans = [
+            front_plan
+            for front_plan in self.pareto_plans
+            if not _dominates(objectives, front_plan.objectives())
+        ]
+        self.pareto_plans.append(plan)
+
+    def _is_pruned(self, bound):
+        # the cash of a partial plan only grows, the bound keeps the spent one.
+        return any(
+            _dominates(front_plan.objectives(), bound)
+            for front_plan in self.pareto_plans
+        )
+
+    def _search(self, executor):
+        partial_plans = [[]]
+        for level, (date_str, amount) in enumerate(self.cash_budget):
+            options = self._options(date_str, amount)
+            expanded_plans = [
+                partial_plan + [option]
+                for partial_plan in partial_plans
+                for option in options
+            ]
+            completions = [
+                self._complete(partial_plan, level + 1)
+                for partial_plan in expanded_plans
+            ]
+            results = self._evaluate(executor, completions)
+            for records, objectives in zip(completions, results):
+                self._add_to_front(PrepaymentPlan(records, *objectives))
+            partial_plans = []
+            for partial_plan, (total_interest, payoff_date_str, _) in zip(
+                expanded_plans, results
+            ):
+                spent_cash = round(
+                    sum(record["amount"] for record in partial_plan if record), 2
+                )
+                if self._is_pruned((total_interest, payoff_date_str, spent_cash)):
+                    self.pruned_count += 1
+                else:
+                    partial_plans.append(partial_plan)
+
+    def solve(self):
+        """Return the Pareto-best plans, sorted by total interest."""
+        self.evaluated_count = 0
+        self.pruned_count = 0
+        self.pareto_plans = []
+        self._add_to_front(PrepaymentPlan([], *evaluate_plan(self.loan, [])))
+        if self.max_workers == 1:
+            self._search(None)
+        else:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                self._search(executor)
+        return sorted(self.pareto_plans, key=PrepaymentPlan.objectives)
@@ -0,0 +1,379 @@
+"""
+Copyright 2025. All rights reserved.
+Authors: guanchenglichina@qq.com (Guancheng Li)
+
+Local HTTP service of loan quotes, with concurrent requests batched.
+
+    POST /calculate      a loan, the quote of its schedule
+    POST /early_payment  a loan with "early_payments", as
+                         `apply_early_payments` takes them
+    POST /summary        a loan with an optional "early_payment_date",
+                         "early_payment_amount" and "with_term_change"
+    GET  /metrics        throughput, batch sizes and latencies
+
+A loan is a JSON object with "method", "annual_interest_rate",
+"loan_amount", "loan_term_by_month", "start_date" (YYYYMMDD) and optional
+"day_count" and "rounding"; "with_schedule" adds the schedule columns to a
+quote. Requests which arrive within `window_seconds` of each other are
+computed as one batch: loans to calculate go through `calculate_portfolio`
+and summaries through `batch_summary`, early payments still run one
+calculator per loan.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import json
+import time
+
+from common.instrumentation import Instrumentation
+from common.schedule import Schedule
+from core.amortization import get_days_in_year
+from core.calculator_registry import CALCULATORS, new_calculator
+from core.exact_amortization import check_rounding
+from core.portfolio import calculate_portfolio
+from core.summary import batch_summary
+
+CALCULATE = "calculate"
+EARLY_PAYMENT = "early_payment"
+SUMMARY = "summary"
+OPERATIONS = (CALCULATE, EARLY_PAYMENT, SUMMARY)
+
+HTTP_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+}
+
+
+def parse_loan(request):
+    """The loan fields of a request, checked, in `new_calculator` order."""
+    if not isinstance(request, dict):
+        raise ValueError("A request must be a JSON object.")
+    method = request.get("method")
+    if method not in CALCULATORS:
+        raise ValueError(f"Unknown method: {method}")
+    loan_term_by_month = int(request["loan_term_by_month"])
+    if loan_term_by_month <= 0:
+        raise ValueError("loan_term_by_month must be positive.")
+    start_date_str = str(request["start_date"])
+    datetime.strptime(start_date_str, "%Y%m%d")
+    day_count = request.get("day_count")
+    rounding = request.get("rounding")
+    if day_count is not None:
+        get_days_in_year(day_count)
+    if rounding is not None:
+        check_rounding(rounding)
+    if day_count is not None and rounding is not None:
+        raise ValueError("Exact cents only support monthly interest rates.")
+    return (
+        method,
+        float(request["annual_interest_rate"]),
+        float(request["loan_amount"]),
+        loan_term_by_month,
+        start_date_str,
+        day_count,
+        rounding,
+    )
+
+
+def parse_summary_options(request):
+    """The early payment fields of a summary request, checked, in
+    `batch_summary` order."""
+    early_payment_date_str = request.get("early_payment_date")
+    if early_payment_date_str is not None:
+        early_payment_date_str = str(early_payment_date_str)
+        datetime.strptime(early_payment_date_str, "%Y%m%d")
+    with_term_change = request.get("with_term_change", False)
+    if not isinstance(with_term_change, bool):
+        raise ValueError("with_term_change must be true or false.")
+    return (
+        early_payment_date_str,
+        float(request.get("early_payment_amount", 0.0)),
+        with_term_change,
+    )
+
+
+def _schedule_quote(schedule, total_payment, total_interest, with_schedule):
+    quote = {
+        "total_payment": float(total_payment),
+        "total_interest": float(total_interest),
+        "first_monthly_payment": float(schedule.payment[0]) if len(schedule) else 0.0,
+        "last_monthly_payment": float(schedule.payment[-1]) if len(schedule) else 0.0,
+        "month_count": len(schedule),
+        "payoff_date": str(schedule.date[-1]) if len(schedule) else None,
+    }
+    if with_schedule:
+        quote["schedule"] = {
+            name: getattr(schedule, name).tolist() for name in Schedule.COLUMNS
+        }
+    return quote
+
+
+def _calculate_quotes(loans, requests):
+    """Quotes of loans with the same day count and rounding, in one pass."""
+    methods, rates, amounts, terms, start_date_strs, day_count, rounding = zip(*loans)
+    result = calculate_portfolio(
+        rates,
+        amounts,
+        terms,
+        start_date_strs,
+        methods,
+        day_count=day_count[0],
+        rounding=rounding[0],
+    )
+    quotes = []
+    for loan_id, request in enumerate(requests):
+        total_payment = result.total_payment[loan_id]
+        total_interest = result.total_interest[loan_id]
+        if rounding[0] is not None:
+            # sums of cents, drop the float noise as the calculators do.
+            total_payment = round(total_payment, 2)
+            total_interest = round(total_interest, 2)
+        quotes.append(
+            _schedule_quote(
+                result.get_schedule(loan_id),
+                total_payment,
+                total_interest,
+                request.get("with_schedule", False),
+            )
+        )
+    return quotes
+
+
+def _early_payment_quote(loan, request):
+    calculator = new_calculator(*loan)
+    calculator.calculate()
+    early_payments = request.get("early_payments") or []
+    if not isinstance(early_payments, list):
+        raise ValueError("early_payments must be a list.")
+    calculator.apply_early_payments(early_payments)
+    return _schedule_quote(
+        calculator.monthly_meta_info,
+        calculator.total_payment,
+        calculator.total_interest,
+        request.get("with_schedule", False),
+    )
+
+
+def _summary_quotes(loans, summary_options):
+    methods, rates, amounts, terms, start_date_strs, _, _ = zip(*loans)
+    summary = batch_summary(
+        rates, amounts, terms, start_date_strs, methods, *zip(*summary_options)
+    )
+    return [
+        {name: float(column[loan_id]) for name, column in summary.items()}
+        for loan_id in range(len(loans))
+    ]
+
+
+def run_quotes(items):
+    """Results of (operation, request) items, a quote dict or the exception
+    of its request, in order.
+
+    Loans to calculate are grouped by day count and rounding, and each group
+    is one `calculate_portfolio` call; summaries are one `batch_summary`
+    call. Requests are checked before they join a group, so a bad request
+    fails alone.
+    """
+    results = [None] * len(items)
+    groups = {}
+    for position, (operation, request) in enumerate(items):
+        try:
+            if operation not in OPERATIONS:
+                raise ValueError(f"Unknown operation: {operation}")
+            loan = parse_loan(request)
+            if operation == EARLY_PAYMENT:
+                results[position] = _early_payment_quote(loan, request)
+                continue
+            if operation == SUMMARY and loan[5:] != (None, None):
+                # rates by day and rounding by month have no closed form.
+                raise ValueError("Summaries only support monthly interest rates.")
+            # what a group needs of the request besides its loan.
+            options = (
+                request if operation == CALCULATE else parse_summary_options(request)
+            )
+            key = (operation,) + loan[5:]
+            groups.setdefault(key, []).append((position, loan, options))
+        except Exception as e:
+            results[position] = e
+    for (operation, *_), group in groups.items():
+        positions, loans, options = zip(*group)
+        try:
+            if operation == CALCULATE:
+                quotes = _calculate_quotes(loans, options)
+            else:
+                quotes = _summary_quotes(loans, options)
+        except Exception as e:
+            quotes = [e] * len(group)
+        for position, quote in zip(positions, quotes):
+            results[position] = quote
+    return results
+
+
+def _http_response(status, body, keep_alive):
+    data = json.dumps(body).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(data)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode("latin-1") + data
+
+
+class QuoteService:
+    """Quotes of concurrent requests, computed in batches.
+
+    The first request of a batch waits at most `window_seconds` for others,
+    a batch of `max_batch_size` requests starts at once. Batches run on
+    `max_workers` threads, so the event loop keeps accepting requests while
+    one is computed.
+    """
+
+    def __init__(self, window_seconds=0.002, max_batch_size=1024, max_workers=1):
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        # latencies of the requests by operation, and the batch sizes as
+        # the rows of "service.batch".
+        self.instrumentation = Instrumentation()
+        self.error_count = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._pending = []
+        self._flush_handle = None
+        self._tasks = set()
+        self._start_time = time.perf_counter()
+
+    async def quote(self, operation, request):
+        """The quote of one request, computed with the requests around it.
+
+        Raises the error of a bad request.
+        """
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        future = loop.create_future()
+        self._pending.append((operation, request, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window_seconds, self._flush)
+        try:
+            return await future
+        except Exception:
+            self.error_count += 1
+            raise
+        finally:
+            self.instrumentation.record(
+                f"service.{operation}", time.perf_counter() - start
+            )
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run_batch(batch))
+            # keep the task referenced until it is done.
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch):
+        start = time.perf_counter()
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self._executor,
+                run_quotes,
+                [(operation, request) for operation, request, _ in batch],
+            )
+        except Exception as e:
+            results = [e] * len(batch)
+        self.instrumentation.record(
+            "service.batch", time.perf_counter() - start, len(batch)
+        )
+        for (_, _, future), result in zip(batch, results):
+            if future.done():
+                # the client went away.
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def metrics(self):
+        uptime_seconds = time.perf_counter() - self._start_time
+        stages = self.instrumentation.summary()
+        request_count = sum(
+            stats["count"] for name, stats in stages.items() if name != "service.batch"
+        )
+        batch = stages.get("service.batch", {"count": 0, "rows": 0})
+        return {
+            "uptime_seconds": uptime_seconds,
+            "request_count": request_count,
+            "error_count": self.error_count,
+            "requests_per_second": request_count / uptime_seconds,
+            "batch_count": batch["count"],
+            "mean_batch_size": batch["rows"] / max(batch["count"], 1),
+            "stages": stages,
+        }
+
+    async def _respond(self, method, path, body):
+        if path == "/metrics":
+            if method != "GET":
+                return 405, {"error": "Use GET."}
+            return 200, self.metrics()
+        operation = path.strip("/")
+        if operation not in OPERATIONS:
+            return 404, {"error": f"Unknown path: {path}"}
+        if method != "POST":
+            return 405, {"error": "Use POST."}
+        try:
+            return 200, await self.quote(operation, json.loads(body or b"null"))
+        except Exception as e:
+            return 400, {"error": f"{type(e).__name__}: {e}"}
+
+    async def _handle_connection(self, reader, writer):
+        """Serve the HTTP/1.1 requests of one connection, kept alive unless
+        the client closes it."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                status, response = await self._respond(method, path, body)
+                keep_alive = (
+                    version == "HTTP/1.1"
+                    and headers.get("connection", "").lower() != "close"
+                )
+                writer.write(_http_response(status, response, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            # a broken request or a client gone, drop the connection.
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=8080):
+        """Start listening, port 0 picks a free port; returns the
+        asyncio server."""
+        return await asyncio.start_server(self._handle_connection, host, port)
+
+    async def serve(self, host="127.0.0.1", port=8080):
+        server = await self.start(host, port)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self._executor.shutdown(wait=False)
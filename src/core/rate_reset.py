@@ -0,0 +1,71 @@
+"""
+Copyright 2025. All rights reserved.
+Authors: guanchenglichina@qq.com (Guancheng Li)
+
+Rate resets of floating rate loans, such as the yearly LPR repricing.
+"""
+
+import bisect
+import calendar
+
+from common.date_time_utils import get_date_str_next_n_month
+
+
+def get_rate_reset_records(rate_resets, cycle_type="fixed"):
+    """Records of `apply_early_payments` for (date_str, annual rate) pairs."""
+    return [
+        {
+            "date": date_str,
+            "amount": 0,
+            "cycle_type": cycle_type,
+            "annual_interest_rate": annual_interest_rate,
+        }
+        for date_str, annual_interest_rate in rate_resets
+    ]
+
+
+def get_yearly_reset_dates(start_date_str, loan_term_by_month, reset_month_day=None):
+    """Repricing dates within the loan term, one a year.
+
+    By default the loan is repriced on its anniversaries, with
+    `reset_month_day` ("MMDD", for example "0101") on that day every year.
+    A day missing in a month is clamped to the end of month, "0229" resets
+    on February 28 of common years.
+    """
+    end_date_str = get_date_str_next_n_month(start_date_str, loan_term_by_month - 1)
+    if reset_month_day is None:
+        return [
+            get_date_str_next_n_month(start_date_str, n)
+            for n in range(12, loan_term_by_month, 12)
+        ]
+    if len(reset_month_day) != 4 or not reset_month_day.isdigit():
+        raise ValueError(f"Invalid reset month day: {reset_month_day}")
+    month, day = int(reset_month_day[:2]), int(reset_month_day[2:])
+    if not 1 <= month <= 12 or not 1 <= day <= 31:
+        raise ValueError(f"Invalid reset month day: {reset_month_day}")
+    year = int(start_date_str[:4])
+    reset_dates = []
+    while True:
+        month_day = min(day, calendar.monthrange(year, month)[1])
+        date_str = f"{year}{month:02d}{month_day:02d}"
+        if date_str >= end_date_str:
+            return reset_dates
+        if date_str > start_date_str:
+            reset_dates.append(date_str)
+        year += 1
+
+
+def get_benchmark_rate_resets(reset_dates, benchmark_rates, spread=0.0):
+    """(date_str, annual rate) of the reset dates, priced at the benchmark.
+
+    `benchmark_rates` are (date_str, rate) pairs sorted by date, such as the
+    published LPR. A reset takes the latest benchmark on or before its date
+    plus `spread`, resets before the first benchmark are skipped.
+    """
+    benchmark_dates = [date_str for date_str, _ in benchmark_rates]
+    rate_resets = []
+    for date_str in reset_dates:
+        position = bisect.bisect_right(benchmark_dates, date_str)
+        if position:
+            rate_resets.append((date_str, benchmark_rates[position - 1][1] + spread))
+    return rate_resets
@@ -0,0 +1,140 @@
+"""
+Copyright 2025. All rights reserved.
+Authors: guanchenglichina@qq.com (Guancheng Li)
+
+Sweep of loan scenarios over a grid of parameters and early payment plans.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import copy
+import csv
+import itertools
+
+from core.calculator_registry import CALCULATORS
+
+SWEEP_COLUMNS = (
+    "scenario_id",
+    "annual_interest_rate",
+    "loan_term_by_month",
+    "loan_amount",
+    "method",
+    "plan",
+    "total_payment",
+    "total_interest",
+    "payoff_date",
+    "interest_saved",
+)
+
+
+class ScenarioGrid:
+    """Rates x terms x amounts x methods x plans, plans vary fastest.
+
+    `prepayment_plans` maps a plan name to the records that
+    `apply_early_payments` takes, use an empty list for no early payment.
+    """
+
+    def __init__(
+        self,
+        annual_interest_rates,
+        loan_terms_by_month,
+        loan_amounts,
+        methods,
+        prepayment_plans,
+        start_date_str,
+    ):
+        unknown_methods = set(methods) - set(CALCULATORS)
+        if unknown_methods:
+            raise ValueError(f"Unknown methods: {sorted(unknown_methods)}")
+        self.loans = list(
+            itertools.product(
+                annual_interest_rates, loan_terms_by_month, loan_amounts, methods
+            )
+        )
+        self.plans = list(prepayment_plans.items())
+        self.start_date_str = start_date_str
+
+    def __len__(self):
+        return len(self.loans) * len(self.plans)
+
+
+_worker_grid = None
+
+
+def _init_worker(grid):
+    # the grid is sent once per worker process instead of once per chunk.
+    global _worker_grid
+    _worker_grid = grid
+
+
+def _run_worker_loans(loan_ids):
+    return _run_loans(_worker_grid, loan_ids)
+
+
+def _run_loans(grid, loan_ids):
+    """Rows of every plan of the loans, the base schedule is built once."""
+    rows = []
+    for loan_id in loan_ids:
+        annual_interest_rate, loan_term_by_month, loan_amount, method = grid.loans[
+            loan_id
+        ]
+        base_calculator = CALCULATORS[method](
+            annual_interest_rate, loan_amount, loan_term_by_month, grid.start_date_str
+        )
+        base_calculator.calculate()
+        for plan_id, (plan_name, early_payment_records) in enumerate(grid.plans):
+            # schedules are never changed in place, a shallow copy is enough.
+            calculator = copy.copy(base_calculator)
+            if early_payment_records:
+                calculator.apply_early_payments(early_payment_records)
+            rows.append(
+                (
+                    loan_id * len(grid.plans) + plan_id,
+                    annual_interest_rate,
+                    loan_term_by_month,
+                    loan_amount,
+                    method,
+                    plan_name,
+                    calculator.total_payment,
+                    calculator.total_interest,
+                    str(calculator.monthly_meta_info.date[-1]),
+                    base_calculator.total_interest - calculator.total_interest,
+                )
+            )
+    return rows
+
+
+def iter_sweep(grid, max_workers=None, chunk_size=256):
+    """Yield result rows in scenario order, whatever the worker count.
+
+    Loans are scheduled to workers in chunks of `chunk_size`, each worker
+    computes every plan of its loans. Rows are tuples of SWEEP_COLUMNS.
+    """
+    chunks = [
+        range(offset, min(offset + chunk_size, len(grid.loans)))
+        for offset in range(0, len(grid.loans), chunk_size)
+    ]
+    if max_workers == 1:
+        for chunk in chunks:
+            yield from _run_loans(grid, chunk)
+        return
+    with ProcessPoolExecutor(
+        max_workers=max_workers, initializer=_init_worker, initargs=(grid,)
+    ) as executor:
+        # map keeps the submission order, so the output is deterministic.
+        for rows in executor.map(_run_worker_loans, chunks):
+            yield from rows
+
+
+def run_sweep(grid, max_workers=None, chunk_size=256):
+    return list(iter_sweep(grid, max_workers, chunk_size))
+
+
+def save_sweep_to_csv_file(grid, csv_file, max_workers=None, chunk_size=256):
+    """Run the sweep and stream its rows to a csv file."""
+    with open(csv_file, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(SWEEP_COLUMNS)
+        for row in iter_sweep(grid, max_workers, chunk_size):
+            writer.writerow(
+                row[:6] + (f"{row[6]:.2f}", f"{row[7]:.2f}", row[8], f"{row[9]:.2f}")
+            )
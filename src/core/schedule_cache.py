@@ -0,0 +1,100 @@
+"""
+Copyright 2025. All rights reserved.
+Authors: guanchenglichina@qq.com (Guancheng Li)
+
+Cache of calculated base schedules, keyed by loan parameters.
+"""
+
+from collections import OrderedDict
+import threading
+
+from core.calculator_registry import CALCULATORS
+
+
+class ScheduleCache:
+    """Calculated calculators by (method, rate, amount, term, start date).
+
+    A hit returns a new calculator with the state of the cached one after
+    `calculate()`. The schedule is shared, its columns are read-only and
+    early payments replace `monthly_meta_info` instead of changing it, so
+    the cached schedule stays the base one. Entries are evicted in LRU order
+    when there are more than `max_size` of them or their schedules take more
+    than `max_bytes`. The cache can be used from several threads.
+    """
+
+    def __init__(self, max_size=1024, max_bytes=64 * 1024 * 1024):
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self._states = OrderedDict()
+        self.nbytes = 0
+        self.hit_count = 0
+        self.miss_count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._states)
+
+    def clear(self):
+        with self._lock:
+            self._states.clear()
+            self.nbytes = 0
+
+    def get_calculator(
+        self,
+        method,
+        annual_interest_rate,
+        loan_amount,
+        loan_term_by_month,
+        start_date_str,
+    ):
+        calculator_class = CALCULATORS.get(method)
+        if calculator_class is None:
+            raise ValueError(f"Unknown method: {method}")
+        key = (
+            method,
+            float(annual_interest_rate),
+            float(loan_amount),
+            int(loan_term_by_month),
+            str(start_date_str),
+        )
+        with self._lock:
+            state = self._states.get(key)
+            if state is not None:
+                self.hit_count += 1
+                self._states.move_to_end(key)
+            else:
+                self.miss_count += 1
+                calculator = calculator_class(
+                    annual_interest_rate,
+                    loan_amount,
+                    loan_term_by_month,
+                    start_date_str,
+                )
+                calculator.calculate()
+                calculator.monthly_meta_info.freeze()
+                state = dict(vars(calculator))
+                self._states[key] = state
+                self.nbytes += calculator.monthly_meta_info.nbytes()
+                self._evict()
+        calculator = calculator_class.__new__(calculator_class)
+        calculator.__dict__.update(state)
+        return calculator
+
+    def _evict(self):
+        while len(self._states) > 1 and (
+            len(self._states) > self.max_size or self.nbytes > self.max_bytes
+        ):
+            _, state = self._states.popitem(last=False)
+            self.nbytes -= state["monthly_meta_info"].nbytes()
+
+
+default_schedule_cache = ScheduleCache()
+
+
+def get_calculated_calculator(
+    method, annual_interest_rate, loan_amount, loan_term_by_month, start_date_str
+):
+    """A calculator after `calculate()`, by the default cache."""
+    return default_schedule_cache.get_calculator(
+        method, annual_interest_rate, loan_amount, loan_term_by_month, start_date_str
+    )
@@ -0,0 +1,158 @@
+"""
+Copyright 2025. All rights reserved.
+Authors: guanchenglichina@qq.com (Guancheng Li)
+
+Tails of a schedule whose rows are only built when they are needed.
+"""
+
+import numpy as np
+
+from common.schedule import Schedule
+from core.amortization import annuity_columns, linear_columns
+
+
+class ScheduleTail:
+    """Rows of a schedule from a restart date on.
+
+    The payment dates are known up front, the amount columns are computed
+    in closed form for the leading rows asked by `head`, so an early payment
+    which is overridden by a later one never builds its whole tail.
+    """
+
+    def __init__(self, dates):
+        self.dates = np.asarray(dates, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def _columns(self, periods):
+        """Payment, principal, interest and left loan amount of the periods."""
+        raise NotImplementedError
+
+    def left_at(self, position):
+        """Left loan amount after paying the row at position."""
+        return float(self._columns(np.array([position + 1]))[3][0])
+
+    def rows(self, start, stop):
+        periods = np.arange(start + 1, stop + 1)
+        return Schedule(periods, self.dates[start:stop], *self._columns(periods))
+
+    def head(self, n):
+        return self.rows(0, n)
+
+
+class MaterializedTail(ScheduleTail):
+    """A tail over rows which are already built.
+
+    `loan_amount`, `accrual_start_date` and `accrued_interest` are the ones
+    of the tail the rows were built from. By default the loan amount is
+    summed from the first row, and the accrual start date is None.
+    """
+
+    def __init__(
+        self,
+        schedule,
+        loan_amount=None,
+        accrual_start_date=None,
+        accrued_interest=0.0,
+    ):
+        super().__init__(schedule.date)
+        self.schedule = schedule
+        if loan_amount is None:
+            # the left loan amount before the first row.
+            loan_amount = (
+                float(schedule.left[0] + schedule.principal[0])
+                if len(schedule)
+                else 0.0
+            )
+        self.loan_amount = loan_amount
+        self.accrual_start_date = accrual_start_date
+        self.accrued_interest = accrued_interest
+
+    def left_at(self, position):
+        return float(self.schedule.left[position])
+
+    def rows(self, start, stop):
+        return Schedule(*(column[start:stop] for column in self.schedule.columns()))
+
+    def head(self, n):
+        return self.schedule.head(n)
+
+
+class AnnuityTail(ScheduleTail):
+    def __init__(
+        self,
+        dates,
+        loan_amount,
+        monthly_interest_rate,
+        monthly_payment,
+        balance_last_month=False,
+    ):
+        """With `balance_last_month`, the last month pays the left principal
+        and the rest of the fixed payment is booked as interest.
+        """
+        super().__init__(dates)
+        self.loan_amount = loan_amount
+        self.monthly_interest_rate = monthly_interest_rate
+        self.monthly_payment = monthly_payment
+        self.balance_last_month = balance_last_month
+
+    def _columns(self, periods):
+        payment, principal, interest, left = annuity_columns(
+            periods,
+            self.loan_amount,
+            self.monthly_interest_rate,
+            self.monthly_payment,
+        )
+        n = len(self)
+        if self.balance_last_month and len(periods) and periods[-1] == n:
+            last_principal = self.left_at(n - 2) if n > 1 else self.loan_amount
+            principal[-1] = last_principal
+            interest[-1] = self.monthly_payment - last_principal
+            left[-1] = 0
+        return payment, principal, interest, left
+
+
+class LinearTail(ScheduleTail):
+    def __init__(self, dates, loan_amount, monthly_interest_rate):
+        super().__init__(dates)
+        self.loan_amount = loan_amount
+        self.monthly_interest_rate = monthly_interest_rate
+        self.monthly_principal_amount = loan_amount / len(self)
+
+    def _columns(self, periods):
+        return linear_columns(
+            periods,
+            self.loan_amount,
+            self.monthly_interest_rate,
+            self.monthly_principal_amount,
+        )
+
+
+class PrecomputedTail(ScheduleTail):
+    """A tail whose amount columns are computed up front, for rates which
+    change by period.
+
+    With daily accrual, the interest of the first row accrues from
+    `accrual_start_date`, and `accrued_interest` of an earlier balance is due
+    with it.
+    """
+
+    def __init__(
+        self,
+        dates,
+        loan_amount,
+        columns,
+        accrual_start_date=None,
+        accrued_interest=0.0,
+    ):
+        super().__init__(dates)
+        self.loan_amount = loan_amount
+        self.columns = tuple(np.asarray(column)[: len(self)] for column in columns)
+        self.accrual_start_date = (
+            None if accrual_start_date is None else int(accrual_start_date)
+        )
+        self.accrued_interest = accrued_interest
+
+    def _columns(self, periods):
+        return tuple(column[periods - 1] for column in self.columns)
@@ -0,0 +1,245 @@
+"""
+Copyright 2025. All rights reserved.
+Authors: guanchenglichina@qq.com (Guancheng Li)
+
+Closed form totals of loans, without building the monthly schedule.
+
+Every function accepts numpy broadcastable arguments, so one call quotes a
+single loan or a whole batch. The figures are the same as the calculator's
+after `calculate()` and at most one early payment made after
+`paid_month_count` monthly payments. `is_on_paid_date` tells the early payment
+falls on the date of the last paid month, a payoff on that date is booked in
+the same row as the monthly payment.
+"""
+
+import numpy as np
+
+from common.date_time_utils import (
+    get_date_int_array_next_n_month,
+    get_month_count_until,
+)
+from core.amortization import (
+    annuity_columns,
+    annuity_payment,
+    annuity_term,
+    ceil_term,
+)
+from core.calculator_registry import ANNUITY, LINEAR
+
+
+def _as_arrays(*values):
+    return [np.asarray(value, dtype=np.float64) for value in values]
+
+
+def annuity_summary(
+    annual_interest_rate,
+    loan_amount,
+    loan_term_by_month,
+    paid_month_count=0,
+    early_payment_amount=0.0,
+    with_term_change=False,
+    is_on_paid_date=False,
+):
+    """Totals of annuity loans, see the module doc for the arguments."""
+    rate, loan_amount, n, k, amount = _as_arrays(
+        np.asarray(annual_interest_rate) / 12,
+        loan_amount,
+        loan_term_by_month,
+        np.minimum(paid_month_count, loan_term_by_month),
+        early_payment_amount,
+    )
+    payment = annuity_payment(rate, n, loan_amount)
+    left_after_paid = np.where(
+        k > 0,
+        annuity_columns(np.maximum(k, 1), loan_amount, rate, payment)[3],
+        loan_amount,
+    )
+    paid_payment = k * payment
+    paid_interest = paid_payment - (loan_amount - left_after_paid)
+
+    has_early_payment = (amount > 0) & (k < n)
+    is_paid_off = has_early_payment & (left_after_paid <= amount)
+    left_principal = np.maximum(left_after_paid - amount, 0.0)
+    # a positive dummy principal keeps the term and payment finite where unused.
+    safe_principal = np.where(left_principal > 0, left_principal, 1.0)
+    tail_term = np.where(
+        with_term_change, ceil_term(annuity_term(rate, payment, safe_principal)), n - k
+    )
+    tail_payment = np.where(
+        with_term_change,
+        payment,
+        annuity_payment(rate, np.maximum(n - k, 1), safe_principal),
+    )
+
+    tail_total_payment = np.where(
+        is_paid_off, left_after_paid, tail_term * tail_payment
+    )
+    tail_total_interest = np.where(
+        is_paid_off, 0.0, tail_term * tail_payment - left_principal
+    )
+    total_payment = np.where(
+        has_early_payment, paid_payment + tail_total_payment, n * payment
+    )
+    total_interest = np.where(
+        has_early_payment,
+        paid_interest + tail_total_interest,
+        n * payment - loan_amount,
+    )
+    pay_off_payment = left_after_paid + np.where(
+        is_on_paid_date & (k > 0), payment, 0.0
+    )
+    last_monthly_payment = np.where(
+        has_early_payment,
+        np.where(is_paid_off, pay_off_payment, tail_payment),
+        payment,
+    )
+    return {
+        "total_interest": total_interest[()],
+        "total_payment": total_payment[()],
+        "first_monthly_payment": np.where(
+            has_early_payment & ((k == 0) | (is_paid_off & is_on_paid_date & (k == 1))),
+            last_monthly_payment,
+            payment,
+        )[()],
+        "last_monthly_payment": last_monthly_payment[()],
+        "fixed_monthly_payment": np.where(
+            has_early_payment & ~is_paid_off, tail_payment, payment
+        )[()],
+    }
+
+
+def linear_summary(
+    annual_interest_rate,
+    loan_amount,
+    loan_term_by_month,
+    paid_month_count=0,
+    early_payment_amount=0.0,
+    with_term_change=False,
+    is_on_paid_date=False,
+):
+    """Totals of linear loans, see the module doc for the arguments."""
+    rate, loan_amount, n, k, amount = _as_arrays(
+        np.asarray(annual_interest_rate) / 12,
+        loan_amount,
+        loan_term_by_month,
+        np.minimum(paid_month_count, loan_term_by_month),
+        early_payment_amount,
+    )
+    principal = loan_amount / n
+    left_after_paid = np.where(
+        k > 0, np.maximum(loan_amount - k * principal, 0.0), loan_amount
+    )
+    paid_interest = rate * (k * loan_amount - principal * k * (k - 1) / 2)
+    paid_payment = k * principal + paid_interest
+
+    has_early_payment = (amount > 0) & (k < n)
+    is_paid_off = has_early_payment & (left_after_paid <= amount)
+    left_principal = np.maximum(left_after_paid - amount, 0.0)
+    tail_term = np.where(with_term_change, ceil_term(left_principal / principal), n - k)
+    safe_tail_term = np.maximum(tail_term, 1)
+    tail_principal = left_principal / safe_tail_term
+    tail_interest = rate * left_principal * (tail_term + 1) / 2
+
+    total_interest = np.where(
+        has_early_payment,
+        paid_interest + np.where(is_paid_off, 0.0, tail_interest),
+        rate * loan_amount * (n + 1) / 2,
+    )
+    total_payment = np.where(
+        has_early_payment,
+        paid_payment
+        + np.where(is_paid_off, left_after_paid, left_principal + tail_interest),
+        loan_amount + total_interest,
+    )
+    last_paid_payment = principal + rate * (loan_amount - (k - 1) * principal)
+    pay_off_payment = left_after_paid + np.where(
+        is_on_paid_date & (k > 0), last_paid_payment, 0.0
+    )
+    last_monthly_payment = np.where(
+        has_early_payment,
+        np.where(is_paid_off, pay_off_payment, tail_principal * (1 + rate)),
+        principal * (1 + rate),
+    )
+    return {
+        "total_interest": total_interest[()],
+        "total_payment": total_payment[()],
+        "first_monthly_payment": np.where(
+            has_early_payment & ((k == 0) | (is_paid_off & is_on_paid_date & (k == 1))),
+            np.where(
+                is_paid_off, pay_off_payment, tail_principal + left_principal * rate
+            ),
+            principal + loan_amount * rate,
+        )[()],
+        "last_monthly_payment": last_monthly_payment[()],
+    }
+
+
+def batch_summary(
+    annual_interest_rates,
+    loan_amounts,
+    loan_terms_by_month,
+    start_date_strs,
+    methods,
+    early_payment_date_strs=None,
+    early_payment_amounts=0.0,
+    with_term_change=False,
+):
+    """Totals of loans of both methods, the same as `calculate_summary` of
+    their calculators.
+
+    Arguments are sequences with one item per loan, or scalars for all. An
+    early payment date of None is no early payment.
+    """
+    loan_terms_by_month = np.asarray(loan_terms_by_month, dtype=np.int64)
+    methods = np.broadcast_to(methods, loan_terms_by_month.shape)
+    unknown_methods = set(np.unique(methods).tolist()) - {ANNUITY, LINEAR}
+    if unknown_methods:
+        raise ValueError(f"Unknown methods: {sorted(unknown_methods)}")
+    start_dates = np.asarray(start_date_strs).astype(np.int64)
+    if early_payment_date_strs is None:
+        early_payment_dates = np.zeros_like(start_dates)
+    else:
+        early_payment_dates = np.array(
+            [0 if date is None else int(date) for date in early_payment_date_strs]
+        )
+    # the first payment is on the start date, see `calculate_summary`.
+    paid_month_count = np.minimum(
+        get_month_count_until(start_dates, early_payment_dates), loan_terms_by_month
+    )
+    is_on_paid_date = (paid_month_count > 0) & (
+        get_date_int_array_next_n_month(
+            start_dates // 10000,
+            start_dates // 100 % 100,
+            start_dates % 100,
+            np.maximum(paid_month_count - 1, 0),
+        )
+        == early_payment_dates
+    )
+    arguments = np.broadcast_arrays(
+        annual_interest_rates,
+        loan_amounts,
+        loan_terms_by_month,
+        paid_month_count,
+        early_payment_amounts,
+        with_term_change,
+        is_on_paid_date,
+    )
+    columns = (
+        "total_interest",
+        "total_payment",
+        "first_monthly_payment",
+        "last_monthly_payment",
+    )
+    summary = {name: np.zeros(len(loan_terms_by_month)) for name in columns}
+    for method, summary_function in (
+        (ANNUITY, annuity_summary),
+        (LINEAR, linear_summary),
+    ):
+        rows = methods == method
+        if rows.any():
+            method_summary = summary_function(
+                *(argument[rows] for argument in arguments)
+            )
+            for name in columns:
+                summary[name][rows] = method_summary[name]
+    return summary
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+"""
+Copyright 2025. All rights reserved.
+Authors: guanchenglichina@qq.com (Guancheng Li)
+
+Serve loan quotes over HTTP on this machine.
+
+    python service_main.py --port 8080
+    curl -d '{"method": "annuity", "annual_interest_rate": 0.036,
+        "loan_amount": 1500000, "loan_term_by_month": 360,
+        "start_date": "20250420"}' http://127.0.0.1:8080/calculate
+    curl http://127.0.0.1:8080/metrics
+
+See core.quote_service for the requests.
+"""
+
+import argparse
+import asyncio
+import sys
+
+from core.quote_service import QuoteService
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument(
+        "--window-ms",
+        type=float,
+        default=2.0,
+        help="how long a request waits for others to batch with",
+    )
+    parser.add_argument("--max-batch", type=int, default=1024)
+    parser.add_argument("--workers", type=int, default=1, help="batch threads")
+    args = parser.parse_args()
+
+    service = QuoteService(args.window_ms / 1000, args.max_batch, args.workers)
+    print(f"Serving on http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,38 @@
 # -*- coding: utf-8 -*-
 #!/usr/bin/env python
 
-from core.annuity_calculator import AnnuityCalculator
-from core.linear_calculator import LinearCalculator
+import asyncio
+import csv
+import itertools
+import json
+
+import numpy as np
+
+from common.instrumentation import instrument
+from common.schedule_export import ScheduleCsvWriter
+from core.batch_runner import run_batch
+from core.calculator_registry import (
+    ANNUITY,
+    CALCULATORS,
+    DAILY_CALCULATORS,
+    EXACT_CALCULATORS,
+    LINEAR,
+    new_calculator,
+)
+from core.checkpoint import CalculatorCheckpoint, save_checkpoint
+from core.exact_amortization import reconcile
+from core.inverse_solver import (
+    max_loan_amount,
+    min_loan_term,
+    prepayment_for_payoff,
+)
+from core.monte_carlo import VasicekRateModel, run_monte_carlo
+from core.portfolio import calculate_portfolio
+from core.prepayment_optimizer import PrepaymentOptimizer
+from core.quote_service import QuoteService
+from core.scenario_sweep import ScenarioGrid, run_sweep
+from core.schedule_cache import ScheduleCache
+from core.rate_reset import get_benchmark_rate_resets, get_yearly_reset_dates
 
 
 def test_annuity():
@@ -11,7 +41,7 @@ def test_annuity():
     loan_term_by_month = 360
     start_date_str = "20250420"
 
-    annuity_calc = AnnuityCalculator(
+    annuity_calc = CALCULATORS[ANNUITY](
         annual_interest_rate,
         loan_amount,
         loan_term_by_month,
@@ -34,7 +64,7 @@ def test_annuity2():
     loan_term_by_month = 360
     start_date_str = "20250420"
 
-    annuity_calc = AnnuityCalculator(
+    annuity_calc = CALCULATORS[ANNUITY](
         annual_interest_rate,
         loan_amount,
         loan_term_by_month,
@@ -51,13 +81,222 @@ def test_annuity2():
     annuity_calc.print_info()
 
 
+def test_annuity_batch():
+    annual_interest_rate = 0.036
+    loan_amount = 150 * 10000
+    loan_term_by_month = 360
+    start_date_str = "20250420"
+
+    annuity_calc = CALCULATORS[ANNUITY](
+        annual_interest_rate,
+        loan_amount,
+        loan_term_by_month,
+        start_date_str,
+    )
+    annuity_calc.calculate()
+    annuity_calc.apply_early_payments(
+        [
+            {"date": "20250722", "amount": 200000, "cycle_type": "short"},
+            {"date": "20251122", "amount": 200000, "cycle_type": "fixed"},
+            {"date": "20260322", "amount": 200000, "cycle_type": "short"},
+        ]
+    )
+    annuity_calc.print_info()
+    print(annuity_calc.query_as_of(["20250801", "20260101"]))
+
+
+def test_early_payments_one_by_one():
+    early_payment_records = [
+        {"date": "20250716", "amount": 177040, "cycle_type": "fixed"},
+        {"date": "20250116", "amount": 271159, "cycle_type": "short"},
+        {"date": "20250725", "amount": 584428, "cycle_type": "short"},
+    ]
+    for method, day_count, rounding in [
+        ("annuity", None, None),
+        ("linear", None, None),
+        ("annuity", "actual/365", None),
+        ("linear", None, "half_up"),
+    ]:
+        calculators = [
+            new_calculator(
+                method, 0.01, 2377099.04, 66, "20250116", day_count, rounding
+            )
+            for _ in range(2)
+        ]
+        for calculator in calculators:
+            calculator.calculate()
+        # records in any order are applied by date.
+        calculators[0].apply_early_payments(early_payment_records)
+        for record in sorted(early_payment_records, key=lambda record: record["date"]):
+            calculators[1].apply_early_payments([record])
+        batched, one_by_one = (
+            calculator.monthly_meta_info for calculator in calculators
+        )
+        assert len(batched) == len(one_by_one)
+        for name in ("date", "payment", "principal", "interest", "left"):
+            assert (getattr(batched, name) == getattr(one_by_one, name)).all()
+        assert calculators[0].total_interest == calculators[1].total_interest
+        try:
+            calculators[1].apply_early_payments(early_payment_records[1:2])
+        except ValueError as e:
+            print(e)
+        else:
+            raise AssertionError("a record before the applied ones is applied")
+
+
+def test_query_as_of():
+    annuity_calc = CALCULATORS[ANNUITY](0.036, 150 * 10000, 360, "20250420")
+    annuity_calc.calculate()
+    balance_before = annuity_calc.query_as_of("20250721")["balance"]
+    annuity_calc.early_payment_with_term_change("20250722", 200000)
+    # the early payment is in the balance before the next payment date.
+    as_of = annuity_calc.query_as_of(["20250721", "20250722", "20250801"])
+    print(as_of)
+    assert as_of["balance"][0] == balance_before
+    assert (as_of["balance"][1:] == balance_before - 200000).all()
+    assert (as_of["principal_paid"][1:] == 150 * 10000 - as_of["balance"][1:]).all()
+
+
+def test_calculate_summary():
+    rng = np.random.default_rng(0)
+    for case_id in range(300):
+        method = (ANNUITY, LINEAR)[case_id % 2]
+        annual_interest_rate = round(float(rng.uniform(0.01, 0.08)), 4)
+        loan_amount = round(float(rng.uniform(1e4, 5e6)), 2)
+        loan_term_by_month = int(rng.integers(1, 361))
+        start_year, start_month = int(rng.integers(2020, 2030)), int(rng.integers(12))
+        start_date_str = f"{start_year}{start_month + 1:02d}{rng.integers(1, 29):02d}"
+        # from the month before the start to the month after the term.
+        year, month = divmod(
+            start_year * 12
+            + start_month
+            + int(rng.integers(-1, loan_term_by_month + 1)),
+            12,
+        )
+        early_payment_date_str = f"{year}{month + 1:02d}{rng.integers(1, 29):02d}"
+        # no early payment, a part of the loan, or a full payoff.
+        early_payment_amount = (
+            0,
+            round(float(rng.uniform(0, loan_amount)), 2),
+            loan_amount,
+        )[case_id % 3]
+        with_term_change = bool(rng.integers(2))
+        calcs = [
+            CALCULATORS[method](
+                annual_interest_rate, loan_amount, loan_term_by_month, start_date_str
+            )
+            for _ in range(2)
+        ]
+        summary = calcs[0].calculate_summary(
+            early_payment_date_str, early_payment_amount, with_term_change
+        )
+        calcs[1].calculate()
+        if early_payment_amount:
+            if with_term_change:
+                calcs[1].early_payment_with_term_change(
+                    early_payment_date_str, early_payment_amount
+                )
+            else:
+                calcs[1].early_payment_without_term_change(
+                    early_payment_date_str, early_payment_amount
+                )
+        schedule = calcs[1].monthly_meta_info
+        case = (
+            method,
+            annual_interest_rate,
+            loan_amount,
+            loan_term_by_month,
+            start_date_str,
+            early_payment_date_str,
+            early_payment_amount,
+            with_term_change,
+        )
+        assert abs(calcs[0].total_interest - calcs[1].total_interest) < 1e-6, case
+        assert abs(calcs[0].total_payment - calcs[1].total_payment) < 1e-6, case
+        assert abs(summary["first_monthly_payment"] - schedule.payment[0]) < 1e-6, case
+        assert abs(summary["last_monthly_payment"] - schedule.payment[-1]) < 1e-6, case
+
+
+def test_daily_annuity():
+    annual_interest_rate = 0.036
+    loan_amount = 150 * 10000
+    loan_term_by_month = 360
+    start_date_str = "20250420"
+
+    annuity_calc = DAILY_CALCULATORS[ANNUITY](
+        annual_interest_rate,
+        loan_amount,
+        loan_term_by_month,
+        start_date_str,
+        day_count="actual/360",
+    )
+    annuity_calc.calculate()
+    annuity_calc.print_info()
+    annuity_calc.early_payment_with_term_change("20250705", 200000)
+    annuity_calc.early_payment_without_term_change("20251115", 200000)
+    annuity_calc.print_info()
+    schedule = annuity_calc.monthly_meta_info
+    assert (schedule.principal >= 0).all()
+    # early payments go to the principal only.
+    assert abs(schedule.principal.sum() + 2 * 200000 - loan_amount) < 1e-6
+    assert abs(schedule.left[-1]) < 1e-6
+
+    # interest accrued before an early payment is paid on top of the next
+    # payment, the principal stays the annuity one.
+    for cycle_type in ("fixed", "short"):
+        annuity_calc = DAILY_CALCULATORS[ANNUITY](
+            0.08, 341501.33, 122, "20260403", day_count="actual/365"
+        )
+        annuity_calc.calculate()
+        annuity_calc.apply_early_payments(
+            [{"date": "20330316", "amount": 134253.07, "cycle_type": cycle_type}]
+        )
+        schedule = annuity_calc.monthly_meta_info
+        assert (schedule.principal >= 0).all()
+        assert (
+            abs(schedule.payment - schedule.principal - schedule.interest) < 1e-6
+        ).all()
+
+
+def test_exact_annuity():
+    annual_interest_rate = 0.036
+    loan_amount = 150 * 10000
+    loan_term_by_month = 360
+    start_date_str = "20250420"
+
+    annuity_calc = CALCULATORS[ANNUITY](
+        annual_interest_rate,
+        loan_amount,
+        loan_term_by_month,
+        start_date_str,
+    )
+    annuity_calc.calculate()
+    exact_calc = EXACT_CALCULATORS[ANNUITY](
+        annual_interest_rate,
+        loan_amount,
+        loan_term_by_month,
+        start_date_str,
+        rounding="half_even",
+    )
+    exact_calc.calculate()
+    exact_calc.print_info()
+    schedule = exact_calc.monthly_meta_info
+    for column in (schedule.payment, schedule.principal, schedule.left):
+        assert (abs(column * 100 - np.round(column * 100)) < 1e-6).all()
+    assert abs(schedule.principal.sum() - loan_amount) < 1e-6
+    differences = reconcile(schedule, annuity_calc.monthly_meta_info)
+    print(differences)
+    # rounding to the cent moves the totals by less than a yuan.
+    assert all(abs(difference) < 1 for difference in differences.values())
+
+
 def test_linear():
     annual_interest_rate = 0.036
     loan_amount = 250 * 10000
     loan_term_by_month = 360
     start_date_str = "20250409"
 
-    linear_calc = LinearCalculator(
+    linear_calc = CALCULATORS[LINEAR](
         annual_interest_rate,
         loan_amount,
         loan_term_by_month,
@@ -79,7 +318,7 @@ def test_linear2():
     loan_term_by_month = 360
     start_date_str = "20250409"
 
-    linear_calc = LinearCalculator(
+    linear_calc = CALCULATORS[LINEAR](
         annual_interest_rate,
         loan_amount,
         loan_term_by_month,
@@ -95,6 +334,435 @@ def test_linear2():
     linear_calc.print_info()
 
 
+def test_prepayment_optimizer():
+    optimizer = PrepaymentOptimizer(
+        ANNUITY,
+        0.036,
+        150 * 10000,
+        360,
+        "20250420",
+        [("20260101", 100000), ("20270101", 100000)],
+        delay_months=(0, 6),
+        max_workers=1,
+    )
+    plans = optimizer.solve()
+    for plan in plans:
+        print(plan.get_info())
+    print(optimizer.evaluated_count, optimizer.pruned_count)
+    # no plan of the front is dominated by another one.
+    objectives = [plan.objectives() for plan in plans]
+    for plan_objectives in objectives:
+        assert not any(
+            all(a <= b for a, b in zip(other, plan_objectives))
+            and other != plan_objectives
+            for other in objectives
+        )
+
+
+def test_scenario_sweep():
+    grid = ScenarioGrid(
+        [0.031, 0.036],
+        [240, 360],
+        [100 * 10000, 150 * 10000],
+        [ANNUITY, LINEAR],
+        {
+            "none": [],
+            "short": [{"date": "20260101", "amount": 100000, "cycle_type": "short"}],
+        },
+        "20250420",
+    )
+    rows = run_sweep(grid, max_workers=1, chunk_size=3)
+    print(rows[:2])
+    # rows are in scenario order whatever the worker count.
+    assert rows == run_sweep(grid, max_workers=2, chunk_size=3)
+    assert [row[0] for row in rows] == list(range(len(grid)))
+
+
+def test_schedule_cache():
+    cache = ScheduleCache(max_size=2)
+    loan = (ANNUITY, 0.036, 150 * 10000, 360, "20250420")
+    annuity_calc = cache.get_calculator(*loan)
+    annuity_calc.early_payment_with_term_change("20250722", 200000)
+    # a hit has the base schedule, not the early payment of the miss.
+    cached_calc = cache.get_calculator(*loan)
+    print(cache.hit_count, cache.miss_count, len(cached_calc.monthly_meta_info))
+    assert (cache.hit_count, cache.miss_count) == (1, 1)
+    base_calc = CALCULATORS[ANNUITY](*loan[1:])
+    base_calc.calculate()
+    for name in ("date", "payment", "principal", "interest", "left"):
+        assert (
+            getattr(cached_calc.monthly_meta_info, name)
+            == getattr(base_calc.monthly_meta_info, name)
+        ).all()
+    assert cached_calc.total_interest == base_calc.total_interest
+
+
+def test_iter_schedule():
+    annual_interest_rate = 0.036
+    loan_amount = 150 * 10000
+    loan_term_by_month = 360
+    start_date_str = "20250420"
+    early_payment_records = [
+        {"date": "20250722", "amount": 200000, "cycle_type": "short"},
+        {"date": "20251122", "amount": 200000, "cycle_type": "fixed"},
+    ]
+
+    annuity_calc = CALCULATORS[ANNUITY](
+        annual_interest_rate,
+        loan_amount,
+        loan_term_by_month,
+        start_date_str,
+    )
+    for meta in itertools.islice(annuity_calc.iter_schedule(early_payment_records), 12):
+        meta.print_info()
+    rows = list(annuity_calc.iter_schedule(early_payment_records))
+    annuity_calc.calculate()
+    annuity_calc.apply_early_payments(early_payment_records)
+    schedule = annuity_calc.monthly_meta_info
+    assert [meta.date_str for meta in rows] == [str(date) for date in schedule.date]
+    for name, column in [
+        ("monthly_payment", schedule.payment),
+        ("monthly_principal_amount", schedule.principal),
+        ("monthly_interest_amount", schedule.interest),
+        ("left_loan_amount", schedule.left),
+    ]:
+        assert np.allclose([getattr(meta, name) for meta in rows], column)
+    with ScheduleCsvWriter("/tmp/annuity_iter_info.csv", with_header=True) as writer:
+        writer.write_rows(annuity_calc.iter_schedule(early_payment_records))
+
+
+def test_inverse_solver():
+    methods = ["annuity", "linear"]
+    loan_amounts = max_loan_amount(methods, 0.036, 360, 8000)
+    print(loan_amounts)
+    for method, loan_amount in zip(methods, loan_amounts):
+        calc = CALCULATORS[method](0.036, loan_amount, 360, "20250420")
+        calc.calculate()
+        assert abs(calc.monthly_meta_info.payment.max() - 8000) < 1e-6
+    terms = min_loan_term(methods, 0.036, 150 * 10000, 8000)
+    print(terms)
+    for method, term in zip(methods, terms.astype(int).tolist()):
+        for loan_term_by_month, pays_at_most in ((term, True), (term - 1, False)):
+            calc = CALCULATORS[method](
+                0.036, 150 * 10000, loan_term_by_month, "20250420"
+            )
+            calc.calculate()
+            assert (calc.monthly_meta_info.payment.max() <= 8000) == pays_at_most
+    amounts = prepayment_for_payoff(
+        methods, 0.036, 150 * 10000, 360, "20250420", "20450420", "20260101", 12
+    )
+    for method, amount in zip(methods, amounts.tolist()):
+        calc = CALCULATORS[method](0.036, 150 * 10000, 360, "20250420")
+        calc.calculate()
+        calc.apply_early_payments(
+            [
+                {"date": f"{year}0101", "amount": amount, "cycle_type": "short"}
+                for year in range(2026, 2046)
+            ]
+        )
+        print(amount, calc.monthly_meta_info.date[-1])
+        assert calc.monthly_meta_info.date[-1] <= 20450420
+
+
+def test_schedule_aggregates():
+    annuity_calc = CALCULATORS[ANNUITY](0.036, 150 * 10000, 360, "20250420")
+    annuity_calc.calculate()
+    annuity_calc.early_payment_with_term_change("20270705", 200000)
+    annuity_calc.print_info(add_yearly_info=True)
+    aggregates = annuity_calc.aggregates()
+    schedule = annuity_calc.monthly_meta_info
+    yearly = aggregates.yearly()
+    assert yearly["year"].tolist() == list(range(2025, schedule.date[-1] // 10000 + 1))
+    for name in ("payment", "principal", "interest"):
+        assert abs(yearly[name].sum() - getattr(schedule, name).sum()) < 1e-6
+    rolling = aggregates.rolling(dates=["20271231", "20281231"])
+    print(rolling)
+    for date, total in zip((20271231, 20281231), rolling):
+        in_window = (schedule.date > date - 10000) & (schedule.date <= date)
+        assert abs(total - schedule.payment[in_window].sum()) < 1e-6
+    portfolio = calculate_portfolio(
+        [0.036, 0.041],
+        [150 * 10000, 80 * 10000],
+        [360, 120],
+        ["20250420", "20251120"],
+        ["annuity", "linear"],
+    )
+    yearly_totals = portfolio.yearly_totals()
+    print(yearly_totals["interest"][:, :3])
+    assert np.allclose(yearly_totals["interest"].sum(axis=1), portfolio.total_interest)
+
+
+def test_rate_reset():
+    annual_interest_rate = 0.0395
+    loan_amount = 150 * 10000
+    loan_term_by_month = 360
+    start_date_str = "20250420"
+    lpr = [("20241021", 0.031), ("20250520", 0.03)]
+
+    annuity_calc = CALCULATORS[ANNUITY](
+        annual_interest_rate,
+        loan_amount,
+        loan_term_by_month,
+        start_date_str,
+    )
+    annuity_calc.calculate()
+    reset_dates = get_yearly_reset_dates(start_date_str, loan_term_by_month, "0101")
+    assert reset_dates == [f"{year}0101" for year in range(2026, 2056)]
+    annuity_calc.apply_rate_resets(
+        get_benchmark_rate_resets(reset_dates, lpr, spread=0.003)
+    )
+    annuity_calc.print_info()
+    # the first payment after the reset pays the interest at 3% + 0.3%.
+    schedule = annuity_calc.monthly_meta_info
+    row = np.searchsorted(schedule.date, 20260101)
+    assert abs(schedule.interest[row] - schedule.left[row - 1] * 0.033 / 12) < 1e-6
+    assert len(schedule) == loan_term_by_month
+    assert abs(schedule.left[-1]) < 1e-6
+    # a missing day is clamped to the end of month.
+    assert get_yearly_reset_dates("20250420", 60, "0229") == [
+        "20260228",
+        "20270228",
+        "20280229",
+        "20290228",
+        "20300228",
+    ]
+
+
+def test_same_rate_reset():
+    reset_dates = get_yearly_reset_dates("20251217", 300)
+    for method, day_count, rounding in itertools.product(
+        (ANNUITY, LINEAR), (None, "actual/365"), (None, "half_up")
+    ):
+        if day_count is not None and rounding is not None:
+            continue
+        calculators = [
+            new_calculator(
+                method, 0.0442, 2776939.08, 300, "20251217", day_count, rounding
+            )
+            for _ in range(2)
+        ]
+        for calculator in calculators:
+            calculator.calculate()
+        # a reset to the same rate must not add a month of float noise.
+        calculators[1].apply_rate_resets(
+            [(date_str, 0.0442) for date_str in reset_dates], "short"
+        )
+        base, reset = (calculator.monthly_meta_info for calculator in calculators)
+        assert len(reset) == len(base) and reset.date[-1] == base.date[-1]
+        assert abs(calculators[1].total_interest - calculators[0].total_interest) < 0.01
+
+
+def test_monte_carlo():
+    rate_model = VasicekRateModel(0.04, 0.3, 0.015)
+    result = run_monte_carlo(
+        "annuity", 0.036, 150 * 10000, 360, "20250420", rate_model, 1000, seed=0
+    )
+    print(result.summary())
+    for path_id in range(0, len(result), 100):
+        annuity_calc = CALCULATORS[ANNUITY](0.036, 150 * 10000, 360, "20250420")
+        annuity_calc.calculate()
+        annuity_calc.apply_rate_resets(
+            list(zip(result.reset_date_strs, result.reset_rates[path_id].tolist()))
+        )
+        # the same up to the float summation order.
+        assert (
+            abs(annuity_calc.total_interest - result.total_interest[path_id])
+            <= 1e-12 * annuity_calc.total_interest
+        )
+    print(annuity_calc.total_interest, result.total_interest[path_id])
+
+
+def test_instrumentation():
+    with instrument() as instrumentation:
+        annuity_calc = CALCULATORS[ANNUITY](0.036, 150 * 10000, 360, "20250420")
+        annuity_calc.calculate()
+        annuity_calc.early_payment_with_term_change("20250705", 200000)
+        annuity_calc.save_to_csv_file("/tmp/annuity_info.csv")
+    instrumentation.print_info()
+    instrumentation.dump_json("/tmp/annuity_stages.json")
+    stages = instrumentation.summary()
+    for name in (
+        "calculator.calculate",
+        "calculator.early_payment_with_term_change",
+        "export.save_to_csv_file",
+    ):
+        assert stages[name]["count"] == 1
+    assert stages["calculator.calculate"]["rows"] == 360
+    with open("/tmp/annuity_stages.json") as f:
+        assert json.load(f).keys() == stages.keys()
+
+
+def test_portfolio():
+    portfolio = calculate_portfolio(
+        [0.036, 0.036],
+        [150 * 10000, 250 * 10000],
+        [360, 240],
+        ["20250420", "20250409"],
+        ["annuity", "linear"],
+    )
+    for loan_id, (method, loan_amount, loan_term_by_month, start_date_str) in enumerate(
+        [
+            (ANNUITY, 150 * 10000, 360, "20250420"),
+            (LINEAR, 250 * 10000, 240, "20250409"),
+        ]
+    ):
+        print(
+            f"总还款额: {portfolio.total_payment[loan_id]:.2f}",
+            f"总利息: {portfolio.total_interest[loan_id]:.2f}",
+        )
+        calc = CALCULATORS[method](
+            0.036, loan_amount, loan_term_by_month, start_date_str
+        )
+        calc.calculate()
+        schedule = portfolio.get_schedule(loan_id)
+        assert (schedule.date == calc.monthly_meta_info.date).all()
+        for loan_column, calc_column in zip(
+            schedule.columns(), calc.monthly_meta_info.columns()
+        ):
+            assert np.allclose(loan_column, calc_column)
+        assert abs(portfolio.total_interest[loan_id] - calc.total_interest) < 1e-6
+        assert abs(portfolio.total_payment[loan_id] - calc.total_payment) < 1e-6
+
+
+def test_batch_runner():
+    loans = [
+        {
+            "loan_id": "a1",
+            "method": "annuity",
+            "annual_interest_rate": 0.036,
+            "loan_amount": 150 * 10000,
+            "loan_term_by_month": 360,
+            "start_date": "20250420",
+            "early_payments": [
+                {"date": "20250722", "amount": 200000, "cycle_type": "short"}
+            ],
+        },
+        {"loan_id": "bad", "method": "unknown"},
+    ]
+    with open("/tmp/batch_loans.jsonl", "w") as f:
+        for loan in loans:
+            f.write(json.dumps(loan) + "\n")
+    progress = run_batch(
+        "/tmp/batch_loans.jsonl",
+        "/tmp/batch_summary.csv",
+        schedule_file="/tmp/batch_schedules.csv.gz",
+        error_file="/tmp/batch_errors.csv",
+        max_workers=1,
+    )
+    print(progress)
+    assert progress["loan_count"] == 2
+    assert progress["error_count"] == 1
+    annuity_calc = CALCULATORS[ANNUITY](0.036, 150 * 10000, 360, "20250420")
+    annuity_calc.calculate()
+    annuity_calc.apply_early_payments(loans[0]["early_payments"])
+    with open("/tmp/batch_summary.csv", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    summary = dict(zip(rows[0], rows[1]))
+    assert len(rows) == 2
+    assert summary["total_interest"] == f"{annuity_calc.total_interest:.2f}"
+    assert summary["payoff_date"] == str(annuity_calc.monthly_meta_info.date[-1])
+    with open("/tmp/batch_errors.csv", encoding="utf-8") as f:
+        assert [row[1] for row in csv.reader(f)][1:] == ["bad"]
+
+
+def test_checkpoint():
+    loans = [
+        (method, day_count, rounding, cycle_type)
+        for method, day_count, rounding in [
+            (ANNUITY, None, None),
+            (LINEAR, None, None),
+            (ANNUITY, "actual/365", None),
+            (LINEAR, "actual/360", None),
+            (ANNUITY, None, "half_up"),
+            (LINEAR, None, "down"),
+        ]
+        for cycle_type in ["short", "fixed"]
+    ]
+    calcs = {}
+    for i, (method, day_count, rounding, cycle_type) in enumerate(loans):
+        calc = new_calculator(
+            method, 0.036, 150 * 10000, 360, "20250420", day_count, rounding
+        )
+        calc.calculate()
+        calc.apply_early_payments(
+            [{"date": "20250705", "amount": 200000, "cycle_type": cycle_type}]
+        )
+        calcs[f"loan{i}"] = calc
+    calcs["untouched"] = CALCULATORS[LINEAR](0.036, 150 * 10000, 360, "20250420")
+    calcs["untouched"].calculate()
+    save_checkpoint("/tmp/loans.ckpt", calcs)
+    checkpoint = CalculatorCheckpoint("/tmp/loans.ckpt")
+    for i, (method, day_count, rounding, cycle_type) in enumerate(loans):
+        saved_calc = calcs[f"loan{i}"]
+        loaded_calc = checkpoint[f"loan{i}"]
+        assert loaded_calc.early_payment_records == saved_calc.early_payment_records
+        # a later early payment goes on from the restored state.
+        for calc in (saved_calc, loaded_calc):
+            calc.apply_early_payments(
+                [{"date": "20250710", "amount": 100000, "cycle_type": cycle_type}]
+            )
+        assert loaded_calc.total_interest == saved_calc.total_interest, loans[i]
+        for loaded_column, saved_column in zip(
+            loaded_calc.monthly_meta_info.columns(),
+            saved_calc.monthly_meta_info.columns(),
+        ):
+            assert np.array_equal(loaded_column, saved_column), loans[i]
+    loaded_calc = checkpoint["untouched"]
+    assert loaded_calc.total_interest == calcs["untouched"].total_interest
+    loaded_calc.early_payment_without_term_change("20260722", 100000)
+    loaded_calc.print_info()
+
+
+def test_quote_service():
+    loan = {
+        "method": "annuity",
+        "annual_interest_rate": 0.036,
+        "loan_amount": 150 * 10000,
+        "loan_term_by_month": 360,
+        "start_date": "20250420",
+    }
+
+    async def post(port, path, request):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        body = json.dumps(request).encode("utf-8")
+        writer.write(
+            f"POST {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode("latin-1") + body
+        )
+        response = await reader.read()
+        writer.close()
+        return json.loads(response.partition(b"\r\n\r\n")[2])
+
+    async def run():
+        service = QuoteService()
+        server = await service.start(port=0)
+        port = server.sockets[0].getsockname()[1]
+        quotes = await asyncio.gather(
+            post(port, "/calculate", loan),
+            post(port, "/calculate", dict(loan, method="linear")),
+            post(
+                port,
+                "/early_payment",
+                dict(
+                    loan,
+                    early_payments=[
+                        {"date": "20250722", "amount": 200000, "cycle_type": "short"}
+                    ],
+                ),
+            ),
+            post(port, "/summary", dict(loan, early_payment_date="20250722")),
+            post(port, "/summary", dict(loan, early_payment_date="2025xx01")),
+        )
+        server.close()
+        service.close()
+        print(quotes)
+        # the bad summary fails alone, not the one batched with it.
+        assert "total_interest" in quotes[3] and "error" in quotes[4]
+        print(service.metrics())
+
+    asyncio.run(run())
+
+
 def main():
     # test_annuity()
     test_annuity2()
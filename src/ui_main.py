@@ -5,37 +5,110 @@ Authors: guanchenglichina@qq.com (Guancheng Li)
 Mainloop for GUI.
 """
 
+import copy
 from datetime import datetime
-import os
+import queue
 import re
-import subprocess
+import threading
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 
-from core.annuity_calculator import AnnuityCalculator
-from core.linear_calculator import LinearCalculator
+# 计算器和 NumPy 在第一次计算时才导入，窗口启动更快
+from core.schedule_cache import get_calculated_calculator
 
 
-def show_in_notepad(content):
-    # 指定文件路径
-    file_path = "result.txt"
+class ScheduleView(ttk.Frame):
+    """只渲染可见行的还款计划表，行数再多也只有一屏的表格项"""
 
-    # 将字符串保存到文件
-    try:
-        with open(file_path, 'w', encoding='utf-8') as file:
-            file.write(content)
-    except Exception as e:
-        print(f"保存文件时出现错误: {e}")
+    COLUMNS = ("期数", "还款日期", "还款额", "本金", "利息", "剩余本金")
+
+    def __init__(self, master, visible_row_count=15):
+        super().__init__(master)
+        self.visible_row_count = visible_row_count
+        self.schedule = None
+        self.first_row = 0
+
+        self.tree = ttk.Treeview(self, columns=self.COLUMNS, show="headings", height=visible_row_count)
+        for column in self.COLUMNS:
+            self.tree.heading(column, text=column)
+            self.tree.column(column, width=60 if column == "期数" else 100, anchor="e")
+        self.items = [self.tree.insert("", "end", values=()) for _ in range(visible_row_count)]
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.on_scroll)
 
-    # 检查操作系统是否为 Windows
-    if os.name == 'nt':
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+        self.tree.bind("<MouseWheel>", lambda event: self.scroll_to(self.first_row - event.delta // 120 * 3))
+        self.tree.bind("<Button-4>", lambda event: self.scroll_to(self.first_row - 3))
+        self.tree.bind("<Button-5>", lambda event: self.scroll_to(self.first_row + 3))
+        self.set_schedule(None)
+
+    def set_schedule(self, schedule):
+        """换成新的还款计划，保持当前的滚动位置"""
+        self.schedule = schedule
+        self.scroll_to(self.first_row)
+
+    def row_count(self):
+        return 0 if self.schedule is None else len(self.schedule)
+
+    def on_scroll(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(round(float(amount) * self.row_count()))
+        elif unit == "pages":
+            self.scroll_to(self.first_row + int(amount) * self.visible_row_count)
+        else:
+            self.scroll_to(self.first_row + int(amount))
+
+    def scroll_to(self, first_row):
+        row_count = self.row_count()
+        self.first_row = max(0, min(first_row, row_count - self.visible_row_count))
+        for i, item in enumerate(self.items):
+            position = self.first_row + i
+            if position < row_count:
+                meta = self.schedule.row(position)
+                values = (
+                    meta.index if meta.index > 0 else "结清",
+                    meta.date_str,
+                    f"{meta.monthly_payment:.2f}",
+                    f"{meta.monthly_principal_amount:.2f}",
+                    f"{meta.monthly_interest_amount:.2f}",
+                    f"{meta.left_loan_amount:.2f}",
+                )
+            else:
+                values = ()
+            self.tree.item(item, values=values)
+        if row_count:
+            self.scrollbar.set(self.first_row / row_count, (self.first_row + self.visible_row_count) / row_count)
+        else:
+            self.scrollbar.set(0, 1)
+
+
+class CalculationWorker(threading.Thread):
+    """后台计算线程，结果通过队列交给界面线程"""
+
+    def __init__(self, loan_args, early_payment_records, results):
+        super().__init__(daemon=True)
+        self.loan_args = loan_args
+        self.early_payment_records = early_payment_records
+        self.results = results
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def run(self):
         try:
-            # 使用 subprocess 模块打开记事本并显示文件
-            subprocess.Popen(['notepad.exe', file_path])
+            calculator = get_calculated_calculator(*self.loan_args)
+            self.results.put((self, "partial", copy.copy(calculator)))
+            if self.cancelled.is_set():
+                return
+            # 表格中的记录不一定按日期排序，一次应用全部记录，由计算器按日期排序
+            calculator.apply_early_payments(self.early_payment_records)
+            if self.cancelled.is_set():
+                return
+            self.results.put((self, "done", calculator))
         except Exception as e:
-            print(f"打开记事本时出现错误: {e}")
-    else:
-        print("此方法仅适用于 Windows 系统。")
+            self.results.put((self, "error", e))
+
 
 def is_valid_date(date_str):
     """验证8位日期字符串是否合法"""
@@ -68,9 +141,14 @@ class LoanCalculator:
         self.create_input_section()
         # 表格区组件
         self.create_table_section()
+        # 结果区组件
+        self.create_result_section()
 
-        # 计算器
+        # 计算器，只保存已经完成的计算结果
         self.calculator = None
+        # 后台计算
+        self.worker = None
+        self.results = queue.Queue()
 
     def create_input_section(self):
         """创建顶部输入区域"""
@@ -135,6 +213,20 @@ class LoanCalculator:
         # 绑定点击事件
         self.tree.bind("<Button-1>", self.on_table_click)
 
+    def create_result_section(self):
+        """创建右侧计算结果区域"""
+        frame = ttk.Frame(self.root)
+        frame.grid(row=0, column=1, rowspan=3, padx=10, pady=10, sticky="nsew")
+
+        self.status = tk.StringVar(value="")
+        self.summary = tk.StringVar(value="")
+        ttk.Label(frame, textvariable=self.status).grid(row=0, column=0, sticky="w")
+        self.cancel_button = ttk.Button(frame, text="取消", command=self.cancel_calculation, state="disabled")
+        self.cancel_button.grid(row=0, column=1, sticky="e")
+        ttk.Label(frame, textvariable=self.summary, justify="left").grid(row=1, column=0, columnspan=2, sticky="w")
+        self.schedule_view = ScheduleView(frame)
+        self.schedule_view.grid(row=2, column=0, columnspan=2, sticky="nsew")
+
     def on_table_click(self, event):
         """处理表格点击事件"""
         region = self.tree.identify("region", event.x, event.y)
@@ -202,41 +294,70 @@ class LoanCalculator:
         return data
 
     def show_calculation(self):
-        """计算按钮示例"""
-        if self.method.get() == "annuity":
-            self.calculator = AnnuityCalculator(
-                self.annual_rate.get() * 0.01,
-                self.remaining_loan.get(),
-                self.remaining_term.get(),
-                datetime.now().strftime("%Y%m%d")  # 假设当前日期为开始日期
-            )
-        elif self.method.get() == "linear":
-            self.calculator = LinearCalculator(
-                self.annual_rate.get() * 0.01,
-                self.remaining_loan.get(),
-                self.remaining_term.get(),
-                datetime.now().strftime("%Y%m%d")  # 假设当前日期为开始日期
-            )
-        if self.calculator is None:
-            messagebox.showerror("错误", "计算器未初始化")
-            return
-        self.calculator.calculate()
-        early_payment_records = self.get_table_data()
-        for record in early_payment_records:
-            if record["cycle_type"] == "short":
-                print("short", record["date"], float(record["amount"]))
-                self.calculator.early_payment_with_term_change(record["date"], float(record["amount"]))
-            elif record["cycle_type"] == "fixed":
-                print("fixed", record["date"], float(record["amount"]))
-                self.calculator.early_payment_without_term_change(record["date"], float(record["amount"]))
-        info = self.calculator.get_info(add_monthly_info=True)
-        # messagebox.showinfo("明细", "\n".join(info))
-        show_in_notepad("\n".join(info))
+        """在后台线程计算，界面不阻塞"""
+        self.cancel_calculation()
+        loan_args = (
+            self.method.get(),
+            self.annual_rate.get() * 0.01,
+            self.remaining_loan.get(),
+            self.remaining_term.get(),
+            datetime.now().strftime("%Y%m%d"),  # 假设当前日期为开始日期
+        )
+        self.worker = CalculationWorker(loan_args, self.get_table_data(), self.results)
+        self.worker.start()
+        self.status.set("计算中...")
+        self.cancel_button.configure(state="normal")
+        self.poll_results()
+
+    def cancel_calculation(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker = None
+            self.status.set("已取消")
+            self.cancel_button.configure(state="disabled")
+
+    def poll_results(self):
+        """取出后台线程的结果并刷新界面，旧的计算结果直接丢弃"""
+        while True:
+            try:
+                worker, kind, result = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if worker is not self.worker:
+                continue
+            if kind == "error":
+                self.worker = None
+                self.status.set("")
+                self.cancel_button.configure(state="disabled")
+                messagebox.showerror("错误", f"计算失败: {result}")
+                return
+            self.summary.set("\n".join(result.get_info()))
+            self.schedule_view.set_schedule(result.monthly_meta_info)
+            if kind == "done":
+                self.calculator = result
+                self.worker = None
+                self.status.set("计算完成")
+                self.cancel_button.configure(state="disabled")
+                return
+        if self.worker is not None:
+            self.root.after(50, self.poll_results)
 
     def export_pdf(self):
-        """导出PDF示例"""
-        messagebox.showinfo("提示", "PDF导出功能（示例提示）")
+        """导出已经计算好的结果，不重新计算"""
+        if self.calculator is None:
+            messagebox.showerror("错误", "请先完成计算")
+            return
+        pdf_file = filedialog.asksaveasfilename(defaultextension=".pdf", filetypes=[("PDF", "*.pdf")])
+        if not pdf_file:
+            return
+        from common.pdf_export import save_schedule_to_pdf_file
 
+        try:
+            save_schedule_to_pdf_file(pdf_file, self.calculator.get_info(), self.calculator.monthly_meta_info)
+        except OSError as e:
+            messagebox.showerror("错误", f"保存文件时出现错误: {e}")
+            return
+        messagebox.showinfo("提示", f"已导出到 {pdf_file}")
 
 if __name__ == "__main__":
     root = tk.Tk()